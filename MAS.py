@@ -1,8 +1,14 @@
-from static_values import EXPENSIVE_PRICE, INEXPENSIVE_PRICE, NUM_AGENTS, NUM_INSTITUTIONS, JOIN_INSTITUTION_THRESHOLD, AGENT_REPUTATION_WEIGHT, INSTITUTION_EVENT_WEIGHTS, AGENT_EVENT_WEIGHTS, RULE_VIOLATION_THRESHOLD
-from agents import SocialAgent, DominantAgent, RandomAgent
+from config import DEFAULT_CONFIG
+from agents import AGENT_TYPES, population_counts
 from reputations import AgentsReputation, InstitutionalReputation
-from events import ReputationEvent, Event, InstitutionEvent
-import random
+from events import Event, InstitutionEvent
+from streams import RandomStreams
+from membership import MembershipIndex
+from institution_index import InstitutionCapitalIndex
+import numpy as np
+
+# Event types produced by the system-wide rule stage, in the order they are recorded for each agent
+RULE_EVENT_TYPES = ["Sanctioned", "Not Sanctioned", "Cooperated", "Not Cooperated"]
 
 # Not useful in our implementation of the game
 class Network:
@@ -16,12 +22,13 @@ class Network:
         self.connections.setdefault(agent2.agent_id, set()).add(agent1.agent_id)
 
 class Institution:
-    def __init__(self, institution_id, rules, system):
+    def __init__(self, institution_id, rules, system, config = DEFAULT_CONFIG):
         self.system = system
+        self.config = config
         self.institution_id = institution_id
-        self.members = set()
+        self.members = set() # Replaced by a view of the system's membership index during setup, which also updates the agent's institutions
         self.last_orders = set()
-        self.events = set()
+        self.events = [] # Kept in the order they happened, so seeded games replay the same way
         self.violations = {}
         # Initialize rules with default values or provided values if specific rules are passed
         self.rules = {
@@ -31,6 +38,29 @@ class Institution:
             'graduated_sanctions': rules.get('graduated_sanctions', False)  # True if sanctions increase for repeated violations
         }
 
+    @property
+    def events(self):
+        # Events from the rule stage are only made into Event objects when someone reads them
+        if self.pending_rule_events is not None:
+            agent_positions, codes = self.pending_rule_events
+            self.pending_rule_events = None
+            agent_ids = self.system.membership.agent_ids
+            weights = [self.config.institution_event_weights["Sanctioned"], self.config.institution_event_weights["Not Sanctioned"],
+                       self.config.agent_event_weights["Cooperated"], self.config.agent_event_weights["Not Cooperated"]]
+            self._events.extend(Event(RULE_EVENT_TYPES[code], weights[code], agent_ids[position])
+                                for position, code in zip(agent_positions.tolist(), codes.tolist()))
+        return self._events
+
+    @events.setter
+    def events(self, events):
+        self._events = events
+        self.pending_rule_events = None # Agent positions and RULE_EVENT_TYPES codes from the rule stage, not yet made into events
+
+    def add_rule_events(self, agent_positions, codes):
+        # Adds the events of the system-wide rule stage without creating Event objects yet
+        self.events # Makes earlier pending events into Event objects first, to keep the order
+        self.pending_rule_events = (agent_positions, codes)
+
     def print_events(self):
         # Create dictionaries to store what agents made what action, and what type of agent they were
         expulsions = {}
@@ -39,12 +69,7 @@ class Institution:
         non_cooperations = {}
 
         for event in self.events:
-            if isinstance(self.system.agents[event.agent_id], SocialAgent):
-                agent_type = "Social Agent"
-            elif isinstance(self.system.agents[event.agent_id], DominantAgent):
-                agent_type = "Dominant Agent"
-            else:
-                agent_type = "Random Agent"
+            agent_type = self.system.agents[event.agent_id].type_name
 
             if event.type == "Expelled":
                 expulsions[event.agent_id] = agent_type
@@ -62,10 +87,8 @@ class Institution:
             passed = self.vote_on("Join", agent_id)
             if passed:
                 self.members.add(agent_id)
-                self.system.agents[agent_id].institutions.add(self.institution_id)
                 self.violations[agent_id] = 0
-                event = InstitutionEvent("Joined", INSTITUTION_EVENT_WEIGHTS["Joined"], agent_id, self.institution_id)
-                self.events.add(event)
+                event = self.membership_event("Joined", agent_id)
 
                 print(f"Vote for agent {agent_id} to join {self.institution_id} passed. Agent joined")
 
@@ -76,14 +99,20 @@ class Institution:
         
         else:
             self.members.add(agent_id)
-            self.system.agents[agent_id].institutions.add(self.institution_id)
             self.violations[agent_id] = 0
-            event = InstitutionEvent("Joined", INSTITUTION_EVENT_WEIGHTS["Joined"], agent_id, self.institution_id)
-            self.events.add(event)
+            event = self.membership_event("Joined", agent_id)
             print(f"Agent {agent_id} added to {self.institution_id} without a vote.")
 
             return event
 
+    def membership_event(self, event_type, agent_id):
+        # Records that an agent joined, left or was expelled from the institution
+        event = InstitutionEvent(event_type, self.config.institution_event_weights[event_type], agent_id, self.institution_id)
+        self.events.append(event)
+        if self.system.trace is not None:
+            self.system.trace.record_event(event)
+        return event
+
     def remove_member(self, agent_id, source):
         """
         Remove a member from the institution
@@ -94,9 +123,7 @@ class Institution:
         if self.rules['vote']:
             if source == agent_id: # Agent wanted to leave
                 self.members.discard(agent_id)
-                self.system.agents[agent_id].institutions.discard(self.institution_id)
-                event = InstitutionEvent("Left", INSTITUTION_EVENT_WEIGHTS["Left"], agent_id, self.institution_id)
-                self.events.add(event)
+                event = self.membership_event("Left", agent_id)
                 print(f"Agent {agent_id} left {self.institution_id} without a vote.")
                 
                 return event
@@ -106,9 +133,7 @@ class Institution:
             passed = self.vote_on("Expel", agent_id)
             if passed:
                 self.members.discard(agent_id)
-                self.system.agents[agent_id].institutions.discard(self.institution_id)
-                event = InstitutionEvent("Expelled", INSTITUTION_EVENT_WEIGHTS["Expelled"], agent_id, self.institution_id)
-                self.events.add(event)
+                event = self.membership_event("Expelled", agent_id)
                 print(f"Vote for agent {agent_id} to be expelled from {self.institution_id} passed. Agent expelled.")
 
                 return event
@@ -117,60 +142,15 @@ class Institution:
                 return None
         else:
             self.members.discard(agent_id)
-            self.system.agents[agent_id].institutions.discard(self.institution_id)
-            event = InstitutionEvent("Left", INSTITUTION_EVENT_WEIGHTS["Left"], agent_id, self.institution_id)
-            self.events.add(event)
+            event = self.membership_event("Left", agent_id)
             print(f"Agent {agent_id} removed from {self.institution_id} without a vote. (Expelled or left by choice)")
 
             return event
 
-    def apply_rules(self, choice):
-        # Gå gjennom de forskjellige reglene og sjekk om de er aktuelle for eventet
-        agent_id = choice[0]
-        meal_choice = choice[1]
-
-        # Sjekke om rule = compulsory cooperation
-        if self.rules['compulsory_cooperation']:
-            if meal_choice == "expensive":
-                if self.rules['sanctions']:
-                    # If sanctions, New Event = Sanctioned
-                    self.apply_sanction(agent_id)
-                    new_event = Event("Sanctioned", INSTITUTION_EVENT_WEIGHTS["Sanctioned"], agent_id)
-                    self.events.add(new_event)
-                    # Else New Event = Not Sanctioned
-                else:
-                    new_event = Event("Not Sanctioned", INSTITUTION_EVENT_WEIGHTS["Not Sanctioned"], agent_id)
-                    self.events.add(new_event)
-
-        if meal_choice == "inexpensive":
-            cooperation_event = Event("Cooperated", AGENT_EVENT_WEIGHTS["Cooperated"], agent_id)
-            self.events.add(cooperation_event)
-        else:
-            cooperation_event = Event("Not Cooperated", AGENT_EVENT_WEIGHTS["Not Cooperated"], agent_id)
-            self.events.add(cooperation_event)
-
-        return cooperation_event
-
-    def apply_sanction(self, agent_id):
-        if self.rules['graduated_sanctions']:
-            # Implement graduated sanctions logic
-            pass
-        else:
-            self.violations[agent_id] += 1
-
-    def update_institution(self, group_choices):
-        #Each institution is updated with it members’ actions from last round
-        events = set()
-        for choice in group_choices.items():
-            if choice[0] in self.members: # Checks if action as made by an institution member
-                group_choices[choice[0]] = choice[1]
-                event = self.apply_rules(choice) #Applies rules to the choice and saves choice to the institution, also updates institution reputation
-                events.add(event)
-
     def evaluate_members(self):
         # Evaluate the members of the institution and remove if necessary
         for member in self.members:
-            if self.violations[member] > RULE_VIOLATION_THRESHOLD:
+            if self.violations[member] > self.config.rule_violation_threshold:
                 print(f"Agent {member} has violated the rules of {self.institution_id} too many times. Initiating removal.")
                 self.remove_member(member, "violation")
 
@@ -197,80 +177,134 @@ class Institution:
         return votes['for'] > votes['against']
 
     def add_event(self, event):
-        self.events.add(event)
+        self.events.append(event)
 
     def clear_events(self):
-        self.events = set()
+        self.events = []
+
+
+# Layout of the agents and institutions of a game, which only depends on the population size and the configuration
+# It is built once for each size and shared by the games of that size, which only add what depends on their seed
+class SetupTemplate():
+    def __init__(self, num_agents, config):
+        self.agents = [] # Type name, agent id and stream key of each agent, in the order they are created
+        for type_name, count in population_counts(num_agents, config.population_mix).items():
+            for index in range(count):
+                self.agents.append((type_name, "agent" + str(len(self.agents)), (AGENT_TYPES[type_name].__name__, index)))
+        self.type_names = list(population_counts(num_agents, config.population_mix).keys())
+        self.agent_ids = [agent_id for _, agent_id, _ in self.agents]
+        self.institution_ids = ["institution" + str(num) for num in range(config.num_institutions)]
+        self.membership = MembershipIndex(self.agent_ids, self.institution_ids) # Each game gets an empty copy
+
+SETUP_TEMPLATES = {}
+
+def setup_template(num_agents, config):
+    key = (num_agents, tuple(config.population_mix.items()), config.num_institutions)
+    template = SETUP_TEMPLATES.get(key)
+    if template is None:
+        template = SETUP_TEMPLATES[key] = SetupTemplate(num_agents, config)
+    return template
+
+def dine(meal_choices, expensive_price, inexpensive_price):
+    # Bill of one dinner group and the share each member pays
+    expensive = meal_choices.count("expensive")
+    bill_total = expensive * expensive_price + (len(meal_choices) - expensive) * inexpensive_price
+
+    # Calculate the cost each agent must bear
+    if len(meal_choices) > 0:  # Ensure division by zero does not occur
+        individually_spent = bill_total / len(meal_choices)
+    else:
+        individually_spent = 0
+    return bill_total, individually_spent
 
 
 class MultiAgentSystem:
-    def __init__(self, num_agents = 30):
+    def __init__(self, num_agents = 30, seed = None, config = DEFAULT_CONFIG, streams = None):
+        self.config = config
         self.agents = {}
+        self.agents_by_type = {} # Agents of each type in AGENT_TYPES, in the order they were created
+        # Seeded streams give common random numbers across population sizes
+        # Other streams can be given instead, such as the recording and replaying streams in replay.py
+        self.streams = streams if streams is not None else RandomStreams(seed)
         self.reputation_sources = {}
         self.network = Network()
         self.institutions = {}
+        self.membership = None
+        self.rule_flags = {}
         self.games = {}
         self.num_agents = num_agents
+        self.trace = None # Set by TraceRecorder.attach to record the events of every round
+        self.aggregates = None # Set by TypeAggregates.attach to keep the sums of each agent type up to date
+        self.institution_index = None # Index of the institutional capital, kept up to date as an observer of the SCF
 
     def setup(self, scf):
-        # Attaching the defined reputations
-        agents_reputation = AgentsReputation()
-        institutional_reputation = InstitutionalReputation()
-
-        self.reputation_sources['agents_reputation'] = agents_reputation
-        self.reputation_sources['institutional_reputation'] = institutional_reputation
-
-        agent_id = 0
-        
-        num_of_type = int(self.num_agents / 3)
-
-        #Setup for the agents
-        for _ in range(num_of_type):
-            self.agents["agent" + str(agent_id)] = SocialAgent("agent" + str(agent_id), scf, self)
-            agent_id += 1
-
-        for _ in range(num_of_type):
-            self.agents["agent" + str(agent_id)] = DominantAgent("agent" + str(agent_id), scf, self)
-            agent_id += 1
-
-        for _ in range(num_of_type):
-            self.agents["agent" + str(agent_id)] = RandomAgent("agent" + str(agent_id), scf, self)
-            agent_id += 1
-
-        institution_id = 0
-        for num in range(NUM_INSTITUTIONS):
+        template = setup_template(self.num_agents, self.config)
+
+        #Setup for the agents, with the number of each type given by the population mix
+        # Each agent's random number streams are keyed by its type and index within the type,
+        # so the n-th agent of a type makes the same random draws in games of different sizes
+        self.agents_by_type = {type_name: [] for type_name in template.type_names}
+        for type_name, agent_id, stream_key in template.agents:
+            agent = AGENT_TYPES[type_name](agent_id, scf, self, self.config)
+            agent.stream_key = stream_key
+            self.agents[agent_id] = agent
+            self.agents_by_type[type_name].append(agent)
+
+        rules_stream = self.streams.get("rules")
+        for num, institution_id in enumerate(template.institution_ids):
             # Create ruleset, must ensure at least one institution without voting rule, to prevent deadloops
             if num == 0:
                 rules = {
                     'vote': False,
-                    'compulsory_cooperation': random.choice([True, False]),
-                    'sanctions': random.choice([True, False]),
-                    'graduated_sanctions': random.choice([True, False])
+                    'compulsory_cooperation': rules_stream.choice([True, False]),
+                    'sanctions': rules_stream.choice([True, False]),
+                    'graduated_sanctions': rules_stream.choice([True, False])
                 }
             else:
                 rules = {
-                    'vote': random.choice([True, False]),
-                    'compulsory_cooperation': random.choice([True, False]),
-                    'sanctions': random.choice([True, False]),
-                    'graduated_sanctions': random.choice([True, False])
+                    'vote': rules_stream.choice([True, False]),
+                    'compulsory_cooperation': rules_stream.choice([True, False]),
+                    'sanctions': rules_stream.choice([True, False]),
+                    'graduated_sanctions': rules_stream.choice([True, False])
                 }
 
-            institution = Institution("institution" + str(institution_id), rules, self)
-            self.institutions["institution" + str(institution_id)] = institution
+            self.institutions[institution_id] = Institution(institution_id, rules, self, self.config)
+
+        # Rules of every institution as arrays, used by the system-wide rule stage
+        self.rule_flags = {rule: np.array([institution.rules[rule] for institution in self.institutions.values()], dtype=bool)
+                           for rule in ['compulsory_cooperation', 'sanctions', 'graduated_sanctions']}
 
-            institution_id += 1
+        # Attaching the defined reputations, with a count for each agent and institution
+        self.reputation_sources['agents_reputation'] = AgentsReputation(self.agents.keys())
+        self.reputation_sources['institutional_reputation'] = InstitutionalReputation(self.institutions.keys())
 
+        # Membership is stored once, Institution.members and Agent.institutions are views of the same index
+        self.membership = template.membership.empty_copy()
+        for institution in self.institutions.values():
+            institution.members = self.membership.institution_view(institution.institution_id)
         for agent in self.agents.values():
-            agent.institutions.add(random.choice(list(self.institutions.keys())))
+            agent.institutions = self.membership.agent_view(agent.agent_id)
+
+        # Each agent starts in a random institution, which only the agent counts until it joins through the institution,
+        # unless Config.list_initial_memberships has the institution list the agent from the start
+        for agent in self.agents.values():
+            institution_id = agent.rng("membership").choice(template.institution_ids)
+            if self.config.list_initial_memberships:
+                self.institutions[institution_id].members.add(agent.agent_id)
+                self.institutions[institution_id].violations[agent.agent_id] = 0
+            else:
+                agent.institutions.add(institution_id)
 
         # Setup the institutions social capital. Each institution starts with a capital of 0.5
         scf.data_structures["institutions"] = {institution: 0.5 for institution in self.institutions.keys()}
+        self.institution_index = InstitutionCapitalIndex(scf, self.membership)
         
         # Setup the agents social capital. Each agent starts with a capital of 0.5
         scf.data_structures["trustworthiness"] = {agent: 0.5 for agent in self.agents.keys()}
 
         # Setup the social network. Each agent starts with a score of 0 with all other agents
-        scf.data_structures["social_networks"] = {agent: {other_agent: 0 for other_agent in self.agents.keys()} for agent in self.agents.keys()}
+        # Scores are only stored once they are updated, a pair without a score has a score of 0
+        scf.data_structures["social_networks"] = {agent: {} for agent in self.agents.keys()}
 
         # All agents choose a dinner group first
         for agent in self.agents.values():
@@ -284,12 +318,15 @@ class MultiAgentSystem:
 
 
     def step(self): 
-        # Updates reputation from the reported values by the agent in agent.step()
+        # Updates reputation from the reported values by the agent in agent.step(), in one pass
+        # Incrementally only the agents that were reported on are updated, otherwise every agent is
         scf = list(self.agents.values())[0].scf
-        for agent in self.agents.keys(): 
-            value = self.reputation_sources['agents_reputation'].get_reputation(agent)
-            event = ReputationEvent("reputation", AGENT_REPUTATION_WEIGHT, agent, value)
-            scf.update_data('trustworthiness', event)
+        agents_reputation = self.reputation_sources['agents_reputation']
+        if self.config.incremental_trustworthiness:
+            agent_ids, values = agents_reputation.get_reputation_reported()
+        else:
+            agent_ids, values = agents_reputation.ids, agents_reputation.get_reputation_all()
+        scf.update_data_many('trustworthiness', agent_ids, values, self.config.agent_reputation_weight)
 
         # This step must be done here so that the joining and leaving of institutions in the next lines can be recorded.
         for institution in self.institutions.values():
@@ -297,7 +334,7 @@ class MultiAgentSystem:
 
         # JOIN OR LEAVE INSTITUTIONS
         for agent in self.agents.items():
-            if random.random() > JOIN_INSTITUTION_THRESHOLD:
+            if agent[1].rng("join").random() > self.config.join_institution_threshold:
                 # Join institution with probability p
                 institution = agent[1].choose_institution_to_join(self.institutions)
                 if not institution: # Skips if the agent didnt find any valid institutions to join
@@ -310,61 +347,97 @@ class MultiAgentSystem:
         
         # Dinner groups are formed based on agents choice
         self.games = {}
-        for agent in self.agents.items():
-            chosen_institution_id = agent[1].choose_dinner_group() # Agent decides which institution to join
+        for agent_id, chosen_institution_id in self.choose_dinner_groups().items():
             if chosen_institution_id not in self.games:
                 self.games[chosen_institution_id] = []  # Initialize list if not already present
 
-            self.games[chosen_institution_id].append(agent[1].agent_id)  # Append agent to the chosen institution's list
+            self.games[chosen_institution_id].append(agent_id)  # Append agent to the chosen institution's list
 
-        choices = {}
-        for agent in self.agents.items():
-            chosen_institution_id = agent[1].choose_dinner_group()
-            choices[agent[0]] = agent[1].decide(chosen_institution_id)
+        # Each agent type decides for all its agents at once
+        dinner_groups = self.choose_dinner_groups()
+        choices = dict.fromkeys(self.agents.keys())
+        for type_name, agents in self.agents_by_type.items():
+            if agents:
+                decisions = AGENT_TYPES[type_name].decide_batch(self, agents, [dinner_groups[agent.agent_id] for agent in agents])
+                choices.update(zip([agent.agent_id for agent in agents], decisions))
 
         print("Agents have made their choices.")
 
-        for dinner_group in self.games.items():
-            # Initialize dictionary to store choices for this group
-
-            groups_choices = {}
-            institution_id = dinner_group[0]
-            agents_in_group = dinner_group[1]
-            
-            # Iterate over choices to build choices for this specific dinner group
-            for agent_id, choice in choices.items():
-                if agent_id in agents_in_group:  # Ensure the agent is in the current dinner group
-                    groups_choices[agent_id] = choice
-
-            # Calculate the total bill for the dinner group
-            bill_total = self.create_bill(groups_choices)
+        for institution_id, agents_in_group in self.games.items():
+            # Each group is billed for the choices of its own members only
+            meal_choices = [choices[agent_id] for agent_id in agents_in_group]
+            bill_total, individually_spent = dine(meal_choices, self.config.expensive_price, self.config.inexpensive_price)
+            groups_choices = dict(zip(agents_in_group, meal_choices))
 
-            # Calculate the cost each agent must bear
-            if len(agents_in_group) > 0:  # Ensure division by zero does not occur
-                individually_spent = bill_total / len(agents_in_group)
-            else:
-                individually_spent = 0
-
-            print(f"Agents in institution {dinner_group[0]} have decided what to eat and the bill is {bill_total}.")
+            print(f"Agents in institution {institution_id} have decided what to eat and the bill is {bill_total}.")
             print(f"Each agent must pay {individually_spent}.")
-                
+
             for agent_id in agents_in_group:
                 self.agents[agent_id].calculate_utility(groups_choices[agent_id], individually_spent)
 
-            print(f"Agents in institution {dinner_group[0]} have dined and calculated their utility.")
+            print(f"Agents in institution {institution_id} have dined and calculated their utility.")
 
-            events = self.institutions[dinner_group[0]].update_institution(groups_choices) # Applies institution rules and sanctions
-            self.institutions[dinner_group[0]].last_orders = groups_choices # Choices are saved to be processes by agent before next round
-            
-            # Update institutional reputation based on the events
-            if events:
-                for event in events:
-                    if event.type == "Cooperated" or event.type == "Not Cooperated":
-                        self.reputation_sources['institutional_reputation'].report_rule_compliance(dinner_group, event)
-                
+            self.institutions[institution_id].last_orders = groups_choices # Choices are saved to be processes by agent before next round
+
+        # Applies institution rules and sanctions for all institutions at once
+        rule_outcome = self.apply_institution_rules(choices)
         print("Institutions have been updated.")
-        for institution in self.institutions.values():
-            institution.print_events()
+
+        if self.trace is not None:
+            self.trace.record_round(self, choices, rule_outcome)
+
+    def choose_dinner_groups(self):
+        # The dinner group every agent chooses, asked from each agent type at once and returned in the order of the agents
+        dinner_groups = dict.fromkeys(self.agents.keys())
+        for type_name, agents in self.agents_by_type.items():
+            if agents:
+                dinner_groups.update(zip([agent.agent_id for agent in agents], AGENT_TYPES[type_name].choose_dinner_group_batch(self, agents)))
+        return dinner_groups
+
+    def apply_institution_rules(self, choices):
+        """
+        Applies the rules of every institution to the choices of its members that dined with it.
+        Finds the cooperations, sanctions and violations of every member's choice in the institution it dined with,
+        using the rule flags of all institutions at once. The events are handed to the institutions in bulk.
+        """
+        agent_index = self.membership.agent_index
+        institution_index = self.membership.institution_index
+
+        # Institution each agent dined with, and whether it ordered the expensive meal
+        groups = np.empty(len(agent_index), dtype=np.int64)
+        for institution_id, agents_in_group in self.games.items():
+            groups[[agent_index[agent_id] for agent_id in agents_in_group]] = institution_index[institution_id]
+        expensive = np.fromiter((choices[agent_id] == "expensive" for agent_id in self.membership.agent_ids), dtype=bool, count=len(agent_index))
+
+        # Only choices made by members of the institution count
+        positions = np.flatnonzero(self.membership.listed(np.arange(len(groups)), groups))
+        groups = groups[positions]
+        expensive = expensive[positions]
+
+        violated = expensive & self.rule_flags['compulsory_cooperation'][groups]
+        sanctioned = violated & self.rule_flags['sanctions'][groups]
+        not_sanctioned = violated & ~self.rule_flags['sanctions'][groups]
+
+        # Graduated sanctions are not implemented yet, so only regular sanctions are counted as violations
+        counted = sanctioned & ~self.rule_flags['graduated_sanctions'][groups]
+        for position, group in zip(positions[counted].tolist(), groups[counted].tolist()):
+            self.institutions[self.membership.institution_ids[group]].violations[self.membership.agent_ids[position]] += 1
+
+        # For each agent a sanction event comes before its cooperation event
+        rule_positions = np.concatenate([positions[violated], positions])
+        rule_groups = np.concatenate([groups[violated], groups])
+        rule_codes = np.concatenate([np.where(sanctioned[violated], 0, 1), np.where(expensive, 3, 2)])
+        order = np.lexsort((rule_codes, rule_positions, rule_groups))
+        rule_positions, rule_groups, rule_codes = rule_positions[order], rule_groups[order], rule_codes[order]
+
+        # Hand each institution its slice of the sorted events
+        boundaries = np.searchsorted(rule_groups, np.arange(len(self.membership.institution_ids) + 1))
+        for group, institution_id in enumerate(self.membership.institution_ids):
+            start, end = boundaries[group], boundaries[group + 1]
+            if start < end:
+                self.institutions[institution_id].add_rule_events(rule_positions[start:end], rule_codes[start:end])
+
+        return positions, groups, expensive, sanctioned, not_sanctioned
 
 
     def create_bill(self, choices):
@@ -373,7 +446,7 @@ class MultiAgentSystem:
             meal_type = choice[1]
             bill_choices[meal_type] += 1
 
-        bill_total = bill_choices["expensive"] * EXPENSIVE_PRICE + bill_choices["inexpensive"] * INEXPENSIVE_PRICE
+        bill_total = bill_choices["expensive"] * self.config.expensive_price + bill_choices["inexpensive"] * self.config.inexpensive_price
 
         return bill_total
             
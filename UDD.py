@@ -1,11 +1,16 @@
-from static_values import EXPENSIVE_PRICE, INEXPENSIVE_PRICE
 from scf import create_complete_scf
 from MAS import MultiAgentSystem
-from agents import SocialAgent, DominantAgent, RandomAgent
+from config import DEFAULT_CONFIG
+from event_trace import TraceRecorder
+from steady_state import steady_state_detector
+import profiling
+import functools
 import time
 import sys
+import math
 import contextlib
 import io
+from statistics import NormalDist
 from contextlib import contextmanager
 from collections import defaultdict
 
@@ -13,27 +18,50 @@ from collections import defaultdict
 @contextlib.contextmanager
 def suppress_print():
     # Redirect stdout to a string IO
+    # The buffer is given to the caller, so the memory used by the suppressed output can be measured
     original_stdout = sys.stdout
     sys.stdout = io.StringIO()
     try:
-        yield
+        yield sys.stdout
     finally:
         sys.stdout = original_stdout
 
 class UDD:
-    def __init__(self, num_agents = 60):
+    def __init__(self, num_agents = 60, seed = None, config = DEFAULT_CONFIG, trace_path = None, streams = None):
         self.num_agents = num_agents
+        self.seed = seed
+        self.config = config
+        self.streams = streams # Random number streams of the system, made from the seed if not given
+        self.trace_path = trace_path # Records the events of every round to this file if given, see event_trace.py
+        self.trace = None
 
     def initialize_system(self):
         # Create and setup the new system
-        scf = create_complete_scf()
-        self.system = MultiAgentSystem(num_agents = self.num_agents)
+        scf = create_complete_scf(self.config)
+        self.system = MultiAgentSystem(num_agents = self.num_agents, seed = self.seed, config = self.config, streams = self.streams)
         self.system.setup(scf)
 
+        if self.trace_path is not None:
+            self.trace = TraceRecorder(self.trace_path)
+            self.trace.attach(self.system)
+
+    def close(self):
+        # Writes the rest of the trace, if the game is traced
+        if self.trace is not None:
+            self.trace.close()
+            self.trace = None
+
+    # A game played in a with block is closed even if it raises, so its trace file is not left open
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
     def step(self):
         # Reset reputation data for each round
-        self.system.reputation_sources['agents_reputation'].records = {}
-        self.system.reputation_sources['institutional_reputation'].records = {}
+        self.system.reputation_sources['agents_reputation'].reset()
+        self.system.reputation_sources['institutional_reputation'].reset()
 
         # First let each agent take their step
         for agent in self.system.agents.values():
@@ -42,90 +70,132 @@ class UDD:
         # Then perform system-wide updates
         self.system.step()
 
-    def check_breakpoint(self):
+    def breakpoint_satisfactions(self):
+        # Average of the satisfaction of the last rounds for each agent type, so population mixes with unequal shares compare fairly
+        satisfactions = {}
+        for type_name, agents in self.system.agents_by_type.items():
+            if agents:
+                satisfactions[type_name] = sum([sum(agent.last_ten_satisfactions) for agent in agents]) / len(agents)
+        return satisfactions
+
+    def check_breakpoint(self, satisfactions = None):
         # Check wether the system has reached a breakpoint
         # The system has reached a breakpoint if the the social agents have surpassed the other agents for the last 5 rounds
-
-        # Get the satisfaction of the last rounds for each agent type
-        social_satisfactions = []
-        dominant_satisfactions = []
-        random_satisfactions = []
-
-        for agent in self.system.agents.values():
-            if isinstance(agent, SocialAgent):
-                social_satisfactions.append(agent.last_ten_satisfactions) # Appends the array of satisfactions
-            elif isinstance(agent, DominantAgent):
-                dominant_satisfactions.append(agent.last_ten_satisfactions)
-            else:
-                random_satisfactions.append(agent.last_ten_satisfactions)
+        if satisfactions is None:
+            satisfactions = self.breakpoint_satisfactions()
 
         # Check if the social agents have surpassed the other agents for the last 5 rounds
-        sum_social = sum([sum(satisfaction) for satisfaction in social_satisfactions])
-        sum_dominant = sum([sum(satisfaction) for satisfaction in dominant_satisfactions])
-        sum_random = sum([sum(satisfaction) for satisfaction in random_satisfactions])
-
-        return sum_social > sum_dominant and sum_social > sum_random
+        if "Social Agent" not in satisfactions:
+            return False
+        return all(satisfactions["Social Agent"] > value for type_name, value in satisfactions.items() if type_name != "Social Agent")
 
 
     
     def get_average_satisfactions(self):
-        # Get the average satisfaction of the agents
-
-        satisfactions = {"Social Agent": 0, "Dominant Agent": 0, "Random Agent": 0}
-
-        for agent in self.system.agents.values():
-            if isinstance(agent, SocialAgent):
-                satisfactions["Social Agent"] += agent.get_satisfaction()
-            elif isinstance(agent, DominantAgent):
-                satisfactions["Dominant Agent"] += agent.get_satisfaction()
-            else:
-                satisfactions["Random Agent"] += agent.get_satisfaction()
-
-        # Return the average satisfaction of each agent type
-        return {key: value/(self.num_agents/3) for key, value in satisfactions.items()}
+        # Get the average satisfaction of each agent type, 0 for types without agents
+        satisfactions = {}
+        for type_name, agents in self.system.agents_by_type.items():
+            satisfactions[type_name] = sum(agent.get_satisfaction() for agent in agents) / len(agents) if agents else 0
+
+        return satisfactions
+
+def game_seed(base_seed, game, *labels):
+    # Seed of a single game, or None for an unseeded game
+    # Games that should share random numbers, such as the same game index at different population sizes, get the same labels
+    if base_seed is None:
+        return None
+    return (base_seed, game) + labels
+
+def run_game(cache, job, seed, function, *args, **kwargs):
+    # Plays a game through the result cache if there is one, and under the profiler if profiling is on (see profiling.py)
+    if profiling.PROFILER is not None:
+        function = functools.partial(profiling.PROFILER.run, function)
+    if cache is None:
+        return function(*args, seed = seed, **kwargs)
+    return cache.run(job, seed, function, *args, **kwargs)
+
+def play_satisfaction_game(num_agents, rounds, seed = None, config = DEFAULT_CONFIG, trace_path = None, on_round = None):
+    # Plays a single game and returns the average satisfaction of each agent type every second round, and at the end of the game
+    # on_round(round, averages) is called with every recorded round as soon as it is played
+    # With steady state detection on, a game that is steady is ended, and its remaining rounds get the steady averages
+    detector = steady_state_detector(config)
+    round_satisfactions = []
+    steady_round = None
+
+    # Play the game for a set amount of rounds
+    with UDD(num_agents = num_agents, seed = seed, config = config, trace_path = trace_path) as udd:
+        udd.initialize_system()
+        with suppress_print():
+            # The averages of the unplayed game are the result of a game without rounds
+            averages = udd.get_average_satisfactions()
+            for round_num in range(rounds):
+                if steady_round is None:
+                    udd.step()
+                    # Averaged over every agent, so only for the rounds that are recorded, the last round and the detector
+                    if detector is not None or round_num % 2 == 1 or round_num == rounds - 1:
+                        averages = udd.get_average_satisfactions()
+                    if detector is not None and detector.add_round(udd.system, averages):
+                        steady_round = round_num + 1
+                        averages = detector.steady_values()
+                # Rounds after the game became steady are not played
 
-def play_satisfaction(file):
+                # Collect satisfaction every second round
+                if round_num % 2 == 1:
+                    round_satisfactions.append([round_num + 1, averages])
+                    if on_round is not None:
+                        on_round(*round_satisfactions[-1])
+
+    result = {"rounds": round_satisfactions, "final": averages}
+    if detector is not None:
+        result["steady_round"] = steady_round # Rounds played before the game was steady, None if it never was
+    return result
+
+def play_satisfaction_job(cache, num_agents, rounds, seed, config = DEFAULT_CONFIG, on_round = None):
+    # Results taken from the cache are not played, so on_round is not called for them
+    job = {"experiment": "satisfaction", "num_agents": num_agents, "rounds": rounds, "config": config.to_dict()}
+    return run_game(cache, job, seed, play_satisfaction_game, num_agents, rounds, config = config, on_round = on_round)
+
+def play_satisfaction(file, base_seed = None, cache = None, config = DEFAULT_CONFIG):
+    """
+    Plays GAMES games and averages the satisfaction of each agent type every second round.
+    Games are only seeded if base_seed is given, or a result cache is used.
+    """
     start_time = time.time()
 
     # Run simulations
     ROUNDS = 100
     GAMES = 50
+    NUM_AGENTS = 60
 
-    averages = {"Social Agent": 0, "Dominant Agent": 0, "Random Agent": 0}
+    if base_seed is None and cache is not None:
+        base_seed = 0
 
-    
-    udd = UDD()
+    # Sums by agent type, only the types that play in the games are reported
+    averages = defaultdict(float)
 
-    round_satisfactions = defaultdict(lambda: {"Social Agent": 0, "Dominant Agent": 0, "Random Agent": 0})
+    round_satisfactions = defaultdict(lambda: defaultdict(float))
     round_counts = defaultdict(int)
 
     for game in range(GAMES):
         game_start_time = time.time()
 
-        udd.initialize_system()
-
-
-        # Play the game for a set amount of rounds
-        with suppress_print():
-            for round_num in range(ROUNDS):
-                udd.step()
+        seed = game_seed(base_seed, game, "satisfaction")
+        result = play_satisfaction_job(cache, NUM_AGENTS, ROUNDS, seed, config)
 
-                # Collect satisfaction every second round
-                if round_num % 2 == 1:
-                    current_averages = udd.get_average_satisfactions()
-                    for key, value in current_averages.items():
-                        round_satisfactions[round_num + 1][key] += value
-                    round_counts[round_num + 1] += 1
+        for round_num, current_averages in result["rounds"]:
+            for key, value in current_averages.items():
+                round_satisfactions[round_num][key] += value
+            round_counts[round_num] += 1
         
         # Add the average satisfaction of each agent type to the averages
-        for key, value in udd.get_average_satisfactions().items():
+        for key, value in result["final"].items():
             averages[key] += value
 
         game_end_time = time.time()
         print(f"Game {game+1} - Total game time: {game_end_time - game_start_time} seconds")
 
     # Calculate average satisfaction for each recorded round
-    average_satisfactions_per_round = defaultdict(lambda: {"Social Agent": 0, "Dominant Agent": 0, "Random Agent": 0})
+    average_satisfactions_per_round = defaultdict(dict)
     for round_num, counts in round_counts.items():
         for key in round_satisfactions[round_num]:
             average_satisfactions_per_round[round_num][key] = round_satisfactions[round_num][key] / counts
@@ -158,37 +228,61 @@ def play_satisfaction(file):
 
 
 
-def play_breakpoints(file):
+def play_breakpoint_game(num_agents, max_rounds, seed = None, config = DEFAULT_CONFIG):
+    # Plays a single game and returns the round the breakpoint was reached, or max_rounds if it never was
+    detector = steady_state_detector(config)
+
+    # Play until the breakpoint is reached, or rounds reach max_rounds
+    with UDD(num_agents = num_agents, seed = seed, config = config) as udd:
+        udd.initialize_system()
+        with suppress_print():
+            for round in range(max_rounds):
+                udd.step()
+                satisfactions = udd.breakpoint_satisfactions()
+                if udd.check_breakpoint(satisfactions):
+                    # Records what round the breakpoint was reached
+                    return round
+
+                # A steady game where the social agents stay behind would play on to max_rounds
+                if detector is not None and detector.add_round(udd.system, satisfactions) and detector.breakpoint_out_of_reach():
+                    break
+
+    print(f"Breakpoint for {num_agents} agents was never reached")
+    return int(max_rounds)
+
+def breakpoint_game_seed(base_seed, game, num_agents, common_random_numbers):
+    # With common random numbers, game number i uses the same random number streams for every population size
+    if common_random_numbers:
+        return game_seed(base_seed, game)
+    return game_seed(base_seed, game, num_agents)
+
+def play_breakpoint_job(cache, num_agents, max_rounds, seed, config = DEFAULT_CONFIG):
+    job = {"experiment": "breakpoint", "num_agents": num_agents, "max_rounds": max_rounds, "config": config.to_dict()}
+    return run_game(cache, job, seed, play_breakpoint_game, num_agents, max_rounds, config = config)
+
+def play_breakpoints(file, common_random_numbers = False, base_seed = None, cache = None, config = DEFAULT_CONFIG):
+    """
+    Plays GAMES games for every population size and averages the round the breakpoint was reached.
+    With common_random_numbers, game number i uses the same random number streams for every population size,
+    which lowers the variance of the differences between sizes.
+    Games are only seeded if base_seed is given, common random numbers are used, or a result cache is used.
+    """
     start_time = time.time()
 
     MAXROUNDS = 1000
     GAMES = 50
     breakpoints = {15: 0, 30: 0, 60: 0, 90: 0, 120: 0, 150: 0, 180: 0, 240: 0, 300: 0}
 
+    if base_seed is None and (common_random_numbers or cache is not None):
+        base_seed = 0
 
     for game in range(GAMES):
         game_start_time = time.time()
 
         for game_type in breakpoints.keys():
-
-            udd = UDD(num_agents = game_type)
-            udd.initialize_system()
-            breakpoint = None
-
-            # Play until the breakpoint is reached, or rounds reach 1000
-            with suppress_print():
-                for round in range(MAXROUNDS):
-                    udd.step()
-                    if udd.check_breakpoint():
-                        # Records what round the breakpoint was reached
-                        breakpoint = round
-                        breakpoints[game_type] += round
-                        break
-            
-            if breakpoint is None:
-                print(f"Breakpoint for {game_type} agents was never reached")
-                # If the breakpoint was never reached, add the max rounds to the breakpoints
-                breakpoints[game_type] += int(MAXROUNDS)
+            seed = breakpoint_game_seed(base_seed, game, game_type, common_random_numbers)
+            # If the breakpoint was never reached, the max rounds are added to the breakpoints
+            breakpoints[game_type] += play_breakpoint_job(cache, game_type, MAXROUNDS, seed, config)
             
         game_end_time = time.time()
         print(f"Game {game+1} - Total game time: {game_end_time - game_start_time} seconds")
@@ -214,14 +308,105 @@ def play_breakpoints(file):
 
     return breakpoints
 
+class BreakpointEstimate:
+    """
+    Running mean and confidence interval of the breakpoint round for one population size.
+    Uses Welford's online algorithm, so games can be added one at a time without storing them.
+    Breakpoints are whole rounds, so the variance is at least the rounding variance of 1/12.
+    A sample where every game had the same breakpoint, such as a size whose first games all reach it at round 0 or never
+    reach it, is not taken as certain either: by the rule of succession, the next game differs with probability
+    p = 1 / (games + 2), by spread rounds, so the variance is kept at least spread^2 * p * (1 - p) until a game differs.
+    """
+    def __init__(self, confidence = 0.95, spread = 1000):
+        self.confidence = confidence
+        self.spread = spread
+        self.z = NormalDist().inv_cdf(0.5 + confidence / 2)
+        self.games = 0
+        self.mean = 0.0
+        self.m2 = 0.0 # Sum of squared differences from the running mean
+
+    def add(self, breakpoint):
+        self.games += 1
+        delta = breakpoint - self.mean
+        self.mean += delta / self.games
+        self.m2 += delta * (breakpoint - self.mean)
+
+    def variance(self):
+        if self.games < 2:
+            return float('inf')
+        if self.m2 == 0:
+            p = 1 / (self.games + 2)
+            return max(1 / 12, self.spread ** 2 * p * (1 - p))
+        return max(self.m2 / (self.games - 1), 1 / 12)
+
+    def ci_width(self):
+        # Full width of the confidence interval around the mean
+        if self.games < 2:
+            return float('inf')
+        return 2 * self.z * math.sqrt(self.variance() / self.games)
+
+    def is_resolved(self, precision, min_games):
+        return self.games >= min_games and self.ci_width() <= precision
+
+def play_breakpoints_adaptive(file, precision = 50, confidence = 0.95, min_games = 5, max_games = 50, unanimous_spread = 2, common_random_numbers = False, base_seed = None, cache = None, config = DEFAULT_CONFIG):
+    """
+    Sequential-stopping version of play_breakpoints.
+    Each population size is sampled until the confidence interval of its average breakpoint is narrower than
+    precision (in rounds), or max_games games have been played. Sizes where every game has the same breakpoint, such
+    as MAXROUNDS, keep a floor on their variance (see BreakpointEstimate) as if the next game could differ by
+    unanimous_spread times the precision, so they stop after a few more games than min_games rather than at once.
+    Seeding and caching work as in play_breakpoints.
+    """
+    start_time = time.time()
+
+    MAXROUNDS = 1000
+    spread = min(unanimous_spread * precision, MAXROUNDS)
+    estimates = {game_type: BreakpointEstimate(confidence, spread) for game_type in [15, 30, 60, 90, 120, 150, 180, 240, 300]}
+    active = list(estimates.keys())
+
+    if base_seed is None and (common_random_numbers or cache is not None):
+        base_seed = 0
+
+    game = 0
+    while active and game < max_games:
+        game_start_time = time.time()
+
+        for game_type in list(active):
+            seed = breakpoint_game_seed(base_seed, game, game_type, common_random_numbers)
+            estimates[game_type].add(play_breakpoint_job(cache, game_type, MAXROUNDS, seed, config))
+
+            # Stop sampling this population size once the target precision is reached
+            if estimates[game_type].is_resolved(precision, min_games):
+                active.remove(game_type)
+
+        game += 1
+        game_end_time = time.time()
+        print(f"Game {game} - {len(active)} population sizes still sampling - Total game time: {game_end_time - game_start_time} seconds")
+
+    # Print the average breakpoint, the number of games played and the confidence interval width for each game type
+    for game_type, estimate in estimates.items():
+        print(f"Average breakpoint for {game_type} agents: {estimate.mean} ({estimate.games} games, {int(confidence * 100)}% CI width {estimate.ci_width()})")
+
+    end_time = time.time()
+    print(f"play_breakpoints_adaptive() took {end_time - start_time} seconds")
+
+    # Return the average breakpoints for each game type
+    return {game_type: estimate.mean for game_type, estimate in estimates.items()}
+
     
 
-def run_simulations(num):
+def run_simulations(num, adaptive = False, common_random_numbers = False, cache = None, config = DEFAULT_CONFIG):
+    """
+    Runs num simulations of play_satisfaction and play_breakpoints and writes the averages to simulation_results.csv.
+    With a ResultCache (cache.py), games that were already played with the same configuration, seed and code are reused.
+    The games are played with the given Config (config.py), which defaults to the values in static_values.
+    """
 
-    averages = {"Social Agent": 0, "Dominant Agent": 0, "Random Agent": 0}
+    averages = defaultdict(float)
     breakpoints = {15: 0, 30: 0, 60: 0, 90: 0, 120: 0, 150: 0, 180: 0, 240: 0, 300: 0}
     times = []
-    average_satisfactions_per_round = defaultdict(lambda: {"Social Agent": 0, "Dominant Agent": 0, "Random Agent": 0})
+    # Sums by agent type, only the types that play in the games are written
+    average_satisfactions_per_round = defaultdict(lambda: defaultdict(float))
     round_counts = defaultdict(int)
 
     sim_start = time.time()
@@ -232,7 +417,10 @@ def run_simulations(num):
             print(f"Running simulation {simulation_nr+1}")
             start_time = time.time()
 
-            satisfactions = play_satisfaction(file)
+            # Seeded runs give each simulation its own base seed, so simulations do not repeat the same games
+            base_seed = simulation_nr if common_random_numbers or cache is not None else None
+
+            satisfactions = play_satisfaction(file, base_seed = base_seed, cache = cache, config = config)
 
             # for key, value in satisfactions.items():
             #     averages[key] += value
@@ -241,7 +429,10 @@ def run_simulations(num):
                     average_satisfactions_per_round[round_num][key] += value
                 round_counts[round_num] += 1
             
-            points = play_breakpoints(file)
+            if adaptive:
+                points = play_breakpoints_adaptive(file, common_random_numbers = common_random_numbers, base_seed = base_seed, cache = cache, config = config)
+            else:
+                points = play_breakpoints(file, common_random_numbers = common_random_numbers, base_seed = base_seed, cache = cache, config = config)
 
             for key, value in points.items():
                 breakpoints[key] += value
@@ -282,9 +473,8 @@ def run_simulations(num):
         file.write("Simulation Results\n")
         for round_num, averages in average_satisfactions_per_round.items():
             file.write(f"Round {round_num}\n")
-            file.write(f"Social Agents: {averages['Social Agent']}\n")
-            file.write(f"Dominant Agents: {averages['Dominant Agent']}\n")
-            file.write(f"Random Agents: {averages['Random Agent']}\n")
+            for type_name, value in averages.items():
+                file.write(f"{type_name}s: {value}\n")
             file.write("\n")
 
         for key, value in breakpoints.items():
@@ -309,4 +499,5 @@ def run_simulations(num):
         print(f"Simulation {num} took {times[num]} seconds")
     print()
 
-run_simulations(10)
\ No newline at end of file
+if __name__ == "__main__":
+    run_simulations(10)
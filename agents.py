@@ -1,18 +1,52 @@
-from static_values import EXPEL_FROM_INSTITUTION_THRESHOLD, ADMIT_TO_INSTITUTION_THRESHOLD, DECISION_INDICATOR_WEIGHTS, COOPERATION_THRESHOLD, REPORT_REPUTATION_THRESHOLD, INEXPENSIVE_PRICE, EXPENSIVE_PRICE, AGENT_EVENT_WEIGHTS, AGENT_REPUTATION_WEIGHT, LEAVE_INSTITUTION_THRESHOLD, INSTITUTION_EVENT_WEIGHTS
-import random
+from config import DEFAULT_CONFIG
 from events import ReputationEvent, SocialNetworkEvent, InstitutionEvent
+import math
 import numpy as np
 
+# Agent types by name, the name is used in population mixes (Config.population_mix) and in the results
+AGENT_TYPES = {}
+
+def register_agent_type(name):
+    """Class decorator that registers an agent type under name, so games can be played with it."""
+    def register(agent_class):
+        agent_class.type_name = name
+        AGENT_TYPES[name] = agent_class
+        return agent_class
+    return register
+
+def population_counts(num_agents, population_mix):
+    # Number of agents of each type. Shares that do not divide num_agents are rounded down, as the equal thirds always were
+    total = sum(population_mix.values())
+    return {type_name: int(num_agents * share / total) for type_name, share in population_mix.items()}
+
 class Agent():
-    def __init__(self, agent_id, scf, system):
+    type_name = None
+
+    # Batch versions of the agent methods, called by the system with all agents of a type at once
+    # The defaults ask each agent in turn, types override them with array operations where they can
+    @classmethod
+    def choose_dinner_group_batch(cls, system, agents):
+        return [agent.choose_dinner_group() for agent in agents]
+
+    @classmethod
+    def decide_batch(cls, system, agents, dinner_groups):
+        return [agent.decide(dinner_group) for agent, dinner_group in zip(agents, dinner_groups)]
+
+    def __init__(self, agent_id, scf, system, config = DEFAULT_CONFIG):
         self.agent_id = agent_id
+        self.stream_key = agent_id # Key of the agents random number streams, set by the system during setup
         self.scf = scf
         self.system = system
+        self.config = config
         self.institutions = set()
         self.last_ten_satisfactions = []
         self.chosen_dinner_group = None
         self.last_choice = "inexpensive"
 
+    def rng(self, purpose):
+        # Random number stream used by this agent for the given purpose
+        return self.system.streams.get(purpose, self.stream_key)
+
     def calculate_utility(self, meal_type, individually_spent):
         joy = 0
         if meal_type == "expensive":
@@ -23,11 +57,18 @@ class Agent():
         current_satisfaction = joy / individually_spent
         # Append the new satisfaction and maintain only the last five entries
         self.last_ten_satisfactions.append(current_satisfaction)
+        removed = None
         if len(self.last_ten_satisfactions) > 10:
-            self.last_ten_satisfactions.pop(0)  # Remove the oldest satisfaction
+            removed = self.last_ten_satisfactions.pop(0)  # Remove the oldest satisfaction
+
+        if self.system.aggregates is not None:
+            self.system.aggregates.satisfaction_added(self, current_satisfaction, removed)
 
 
     def get_satisfaction(self):
+        # An agent that has not dined yet counts as 0, as in TypeAggregates
+        if not self.last_ten_satisfactions:
+            return 0
         return sum(self.last_ten_satisfactions) / len(self.last_ten_satisfactions)
     
     def get_social_capital(self, scf):
@@ -40,11 +81,14 @@ class Agent():
 
         return trustworthiness + social_network + institutions
 
+@register_agent_type("Social Agent")
 class SocialAgent(Agent):
-    def __init__(self, agent_id, scf, system):
+    def __init__(self, agent_id, scf, system, config = DEFAULT_CONFIG):
         self.agent_id = agent_id
+        self.stream_key = agent_id # Key of the agents random number streams, set by the system during setup
         self.scf = scf
         self.system = system
+        self.config = config
         self.institutions = set()
         self.last_ten_satisfactions = []
         self.chosen_dinner_group = None
@@ -77,15 +121,15 @@ class SocialAgent(Agent):
                 if event.type in event_actions:
                     # Handle social network update
                     try:
-                        weight = INSTITUTION_EVENT_WEIGHTS[event.type]
+                        weight = self.config.institution_event_weights[event.type]
                     except KeyError:
-                        weight = AGENT_EVENT_WEIGHTS[event.type]
+                        weight = self.config.agent_event_weights[event.type]
                     new_event = SocialNetworkEvent(event.type, weight, self.agent_id, event.agent_id)
                     self.scf.update_data("social_networks", new_event)
                     
                     # Handle institutional update if applicable
                     if event_actions[event.type][1]:
-                        new_event = InstitutionEvent(event.type, INSTITUTION_EVENT_WEIGHTS[event.type], self.agent_id, self.chosen_dinner_group)
+                        new_event = InstitutionEvent(event.type, self.config.institution_event_weights[event.type], self.agent_id, self.chosen_dinner_group)
                         self.scf.update_data("institutions", new_event)
                 else:
                     print(f"Event type {event.type} not found in event actions. Could not update scf from agent.")
@@ -101,18 +145,16 @@ class SocialAgent(Agent):
                 meal_type = choice[1]
                 bill_choices[meal_type] += 1
 
-            bill_total = bill_choices["expensive"] * EXPENSIVE_PRICE + bill_choices["inexpensive"] * INEXPENSIVE_PRICE
+            bill_total = bill_choices["expensive"] * self.config.expensive_price + bill_choices["inexpensive"] * self.config.inexpensive_price
             individually_spent = bill_total/len(last_orders)
-            self_cost = EXPENSIVE_PRICE if self.last_choice == "expensive" else INEXPENSIVE_PRICE
+            self_cost = self.config.expensive_price if self.last_choice == "expensive" else self.config.inexpensive_price
 
             success = (individually_spent >= self_cost)
 
-            for order in last_orders.items():
-                their_agent_id = order[0]
-
-                # Report if the meal was successful with probability q (Found in static_values.py)
-                if random.random() < REPORT_REPUTATION_THRESHOLD:
-                    self.system.reputation_sources['agents_reputation'].report_meal_success(their_agent_id, success)
+            # Report if the meal was successful with probability q (Found in the config), all reports are sent at once
+            report_stream = self.rng("report")
+            reported = [their_agent_id for their_agent_id in last_orders.keys() if report_stream.random() < self.config.report_reputation_threshold]
+            self.system.reputation_sources['agents_reputation'].report_many(reported, success)
      
 
         process_orders(last_orders)
@@ -131,17 +173,8 @@ class SocialAgent(Agent):
             institution = self.choose_institution_to_join(self.system.institutions)
             self.system.institutions[institution].add_member(self.agent_id)
 
-        # Initialize variables to find the institution with the highest social capital
-        highest_social_capital = -float('inf')
-        self.chosen_dinner_group = None
-
-        # Iterate over each institution the agent is a member of
-        for institution_id in self.institutions:
-            social_capital = self.scf.metrics["institutions"](self.scf, institution_id)
-            if social_capital > highest_social_capital:
-                highest_social_capital = social_capital
-                self.chosen_dinner_group = institution_id
-
+        # The index of the institutional capital breaks ties by the sorted order of the institutions, so they are broken the same way every game
+        self.chosen_dinner_group = self.system.institution_index.best_member(self.agent_id)
         return self.chosen_dinner_group
         
     def decide(self, dinner_group):
@@ -164,15 +197,51 @@ class SocialAgent(Agent):
         }
 
         # Compute the weighted sum of social capital indicators
-        cooperation_score = sum(DECISION_INDICATOR_WEIGHTS[key] * indicators[key] for key in DECISION_INDICATOR_WEIGHTS.keys())
+        cooperation_score = sum(self.config.decision_indicator_weights[key] * indicators[key] for key in self.config.decision_indicator_weights.keys())
 
-        if cooperation_score < COOPERATION_THRESHOLD:
+        if cooperation_score < self.config.cooperation_threshold:
             self.last_choice = "expensive"
             return self.last_choice
         else:
             self.last_choice = "inexpensive"
             return self.last_choice
 
+    @classmethod
+    def choose_dinner_group_batch(cls, system, agents):
+        # Same choice as choose_dinner_group for every agent: the member institution with the highest social capital,
+        # ties going to the first institution in sorted order
+        for agent in agents:
+            if not agent.institutions:
+                agent.choose_dinner_group() # Joins an institution first
+
+        # Looked up in the index of the institutional capital, which does not scan every institution for every agent
+        dinner_groups = [system.institution_index.best_member(agent.agent_id) for agent in agents]
+        for agent, dinner_group in zip(agents, dinner_groups):
+            agent.chosen_dinner_group = dinner_group
+        return dinner_groups
+
+    @classmethod
+    def decide_batch(cls, system, agents, dinner_groups):
+        # Same decision as decide, with the indicators of all the agents as arrays
+        scf = agents[0].scf
+        config = agents[0].config
+        trustworthiness = scf.data_structures['trustworthiness']
+        index = system.institution_index # Each agent's institutions only, so the cost does not grow with the number of institutions
+
+        indicators = {
+            'agents_reputation': np.array([trustworthiness.get(agent.agent_id, 0) for agent in agents], dtype=float),
+            'institutional_reputation': np.array([trustworthiness.get(dinner_group, 1) for dinner_group in dinner_groups], dtype=float),
+            'social_networks': np.array([scf.metrics['social_networks'](scf, agent.agent_id) for agent in agents], dtype=float),
+            'institution': np.array([index.member_capital(agent.agent_id) for agent in agents], dtype=float)
+        }
+
+        cooperation_scores = sum(config.decision_indicator_weights[key] * indicators[key] for key in config.decision_indicator_weights.keys())
+
+        choices = np.where(cooperation_scores < config.cooperation_threshold, "expensive", "inexpensive").tolist()
+        for agent, choice in zip(agents, choices):
+            agent.last_choice = choice
+        return choices
+
     def choose_institution_to_join(self, all_institutions):
         """
         Choose an institution based on social capital values using a Boltzmann distribution.
@@ -185,6 +254,13 @@ class SocialAgent(Agent):
         - (str): The chosen institution name
         """
 
+        # Sampled from the index of the institutional capital, over the institutions the agent is not a member of
+        if self.system.institution_index is not None and all_institutions is self.system.institutions:
+            chosen_institution = self.system.institution_index.sample_join(self.agent_id, self.rng("join"))
+            if chosen_institution is None:
+                print("No institution to join.")
+            return chosen_institution
+
         # Filter institutions based on if the agent is already member
         filtered_institutions = {k: v for k, v in all_institutions.items() if k not in self.institutions}
         
@@ -201,17 +277,17 @@ class SocialAgent(Agent):
             for institution_id in filtered_institutions.keys():
                 sc_set[institution_id] = self.scf.metrics['institutions'](self.scf, institution_id)
 
-            values = np.array(list(sc_set.values()))
+            exponentials = [math.exp(value) for value in sc_set.values()]
 
-            probabilities = np.exp(values) / np.sum(np.exp(values))
-            chosen_institution = np.random.choice(list(filtered_institutions.keys()), p=probabilities)
+            probabilities = [exponential / sum(exponentials) for exponential in exponentials]
+            chosen_institution = self.rng("join").choices(list(filtered_institutions.keys()), weights=probabilities)[0]
             filtered_institutions.pop(chosen_institution, None) 
 
         return chosen_institution
     
     def evaluate_institutions(self):
-        for institution in self.institutions:
-            if  self.scf.metrics['institutions'](self.scf, institution) < LEAVE_INSTITUTION_THRESHOLD:
+        for institution in sorted(self.institutions):
+            if  self.scf.metrics['institutions'](self.scf, institution) < self.config.leave_institution_threshold:
                 self.system.institutions[institution].remove_member(self.agent_id, self.agent_id)
                 print(f"Agent {self.agent_id} left institution {institution}.")
             break
@@ -226,21 +302,24 @@ class SocialAgent(Agent):
         sc = social_network_capital + trustworthiness_capital
 
         if action_type == "Expel":
-            if sc < EXPEL_FROM_INSTITUTION_THRESHOLD:
+            if sc < self.config.expel_from_institution_threshold:
                 return True
             else:
                 return False
         elif action_type == "Join":
-            if sc > ADMIT_TO_INSTITUTION_THRESHOLD:
+            if sc > self.config.admit_to_institution_threshold:
                 return True
             else:
                 return False
 
 
+@register_agent_type("Random Agent")
 class RandomAgent(Agent):
-    def __init__(self, agent_id, scf, system):
+    def __init__(self, agent_id, scf, system, config = DEFAULT_CONFIG):
         self.agent_id = agent_id
+        self.stream_key = agent_id # Key of the agents random number streams, set by the system during setup
         self.system = system
+        self.config = config
         self.institutions = set()
         self.last_ten_satisfactions = []
         self.chosen_dinner_group = None
@@ -258,18 +337,18 @@ class RandomAgent(Agent):
             possible_institutions.institutions.remove(institution)
             self.system.institutions[institution].add_member(self.agent_id)
 
-        self.chosen_dinner_group = random.choice(list(self.institutions))
+        self.chosen_dinner_group = self.rng("dinner").choice(sorted(self.institutions))
         return self.chosen_dinner_group
 
     def choose_institution_to_join(self, all_institutions):
         # Has no info of the institutions social capital, so chooses randomly between institutions
-        return random.choice(list(all_institutions.keys()))
+        return self.rng("join").choice(list(all_institutions.keys()))
 
     def decide(self, dinner_group):
-        return random.choice(["expensive", "inexpensive"])
+        return self.rng("decide").choice(["expensive", "inexpensive"])
 
     def vote(self, action_type, agent_id):
-        return random.choice([True, False])
+        return self.rng("vote").choice([True, False])
 
     def process_orders(self, last_orders):
             # Process last orders and add events to the events set
@@ -282,24 +361,25 @@ class RandomAgent(Agent):
                 meal_type = choice[1]
                 bill_choices[meal_type] += 1
 
-            bill_total = bill_choices["expensive"] * EXPENSIVE_PRICE + bill_choices["inexpensive"] * INEXPENSIVE_PRICE
+            bill_total = bill_choices["expensive"] * self.config.expensive_price + bill_choices["inexpensive"] * self.config.inexpensive_price
             individually_spent = bill_total/len(last_orders)
-            self_cost = EXPENSIVE_PRICE if self.last_choice == "expensive" else INEXPENSIVE_PRICE
+            self_cost = self.config.expensive_price if self.last_choice == "expensive" else self.config.inexpensive_price
 
             success = (individually_spent >= self_cost)
 
-            for order in last_orders.items():
-                their_agent_id = order[0]
-
-                # Report if the meal was successful with probability q (Found in static_values.py)
-                if random.random() < REPORT_REPUTATION_THRESHOLD:
-                    self.system.reputation_sources['agents_reputation'].report_meal_success(their_agent_id, success)
+            # Report if the meal was successful with probability q (Found in the config), all reports are sent at once
+            report_stream = self.rng("report")
+            reported = [their_agent_id for their_agent_id in last_orders.keys() if report_stream.random() < self.config.report_reputation_threshold]
+            self.system.reputation_sources['agents_reputation'].report_many(reported, success)
      
 
+@register_agent_type("Dominant Agent")
 class DominantAgent(Agent):
-    def __init__(self, agent_id, scf, system):
+    def __init__(self, agent_id, scf, system, config = DEFAULT_CONFIG):
         self.agent_id = agent_id
+        self.stream_key = agent_id # Key of the agents random number streams, set by the system during setup
         self.system = system
+        self.config = config
         self.institutions = set()
         self.last_ten_satisfactions = []
         self.chosen_dinner_group = None
@@ -318,18 +398,22 @@ class DominantAgent(Agent):
             possible_institutions.institutions.remove(institution)
             self.system.institutions[institution].add_member(self.agent_id)
 
-        self.chosen_dinner_group = random.choice(list(self.institutions))
+        self.chosen_dinner_group = self.rng("dinner").choice(sorted(self.institutions))
         return self.chosen_dinner_group
 
     def choose_institution_to_join(self, all_institutions):
         # Has no info of the institutions social capital, so chooses randomly between institutions
-        return random.choice(list(all_institutions.keys()))
+        return self.rng("join").choice(list(all_institutions.keys()))
 
     def decide(self, dinner_group):
         return "expensive"
 
+    @classmethod
+    def decide_batch(cls, system, agents, dinner_groups):
+        return ["expensive"] * len(agents)
+
     def vote(self, action_type, agent_id):
-        return random.choice([True, False])
+        return self.rng("vote").choice([True, False])
 
     def process_orders(self, last_orders):
             # Process last orders and add events to the events set
@@ -342,16 +426,14 @@ class DominantAgent(Agent):
                 meal_type = choice[1]
                 bill_choices[meal_type] += 1
 
-            bill_total = bill_choices["expensive"] * EXPENSIVE_PRICE + bill_choices["inexpensive"] * INEXPENSIVE_PRICE
+            bill_total = bill_choices["expensive"] * self.config.expensive_price + bill_choices["inexpensive"] * self.config.inexpensive_price
             individually_spent = bill_total/len(last_orders)
-            self_cost = EXPENSIVE_PRICE if self.last_choice == "expensive" else INEXPENSIVE_PRICE
+            self_cost = self.config.expensive_price if self.last_choice == "expensive" else self.config.inexpensive_price
 
             success = (individually_spent >= self_cost)
 
-            for order in last_orders.items():
-                their_agent_id = order[0]
-
-                # Report if the meal was successful with probability q (Found in static_values.py)
-                if random.random() < REPORT_REPUTATION_THRESHOLD:
-                    self.system.reputation_sources['agents_reputation'].report_meal_success(their_agent_id, success)
+            # Report if the meal was successful with probability q (Found in the config), all reports are sent at once
+            report_stream = self.rng("report")
+            reported = [their_agent_id for their_agent_id in last_orders.keys() if report_stream.random() < self.config.report_reputation_threshold]
+            self.system.reputation_sources['agents_reputation'].report_many(reported, success)
      
@@ -0,0 +1,134 @@
+import numpy as np
+
+# Aggregates of each agent type, kept up to date while the game is played
+# The SCF, the membership index and the agents tell the aggregates about every change they make, so the sums of each
+# agent type are moved by the change instead of being recomputed. Reading them costs O(agent types), where the
+# reporters in visualization.py used to go over every agent, and over every pair of agents for the social networks.
+# Sums kept this way can drift from a fresh sum in the last digits, so they are only used for reporting.
+
+class TypeAggregates():
+    def __init__(self):
+        self.system = None
+        self.type_names = []
+
+    def attach(self, system):
+        """Starts keeping the aggregates of the system, from its current state. Call after MultiAgentSystem.setup."""
+        self.system = system
+        system.aggregates = self
+        scf = next(iter(system.agents.values())).scf
+        scf.add_observer(self)
+        membership = system.membership
+        membership.observer = self
+
+        self.type_names = list(system.agents_by_type.keys())
+        self.agent_types = {agent.agent_id: type_position for type_position, agents in enumerate(system.agents_by_type.values()) for agent in agents}
+        self.position_types = np.array([self.agent_types[agent_id] for agent_id in membership.agent_ids], dtype=np.int64)
+        self.type_counts = np.array([len(agents) for agents in system.agents_by_type.values()], dtype=float)
+        self.institution_positions = membership.institution_index
+
+        # Sum and length of each agent's satisfaction window, and the sum of the window means of each type
+        self.windows = {}
+        self.satisfaction_sums = np.zeros(len(self.type_names))
+        for agent_id, agent in system.agents.items():
+            if agent.last_ten_satisfactions:
+                window = (sum(agent.last_ten_satisfactions), len(agent.last_ten_satisfactions))
+                self.windows[agent_id] = window
+                self.satisfaction_sums[self.agent_types[agent_id]] += window[0] / window[1]
+
+        trustworthiness = scf.data_structures['trustworthiness']
+        self.trustworthiness_sums = np.zeros(len(self.type_names))
+        np.add.at(self.trustworthiness_sums, self.position_types, [trustworthiness.get(agent_id, 0) for agent_id in membership.agent_ids])
+
+        # Sum of each type's social network rows, every row has one entry for each agent
+        social_networks = scf.data_structures['social_networks']
+        self.network_sums = np.zeros(len(self.type_names))
+        np.add.at(self.network_sums, self.position_types, [sum(social_networks.get(agent_id, {}).values()) for agent_id in membership.agent_ids])
+
+        # Members of each type in each institution, and the capital of the institutions each type's agents are members of
+        institutions = scf.data_structures['institutions']
+        self.capital = np.array([institutions.get(institution_id, 0) for institution_id in membership.institution_ids], dtype=float)
+        self.member_counts = np.zeros((len(self.type_names), len(membership.institution_ids)))
+        for type_position in range(len(self.type_names)):
+            self.member_counts[type_position] = membership.matrix[self.position_types == type_position].sum(axis=0)
+        self.institution_sums = self.member_counts @ self.capital
+        return self
+
+    # Changes reported while the game is played
+
+    def satisfaction_added(self, agent, added, removed = None):
+        # An agent added a satisfaction to its window, and dropped the oldest one if the window was full
+        window_sum, window_length = self.windows.get(agent.agent_id, (0, 0))
+        old_mean = window_sum / window_length if window_length else 0
+        window_sum += added - (removed if removed is not None else 0)
+        window_length += removed is None
+        self.windows[agent.agent_id] = (window_sum, window_length)
+        self.satisfaction_sums[self.agent_types[agent.agent_id]] += window_sum / window_length - old_mean
+
+    def membership_changed(self, agent_position, institution_position, change):
+        # change is 1 when the agent joined the institution and -1 when it left
+        type_position = self.position_types[agent_position]
+        self.member_counts[type_position, institution_position] += change
+        self.institution_sums[type_position] += change * self.capital[institution_position]
+
+    def before_update(self, scf, key, event):
+        # Value the update of the SCF is about to change
+        data = scf.data_structures[key]
+        if key == 'social_networks':
+            return data.get(event.agent_id, {}).get(event.agent2, 0)
+        if key == 'institutions':
+            return data.get(event.institution_id, 0)
+        if key == 'trustworthiness':
+            return data.get(event.agent_id, 0)
+        return None
+
+    def after_update(self, scf, key, event, old_value):
+        data = scf.data_structures[key]
+        if key == 'social_networks':
+            change = data[event.agent_id][event.agent2] - old_value
+            self.network_sums[self.agent_types[event.agent_id]] += change
+            if event.agent2 != event.agent_id: # The score is stored in the rows of both agents
+                self.network_sums[self.agent_types[event.agent2]] += change
+        elif key == 'institutions':
+            institution_position = self.institution_positions[event.institution_id]
+            change = data[event.institution_id] - old_value
+            self.capital[institution_position] += change
+            self.institution_sums += change * self.member_counts[:, institution_position]
+        elif key == 'trustworthiness':
+            self.trustworthiness_sums[self.agent_types[event.agent_id]] += data[event.agent_id] - old_value
+
+    def before_update_many(self, scf, key, ids):
+        if key == 'trustworthiness':
+            data = scf.data_structures[key]
+            return np.array([data.get(agent_id, 0) for agent_id in ids], dtype=float)
+        return None
+
+    def after_update_many(self, scf, key, ids, old_values):
+        if key == 'trustworthiness':
+            data = scf.data_structures[key]
+            changes = np.array([data[agent_id] for agent_id in ids], dtype=float) - old_values
+            np.add.at(self.trustworthiness_sums, [self.agent_types[agent_id] for agent_id in ids], changes)
+
+    # Reporters, each costs O(agent types) or O(institutions)
+
+    def by_type(self, values):
+        return dict(zip(self.type_names, values.tolist()))
+
+    def satisfactions(self):
+        """Sum of the satisfaction of the agents of each type."""
+        return self.by_type(self.satisfaction_sums)
+
+    def average_satisfactions(self):
+        """Average satisfaction of each agent type, as UDD.get_average_satisfactions."""
+        return self.by_type(np.divide(self.satisfaction_sums, self.type_counts, out=np.zeros(len(self.type_names)), where=self.type_counts > 0))
+
+    def trustworthiness(self):
+        """Sum of the trustworthiness of the agents of each type."""
+        return self.by_type(self.trustworthiness_sums)
+
+    def social_capital(self):
+        """Sum of Agent.get_social_capital over the agents of each type."""
+        return self.by_type(self.trustworthiness_sums + self.network_sums / len(self.system.agents) + self.institution_sums)
+
+    def institutions_capital(self):
+        """Capital of each institution."""
+        return dict(zip(self.system.membership.institution_ids, self.capital.tolist()))
@@ -0,0 +1,137 @@
+import hashlib
+import json
+import os
+import time
+
+# Local content-addressed cache of game results
+# A result is stored under a hash of the job (including its configuration), the seed and the version of the simulation code,
+# so rerunning the same experiments reuses the results instead of playing the games again
+
+# Source files that decide the outcome of a game. Changing any of them gives a new code version
+# Every module that agents.py, MAS.py and UDD.py import from this package must be listed, see tests/test_cache.py
+CODE_FILES = ["agents.py", "MAS.py", "UDD.py", "scf.py", "framework.py", "reputations.py", "events.py", "streams.py", "config.py",
+              "static_values.py", "membership.py", "institution_index.py", "steady_state.py", "event_trace.py", "profiling.py"]
+
+def code_version(files = CODE_FILES):
+    directory = os.path.dirname(os.path.abspath(__file__))
+    digest = hashlib.sha256()
+    for file in files:
+        digest.update(file.encode())
+        with open(os.path.join(directory, file), 'rb') as source:
+            digest.update(source.read())
+    return digest.hexdigest()
+
+class ResultCache():
+    def __init__(self, directory = ".result_cache", max_bytes = 100 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.code_version = code_version()
+        self.hits = 0
+        self.misses = 0
+
+        os.makedirs(self.directory, exist_ok=True)
+        self.total_bytes = sum(os.path.getsize(path) for path in self.entries())
+
+    def entries(self):
+        # Paths of all the stored results
+        for folder in os.scandir(self.directory):
+            if folder.is_dir():
+                for entry in os.scandir(folder.path):
+                    if entry.name.endswith(".json"):
+                        yield entry.path
+
+    def key(self, job, seed):
+        description = {
+            "job": job,
+            "seed": seed,
+            "code_version": self.code_version,
+        }
+        return hashlib.sha256(json.dumps(description, sort_keys=True, default=repr).encode()).hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, key[:2], key + ".json")
+
+    def get(self, key):
+        """Return the stored result for the key, or None if there is none."""
+        path = self.path(key)
+        try:
+            with open(path, 'r') as file:
+                entry = json.load(file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+        # Mark the entry as recently used, eviction removes the least recently used entries first
+        os.utime(path)
+        return entry["result"]
+
+    def put(self, key, job, seed, result):
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        entry = {"job": job, "seed": seed, "code_version": self.code_version, "created": time.time(), "result": result}
+
+        # Write to a temporary file first, so other processes never read a half written entry
+        temporary_path = f"{path}.{os.getpid()}.tmp"
+        with open(temporary_path, 'w') as file:
+            json.dump(entry, file, default=repr)
+        if os.path.exists(path):
+            self.total_bytes -= os.path.getsize(path)
+        os.replace(temporary_path, path)
+        self.total_bytes += os.path.getsize(path)
+
+        if self.total_bytes > self.max_bytes:
+            self.evict()
+
+    def run(self, job, seed, function, *args, **kwargs):
+        """
+        Return the cached result of function(*args, seed = seed, **kwargs), computing and storing it if it is not cached.
+        The job must describe everything the result depends on besides the seed, including the configuration.
+        Games without a seed are not reproducible, so they are always played.
+        """
+        if seed is None:
+            return function(*args, seed = seed, **kwargs)
+
+        key = self.key(job, seed)
+        result = self.get(key)
+        if result is not None:
+            self.hits += 1
+            return result
+
+        self.misses += 1
+        result = function(*args, seed = seed, **kwargs)
+        self.put(key, job, seed, result)
+        return result
+
+    def evict(self):
+        # Remove the least recently used entries until the cache is below its size limit
+        entries = sorted(self.entries(), key=os.path.getmtime)
+        for path in entries:
+            if self.total_bytes <= self.max_bytes:
+                break
+            self.total_bytes -= os.path.getsize(path)
+            os.remove(path)
+
+    def invalidate(self):
+        """
+        Remove the entries that were computed with another version of the simulation code, for example after agents.py or MAS.py changed.
+        Returns the number of removed entries.
+        """
+        removed = 0
+        for path in list(self.entries()):
+            try:
+                with open(path, 'r') as file:
+                    stale = json.load(file).get("code_version") != self.code_version
+            except json.JSONDecodeError:
+                stale = True
+
+            if stale:
+                self.total_bytes -= os.path.getsize(path)
+                os.remove(path)
+                removed += 1
+
+        return removed
+
+    def clear(self):
+        for path in list(self.entries()):
+            os.remove(path)
+        self.total_bytes = 0
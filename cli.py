@@ -0,0 +1,348 @@
+import argparse
+import sys
+
+# Command line entry point for the experiments
+# Each command imports what it needs when it runs, so starting the program stays cheap
+# Usage: python cli.py <command> [options], see python cli.py --help
+
+BOOLEANS = {"true": True, "yes": True, "on": True, "1": True, "false": False, "no": False, "off": False, "0": False}
+
+def parse_values(name, text):
+    # "0.1,0.5,0.9" -> [0.1, 0.5, 0.9]
+    return [parse_value(name, value) for value in text.split(",")]
+
+def parse_value(name, text):
+    # Converts text with the type of the Config field it sets, such as cooperation_threshold or decision_indicator_weights.institution
+    from dataclasses import fields
+    from collections.abc import Mapping
+    from config import DEFAULT_CONFIG
+
+    field_name, _, key = name.partition(".")
+    kinds = {config_field.name: config_field.type for config_field in fields(DEFAULT_CONFIG)}
+    if field_name not in kinds:
+        raise argparse.ArgumentTypeError(f"Config has no field {field_name}")
+    kind = kinds[field_name]
+    if key:
+        entries = getattr(DEFAULT_CONFIG, field_name)
+        if not isinstance(entries, Mapping) or key not in entries:
+            raise argparse.ArgumentTypeError(f"{field_name} has no entry {key}")
+        kind = type(entries[key])
+    elif kind is dict:
+        raise argparse.ArgumentTypeError(f"{name} is a dictionary, set its entries with {name}.<key>=value")
+
+    if kind is bool:
+        if text.lower() not in BOOLEANS:
+            raise argparse.ArgumentTypeError(f"{name} expects true or false, got {text}")
+        return BOOLEANS[text.lower()]
+    if kind in (int, float) and key:
+        kind = float if "." in text or "e" in text.lower() else int # Entries of the weight dictionaries are numbers of either type
+    try:
+        return kind(text)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"{name} expects {'an integer' if kind is int else 'a number'}, got {text}")
+
+def parse_assignments(assignments):
+    # ["name=value", ...] -> {"name": "value", ...}
+    parsed = {}
+    for assignment in assignments:
+        name, _, value = assignment.partition("=")
+        if not value:
+            raise argparse.ArgumentTypeError(f"Expected name=value, got {assignment}")
+        parsed[name] = value
+    return parsed
+
+def load_config(overrides):
+    from config import DEFAULT_CONFIG
+    from sweep import apply_point
+
+    point = {name: parse_value(name, value) for name, value in parse_assignments(overrides).items()}
+    return apply_point(DEFAULT_CONFIG, point)
+
+def load_cache(args):
+    if not args.cache:
+        return None
+
+    from cache import ResultCache
+    return ResultCache(args.cache, max_bytes = args.cache_size * 1024 * 1024)
+
+def simulate(args):
+    from UDD import run_simulations
+    run_simulations(args.simulations, adaptive = args.adaptive, common_random_numbers = args.crn,
+                    cache = load_cache(args), config = load_config(args.set))
+
+def satisfaction(args):
+    from UDD import play_satisfaction
+    play_satisfaction(None, base_seed = args.seed, cache = load_cache(args), config = load_config(args.set))
+
+def breakpoints(args):
+    from UDD import play_breakpoints, play_breakpoints_adaptive
+    config = load_config(args.set)
+    if args.adaptive:
+        play_breakpoints_adaptive(None, precision = args.precision, max_games = args.max_games, unanimous_spread = args.unanimous_spread,
+                                  common_random_numbers = args.crn, base_seed = args.seed, cache = load_cache(args), config = config)
+    else:
+        play_breakpoints(None, common_random_numbers = args.crn, base_seed = args.seed, cache = load_cache(args), config = config)
+
+def sweep_points(args):
+    from sweep import grid, latin_hypercube
+
+    if args.lhs:
+        bounds = {}
+        for name, value in parse_assignments(args.param).items():
+            low, _, high = value.partition(":")
+            bounds[name] = (float(low), float(high))
+        return latin_hypercube(args.lhs, bounds, seed = args.seed)
+    return grid(**{name: parse_values(name, value) for name, value in parse_assignments(args.param).items()})
+
+def sweep_experiments(args):
+    return [experiment for experiment in ("satisfaction", "breakpoint") if experiment in args.experiments]
+
+def sweep(args):
+    from sweep import run_sweep, save_sweep
+
+    results = run_sweep(sweep_points(args), sizes = args.sizes, games = args.games, rounds = args.rounds, max_rounds = args.max_rounds,
+                        experiments = sweep_experiments(args), workers = args.workers, base_seed = args.seed,
+                        config = load_config(args.set), cache = load_cache(args), profile_dir = args.profile_dir,
+                        profile_every = args.profile_every)
+    save_sweep(results, args.out)
+    print(f"Sweep results written to {args.out}")
+
+def queue(args):
+    from jobqueue import JobQueue, submit_sweep, work, collect_results
+
+    job_queue = JobQueue(args.queue, lease_seconds = args.lease)
+    if args.action == "submit":
+        submitted = submit_sweep(job_queue, sweep_points(args), sizes = args.sizes, games = args.games, rounds = args.rounds,
+                                 max_rounds = args.max_rounds, experiments = sweep_experiments(args), base_seed = args.seed,
+                                 config = load_config(args.set))
+        print(f"{submitted} jobs added to {args.queue}")
+    elif args.action == "work":
+        played = work(job_queue, poll_seconds = args.poll, cache = load_cache(args))
+        print(f"No jobs left, played {played} jobs")
+    elif args.action == "status":
+        print(job_queue.counts())
+    else:
+        from sweep import save_sweep
+        save_sweep(collect_results(job_queue), args.out)
+        print(f"Results of {job_queue.counts().get('done', 0)} jobs written to {args.out}")
+    job_queue.close()
+
+def cache(args):
+    from cache import ResultCache
+    result_cache = ResultCache(args.cache or ".result_cache", max_bytes = args.cache_size * 1024 * 1024)
+    if args.clear:
+        result_cache.clear()
+        print("Cache cleared")
+    else:
+        print(f"Removed {result_cache.invalidate()} entries from older versions of the simulation code")
+
+def trace(args):
+    from UDD import play_satisfaction_game
+    play_satisfaction_game(args.agents, args.rounds, seed = args.seed, config = load_config(args.set), trace_path = args.out)
+    print(f"Trace written to {args.out}, with the ids in {args.out}.json")
+
+def record(args):
+    from replay import record_game
+    satisfactions = record_game(args.out, args.agents, args.rounds, seed = args.seed, config = load_config(args.set), trace_path = args.trace)
+    print(f"Random outcomes written to {args.out}. Final satisfactions: {satisfactions}")
+
+def replay(args):
+    from replay import replay_game
+    if args.profile:
+        import cProfile
+        import pstats
+        profiler = cProfile.Profile()
+        satisfactions = profiler.runcall(replay_game, args.file, trace_path = args.trace)
+        pstats.Stats(profiler).sort_stats("cumulative").print_stats(args.profile)
+    else:
+        satisfactions = replay_game(args.file, trace_path = args.trace)
+    print(f"Replay matched the recorded game. Final satisfactions: {satisfactions}")
+
+def memory(args):
+    from memprofile import profile_sizes
+    profile_sizes(sizes = args.sizes, rounds = args.rounds, seed = args.seed, config = load_config(args.set), file = args.out)
+    print(f"Memory table written to {args.out}")
+
+def serve(args):
+    from jobserver import JobServer
+    JobServer(workers = args.workers, cache = load_cache(args), config = load_config(args.set), profile_dir = args.profile_dir,
+              profile_every = args.profile_every).serve(args.port, args.address)
+
+def plot(args):
+    from plot import read_and_plot, plot_sweep
+    if args.sweep:
+        plot_sweep(args.sweep, out = args.out, formats = args.formats)
+    else:
+        paths = read_and_plot(args.file, directory = args.out or "plots", formats = args.formats)
+        print(f"Figures written to {', '.join(paths)}")
+
+def profile(args):
+    from profiling import merge_profiles
+    print(merge_profiles(args.directory, top = args.top, sort = args.sort))
+    print(f"Merged stats written to {args.directory}/merged.prof and collapsed stacks to {args.directory}/collapsed.txt")
+
+def equivalence(args):
+    from equivalence import check_equivalence, load_engine
+    tests = check_equivalence(load_engine(args.candidate), reference = load_engine(args.reference), sizes = args.sizes, games = args.games,
+                              rounds = args.rounds, alpha = args.alpha, base_seed = args.seed, config = load_config(args.set))
+    print(f"No significant differences in {len(tests)} measurements, the smallest corrected p-value is {min(test['corrected_pvalue'] for test in tests):.3g}")
+
+def visualize(args):
+    from visualization import create_server
+    create_server(load_config(args.set)).launch()
+
+def add_common_arguments(parser):
+    parser.add_argument("--set", action="append", default=[], metavar="NAME=VALUE",
+                        help="Override a configuration value, e.g. cooperation_threshold=0.4 or decision_indicator_weights.institution=0.2")
+    parser.add_argument("--cache", metavar="DIR", help="Reuse game results stored in this directory")
+    parser.add_argument("--cache-size", type=int, default=100, metavar="MB", help="Size limit of the result cache")
+    add_profile_arguments(parser)
+
+def add_profile_arguments(parser):
+    parser.add_argument("--profile-dir", metavar="DIR", help="Profile some of the games and write their stats to this directory")
+    parser.add_argument("--profile-every", type=int, default=10, metavar="K", help="Profile one in every K games, with --profile-dir")
+
+def add_sweep_arguments(parser):
+    parser.add_argument("--param", action="append", default=[], metavar="NAME=VALUES",
+                        help="Grid values (name=0.1,0.5) or, with --lhs, bounds (name=0.1:0.9)")
+    parser.add_argument("--lhs", type=int, metavar="SAMPLES", help="Number of Latin hypercube samples")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[60])
+    parser.add_argument("--games", type=int, default=10)
+    parser.add_argument("--rounds", type=int, default=100, help="Rounds of each satisfaction game")
+    parser.add_argument("--max-rounds", type=int, default=1000, help="Round limit of each breakpoint game")
+    parser.add_argument("--experiments", nargs="+", default=["satisfaction", "breakpoint"], choices=["satisfaction", "breakpoint"])
+    parser.add_argument("--seed", type=int, default=0, help="Base seed of the games")
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description="Unscrupulous Diner's Dilemma experiments")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    command = commands.add_parser("simulate", help="Run satisfaction and breakpoint simulations and write simulation_results.csv")
+    command.add_argument("simulations", type=int, nargs="?", default=10)
+    command.add_argument("--adaptive", action="store_true", help="Stop sampling a population size once its breakpoint is resolved")
+    command.add_argument("--crn", action="store_true", help="Use common random numbers across population sizes")
+    add_common_arguments(command)
+    command.set_defaults(run=simulate)
+
+    command = commands.add_parser("satisfaction", help="Play the satisfaction games once")
+    command.add_argument("--seed", type=int, help="Base seed of the games")
+    add_common_arguments(command)
+    command.set_defaults(run=satisfaction)
+
+    command = commands.add_parser("breakpoints", help="Play the breakpoint games once")
+    command.add_argument("--adaptive", action="store_true", help="Stop sampling a population size once its breakpoint is resolved")
+    command.add_argument("--precision", type=float, default=50, help="Target confidence interval width in rounds, with --adaptive")
+    command.add_argument("--max-games", type=int, default=50, help="Most games per population size, with --adaptive")
+    command.add_argument("--unanimous-spread", type=float, default=2,
+                         help="Precisions by which a size whose games all agree is assumed to vary, with --adaptive")
+    command.add_argument("--crn", action="store_true", help="Use common random numbers across population sizes")
+    command.add_argument("--seed", type=int, help="Base seed of the games")
+    add_common_arguments(command)
+    command.set_defaults(run=breakpoints)
+
+    command = commands.add_parser("sweep", help="Sweep configuration values over a grid or a Latin hypercube")
+    add_sweep_arguments(command)
+    command.add_argument("--workers", type=int, help="Number of worker processes, defaults to the number of cores")
+    command.add_argument("--out", default="sweep_results", help="Directory the result tables are written to")
+    add_common_arguments(command)
+    command.set_defaults(run=sweep)
+
+    command = commands.add_parser("queue", help="Share sweep jobs between machines through an SQLite job queue")
+    actions = command.add_subparsers(dest="action", required=True)
+    action = actions.add_parser("submit", help="Add the jobs of a sweep to the queue")
+    add_sweep_arguments(action)
+    action.add_argument("--set", action="append", default=[], metavar="NAME=VALUE", help="Override a configuration value")
+    action = actions.add_parser("work", help="Play jobs from the queue until none are left, run one per core and node")
+    action.add_argument("--poll", type=float, default=10, help="Seconds to wait between checks while other workers hold leases")
+    action.add_argument("--cache", metavar="DIR", help="Reuse game results stored in this directory")
+    action.add_argument("--cache-size", type=int, default=100, metavar="MB", help="Size limit of the result cache")
+    add_profile_arguments(action)
+    actions.add_parser("status", help="Show the number of jobs with each status")
+    action = actions.add_parser("collect", help="Write the results of the finished jobs as sweep tables")
+    action.add_argument("--out", default="sweep_results", help="Directory the result tables are written to")
+    for action in actions.choices.values():
+        action.add_argument("--queue", default="jobs.sqlite", help="Queue file, on a filesystem shared by the nodes")
+        action.add_argument("--lease", type=float, default=3600, help="Seconds a worker holds a job before it is handed to another worker")
+    command.set_defaults(run=queue)
+
+    command = commands.add_parser("cache", help="Remove stale entries from the result cache")
+    command.add_argument("--cache", metavar="DIR", help="Cache directory, defaults to .result_cache")
+    command.add_argument("--cache-size", type=int, default=100, metavar="MB")
+    command.add_argument("--clear", action="store_true", help="Remove every entry instead of only stale ones")
+    command.set_defaults(run=cache)
+
+    command = commands.add_parser("trace", help="Play one game and record the events of every round to a binary trace")
+    command.add_argument("--agents", type=int, default=60)
+    command.add_argument("--rounds", type=int, default=100)
+    command.add_argument("--seed", type=int, help="Seed of the game")
+    command.add_argument("--out", default="game.trace", help="File the trace is written to")
+    command.add_argument("--set", action="append", default=[], metavar="NAME=VALUE", help="Override a configuration value")
+    command.set_defaults(run=trace)
+
+    command = commands.add_parser("record", help="Play one game and save its random outcomes so it can be replayed exactly")
+    command.add_argument("--agents", type=int, default=60)
+    command.add_argument("--rounds", type=int, default=100)
+    command.add_argument("--seed", type=int, help="Seed of the game, unseeded games can be replayed as well")
+    command.add_argument("--out", default="game.replay", help="File the random outcomes are written to")
+    command.add_argument("--trace", metavar="FILE", help="Also record the event trace of the game")
+    command.add_argument("--set", action="append", default=[], metavar="NAME=VALUE", help="Override a configuration value")
+    command.set_defaults(run=record)
+
+    command = commands.add_parser("replay", help="Play a recorded game again and check that it repeats exactly")
+    command.add_argument("file", nargs="?", default="game.replay")
+    command.add_argument("--trace", metavar="FILE", help="Record the event trace of the replay")
+    command.add_argument("--profile", type=int, nargs="?", const=30, metavar="LINES", help="Profile the replay and print the top functions")
+    command.set_defaults(run=replay)
+
+    command = commands.add_parser("memory", help="Measure the memory of games of different sizes with tracemalloc")
+    command.add_argument("--sizes", type=int, nargs="+", default=[15, 30, 60, 90, 120, 150, 180, 210, 240, 270, 300])
+    command.add_argument("--rounds", type=int, default=20, help="Rounds played before the second measurement")
+    command.add_argument("--seed", type=int, default=0, help="Seed of the games")
+    command.add_argument("--out", default="memory_profile.csv", help="File the scaling table is written to")
+    command.add_argument("--set", action="append", default=[], metavar="NAME=VALUE", help="Override a configuration value")
+    command.set_defaults(run=memory)
+
+    command = commands.add_parser("serve", help="Start a job server that plays submitted experiments on a shared process pool")
+    command.add_argument("--port", type=int, default=8888)
+    command.add_argument("--address", default="127.0.0.1", help="Address to listen on, 0.0.0.0 to accept other machines")
+    command.add_argument("--workers", type=int, help="Number of worker processes, defaults to the number of cores")
+    add_common_arguments(command)
+    command.set_defaults(run=serve)
+
+    command = commands.add_parser("plot", help="Plot the results of run_simulations or of a sweep to image files")
+    command.add_argument("file", nargs="?", default="simulation_results.csv")
+    command.add_argument("--sweep", metavar="DIR", help="Plot the sweep tables in this directory instead, one figure per parameter point")
+    command.add_argument("--out", metavar="DIR", help="Directory the figures are written to, defaults to plots/ or DIR/plots for a sweep")
+    command.add_argument("--formats", nargs="+", default=["png"], help="File formats, e.g. png svg pdf")
+    command.set_defaults(run=plot)
+
+    command = commands.add_parser("profile", help="Merge the games profiled with --profile-dir into one report and collapsed stacks")
+    command.add_argument("directory")
+    command.add_argument("--top", type=int, default=30, help="Number of functions in the report")
+    command.add_argument("--sort", default="cumulative", help="pstats sort key, e.g. cumulative or tottime")
+    command.set_defaults(run=profile)
+
+    command = commands.add_parser("equivalence", help="Check that a candidate engine plays statistically the same games as the reference model")
+    command.add_argument("candidate", help="Engine as module:attribute, called like UDD(num_agents, seed, config)")
+    command.add_argument("--reference", default="UDD:UDD", help="Reference engine as module:attribute")
+    command.add_argument("--sizes", type=int, nargs="+", default=[30, 60])
+    command.add_argument("--games", type=int, default=30, help="Games of each engine for every population size")
+    command.add_argument("--rounds", type=int, default=60)
+    command.add_argument("--alpha", type=float, default=0.05, help="Significance level after the Bonferroni correction")
+    command.add_argument("--seed", type=int, default=0, help="Base seed of the games")
+    command.add_argument("--set", action="append", default=[], metavar="NAME=VALUE", help="Override a configuration value")
+    command.set_defaults(run=equivalence)
+
+    command = commands.add_parser("visualize", help="Start the Mesa visualization server")
+    command.add_argument("--set", action="append", default=[], metavar="NAME=VALUE", help="Override a configuration value")
+    command.set_defaults(run=visualize)
+
+    args = parser.parse_args(argv)
+    if getattr(args, "profile_dir", None):
+        # Games played in this process, the worker processes of sweeps and the job server start their own profilers
+        from profiling import start_profiling
+        start_profiling(args.profile_dir, args.profile_every)
+    args.run(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,59 @@
+from dataclasses import dataclass, field, fields, replace
+from types import MappingProxyType
+import static_values
+
+# Immutable configuration of a game
+# The defaults are the values in static_values.py. A different configuration is made with config.replace(...) and passed
+# to MultiAgentSystem, so many configurations can be played in the same process without changing static_values
+@dataclass(frozen=True)
+class Config:
+    report_reputation_threshold: float = static_values.REPORT_REPUTATION_THRESHOLD
+    cooperation_threshold: float = static_values.COOPERATION_THRESHOLD
+    leave_institution_threshold: float = static_values.LEAVE_INSTITUTION_THRESHOLD
+    join_institution_threshold: float = static_values.JOIN_INSTITUTION_THRESHOLD
+    rule_violation_threshold: int = static_values.RULE_VIOLATION_THRESHOLD
+    expel_from_institution_threshold: float = static_values.EXPEL_FROM_INSTITUTION_THRESHOLD
+    admit_to_institution_threshold: float = static_values.ADMIT_TO_INSTITUTION_THRESHOLD
+
+    num_institutions: int = static_values.NUM_INSTITUTIONS
+    population_mix: dict = field(default_factory=lambda: dict(static_values.POPULATION_MIX))
+    list_initial_memberships: bool = static_values.LIST_INITIAL_MEMBERSHIPS
+
+    agent_reputation_weight: float = static_values.AGENT_REPUTATION_WEIGHT
+    institution_reputation_weight: float = static_values.INTITUTION_REPUTATION_WEIGHT
+    incremental_trustworthiness: bool = static_values.INCREMENTAL_TRUSTWORTHINESS
+
+    steady_state_window: int = static_values.STEADY_STATE_WINDOW
+    steady_state_tolerance: float = static_values.STEADY_STATE_TOLERANCE
+
+    decision_indicator_weights: dict = field(default_factory=lambda: dict(static_values.DECISION_INDICATOR_WEIGHTS))
+    agent_event_weights: dict = field(default_factory=lambda: dict(static_values.AGENT_EVENT_WEIGHTS))
+    institution_event_weights: dict = field(default_factory=lambda: dict(static_values.INSTITUTION_EVENT_WEIGHTS))
+
+    expensive_price: float = static_values.EXPENSIVE_PRICE
+    inexpensive_price: float = static_values.INEXPENSIVE_PRICE
+
+    def __post_init__(self):
+        # Make the weight dictionaries read-only, so a configuration can be shared between games
+        for config_field in fields(self):
+            value = getattr(self, config_field.name)
+            if isinstance(value, dict):
+                object.__setattr__(self, config_field.name, MappingProxyType(dict(value)))
+
+    def __reduce__(self):
+        # Read-only dictionaries can not be pickled, so configurations are sent to worker processes as plain values
+        return (self.__class__, tuple(self.to_dict().values()))
+
+    def replace(self, **changes):
+        """Return a copy of the configuration with the given fields changed."""
+        return replace(self, **changes)
+
+    def to_dict(self):
+        return {config_field.name: _plain(getattr(self, config_field.name)) for config_field in fields(self)}
+
+def _plain(value):
+    if isinstance(value, MappingProxyType):
+        return dict(value)
+    return value
+
+DEFAULT_CONFIG = Config()
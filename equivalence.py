@@ -0,0 +1,120 @@
+import importlib
+import time
+from collections import defaultdict
+import numpy as np
+from config import DEFAULT_CONFIG
+from UDD import UDD, game_seed, suppress_print
+
+# Statistical equivalence of a candidate engine with the reference model
+# A faster engine (vectorized, sparse or parallel) draws its random numbers in a different order, so its games are not
+# the same as the reference games with the same seed. Instead both engines play many games, and the distributions of
+# their results are compared with two-sample Kolmogorov-Smirnov tests:
+#   - the average satisfaction of each agent type every `every` rounds
+#   - the round the breakpoint was first reached, or the number of rounds if it never was
+#   - the mean and the largest institutional capital at the end of the game
+# for every population size. The p-values are Bonferroni corrected for the number of tests, and any significant
+# difference raises EquivalenceError. The engines play with different seeds, so their games are independent samples.
+#
+# An engine is called as engine(num_agents = ..., seed = ..., config = ...) and returns a game with the interface of
+# UDD: initialize_system(), step(), get_average_satisfactions(), check_breakpoint() and system. The reference is UDD.
+
+class EquivalenceError(Exception):
+    pass
+
+def load_engine(name):
+    # "module:attribute" -> the engine, e.g. "UDD:UDD"
+    module, _, attribute = name.partition(":")
+    return getattr(importlib.import_module(module), attribute)
+
+def ks_statistic(first, second):
+    """Largest distance between the empirical distribution functions of two samples."""
+    first, second = np.sort(first), np.sort(second)
+    values = np.concatenate([first, second])
+    distance = np.searchsorted(first, values, side='right') / len(first) - np.searchsorted(second, values, side='right') / len(second)
+    return float(np.max(np.abs(distance)))
+
+def ks_pvalue(statistic, first_size, second_size, terms = 100):
+    """
+    Asymptotic p-value of the two-sample Kolmogorov-Smirnov statistic, with Stephens' correction for small samples.
+    Samples with ties, such as breakpoints that are often 0, make the test conservative.
+    """
+    effective_size = np.sqrt(first_size * second_size / (first_size + second_size))
+    x = (effective_size + 0.12 + 0.11 / effective_size) * statistic
+    if x < 1e-3:
+        return 1.0
+    k = np.arange(1, terms + 1)
+    pvalue = 2 * np.sum((-1.0) ** (k - 1) * np.exp(-2 * (k * x) ** 2))
+    return float(min(1.0, max(0.0, pvalue)))
+
+def ks_test(first, second):
+    """Two-sample Kolmogorov-Smirnov test, returns the statistic and the p-value."""
+    statistic = ks_statistic(first, second)
+    return statistic, ks_pvalue(statistic, len(first), len(second))
+
+def play_engine_game(engine, num_agents, rounds, seed, config = DEFAULT_CONFIG, every = 10):
+    # Plays one game of the engine and returns its measurements by name
+    game = engine(num_agents = num_agents, seed = seed, config = config)
+    measurements = {}
+    breakpoint = rounds
+    try:
+        with suppress_print():
+            game.initialize_system()
+            for round_num in range(rounds):
+                game.step()
+                if breakpoint == rounds and game.check_breakpoint():
+                    breakpoint = round_num
+                if (round_num + 1) % every == 0:
+                    for type_name, value in game.get_average_satisfactions().items():
+                        measurements[f"satisfaction {type_name} round {round_num + 1}"] = value
+    finally:
+        if hasattr(game, "close"):
+            game.close()
+
+    capital = np.array(list(next(iter(game.system.agents.values())).scf.data_structures['institutions'].values()), dtype=float)
+    measurements["breakpoint"] = breakpoint
+    measurements["mean institutional capital"] = float(capital.mean())
+    measurements["max institutional capital"] = float(capital.max())
+    return measurements
+
+def play_engine(engine, label, sizes, games, rounds, base_seed, config, every):
+    # Measurements of every game of the engine, by population size and measurement name
+    samples = defaultdict(lambda: defaultdict(list))
+    for num_agents in sizes:
+        for game in range(games):
+            seed = game_seed(base_seed, game, label, num_agents)
+            for name, value in play_engine_game(engine, num_agents, rounds, seed, config, every).items():
+                samples[num_agents][name].append(value)
+    return samples
+
+def check_equivalence(candidate, reference = UDD, sizes = (30, 60), games = 30, rounds = 60, alpha = 0.05, base_seed = 0,
+                      config = DEFAULT_CONFIG, every = 10):
+    """
+    Play games games of each engine for every population size and compare the distributions of their measurements.
+    Returns one row per test with the statistic and the Bonferroni corrected p-value.
+    Raises EquivalenceError if any corrected p-value is below alpha.
+    """
+    start_time = time.time()
+    reference_samples = play_engine(reference, "reference", sizes, games, rounds, base_seed, config, every)
+    candidate_samples = play_engine(candidate, "candidate", sizes, games, rounds, base_seed, config, every)
+
+    tests = []
+    for num_agents in sizes:
+        for name, reference_values in reference_samples[num_agents].items():
+            candidate_values = candidate_samples[num_agents].get(name)
+            if candidate_values is None:
+                raise EquivalenceError(f"The candidate engine did not measure {name} for {num_agents} agents")
+            statistic, pvalue = ks_test(reference_values, candidate_values)
+            tests.append({"num_agents": num_agents, "measurement": name, "statistic": statistic, "pvalue": pvalue,
+                          "reference_mean": float(np.mean(reference_values)), "candidate_mean": float(np.mean(candidate_values))})
+
+    # Bonferroni correction, every test has to hold for the engines to be equivalent
+    for test in tests:
+        test["corrected_pvalue"] = min(1.0, test["pvalue"] * len(tests))
+    failed = [test for test in tests if test["corrected_pvalue"] < alpha]
+
+    print(f"check_equivalence() ran {len(tests)} tests on {games} games per engine and size in {time.time() - start_time} seconds")
+    if failed:
+        lines = [f"{test['num_agents']} agents, {test['measurement']}: D = {test['statistic']:.3f}, corrected p = {test['corrected_pvalue']:.2g}, "
+                 f"mean {test['reference_mean']:.4g} (reference) vs {test['candidate_mean']:.4g} (candidate)" for test in failed]
+        raise EquivalenceError(f"{len(failed)} of {len(tests)} measurements differ significantly:\n" + "\n".join(lines))
+    return tests
@@ -0,0 +1,147 @@
+import json
+import numpy as np
+
+# Compact binary trace of what happens in a game, for offline analysis
+# Every record has the same width. Agents and institutions are stored as their position in the system's membership index,
+# and the ids for the positions are written to a json file next to the trace. The trace file has no header,
+# so it can be opened directly with np.memmap(path, dtype=TRACE_DTYPE) or load_trace(path)
+
+TRACE_DTYPE = np.dtype([
+    ("round", "<u4"),
+    ("kind", "u1"),
+    ("agent", "<i4"), # -1 for records about a whole dinner group
+    ("institution", "<i4"),
+    ("value", "<f4"), # The bill for BILL records, 1 for an expensive CHOICE and 0 for an inexpensive one
+])
+
+JOINED = 0
+LEFT = 1
+EXPELLED = 2
+SANCTIONED = 3
+NOT_SANCTIONED = 4
+CHOICE = 5
+BILL = 6
+
+KINDS = ["Joined", "Left", "Expelled", "Sanctioned", "Not Sanctioned", "Choice", "Bill"]
+EVENT_KINDS = {"Joined": JOINED, "Left": LEFT, "Expelled": EXPELLED}
+
+class TraceRecorder():
+    def __init__(self, path, buffer_records = 65536):
+        self.path = path
+        self.buffer_records = buffer_records
+        self.round = 0
+        self.single_records = [] # Records added one at a time, as tuples
+        self.chunks = [] # Records added in bulk, as arrays
+        self.pending = 0
+        self.file = open(path, 'wb')
+        self.system = None
+
+    def attach(self, system):
+        """Record the events of the system from now on, and write the ids of its agents and institutions."""
+        self.system = system
+        system.trace = self
+        metadata = {
+            "dtype": TRACE_DTYPE.descr,
+            "kinds": KINDS,
+            "agent_ids": system.membership.agent_ids,
+            "institution_ids": system.membership.institution_ids,
+        }
+        with open(self.path + ".json", 'w') as file:
+            json.dump(metadata, file)
+
+        # The memberships the system already has are recorded as joins, so the trace can rebuild them
+        agents, institutions = np.nonzero(system.membership.matrix)
+        self.record_many(JOINED, agents, institutions)
+
+    def record_event(self, event):
+        # Records a join, leave or expulsion event of an institution
+        membership = self.system.membership
+        self.single_records.append((self.round, EVENT_KINDS[event.type], membership.agent_index[event.agent_id],
+                                    membership.institution_index[event.institution_id], 0.0))
+        self.pending += 1
+
+    def record_many(self, kind, agents, institutions, values = 0.0):
+        # Records many records of the same kind at once, agents, institutions and values are arrays or single values
+        records = np.empty(np.broadcast(agents, institutions, values).size, dtype=TRACE_DTYPE)
+        records["round"] = self.round
+        records["kind"] = kind
+        records["agent"] = agents
+        records["institution"] = institutions
+        records["value"] = values
+        if len(records):
+            self.chunks.append(records)
+            self.pending += len(records)
+
+    def record_round(self, system, choices, rule_outcome):
+        # Records every agent's choice, the bill of every dinner group and the sanctions of the rule stage.
+        # rule_outcome is what MultiAgentSystem.apply_institution_rules returned
+        membership = system.membership
+        groups = np.empty(len(membership.agent_ids), dtype=np.int64)
+        for institution_id, agents_in_group in system.games.items():
+            groups[[membership.agent_index[agent_id] for agent_id in agents_in_group]] = membership.institution_index[institution_id]
+        expensive = np.fromiter((choices[agent_id] == "expensive" for agent_id in membership.agent_ids), dtype=bool, count=len(groups))
+        self.record_many(CHOICE, np.arange(len(groups)), groups, expensive)
+
+        prices = np.where(expensive, system.config.expensive_price, system.config.inexpensive_price)
+        bills = np.bincount(groups, weights=prices, minlength=len(membership.institution_ids))
+        dined = np.flatnonzero(np.bincount(groups, minlength=len(membership.institution_ids)))
+        self.record_many(BILL, -1, dined, bills[dined])
+
+        positions, rule_groups, _, sanctioned, not_sanctioned = rule_outcome
+        self.record_many(SANCTIONED, positions[sanctioned], rule_groups[sanctioned])
+        self.record_many(NOT_SANCTIONED, positions[not_sanctioned], rule_groups[not_sanctioned])
+        self.end_round()
+
+    def end_round(self):
+        self.collect_single_records()
+        self.round += 1
+        if self.pending >= self.buffer_records:
+            self.flush()
+
+    def collect_single_records(self):
+        if self.single_records:
+            self.chunks.append(np.array(self.single_records, dtype=TRACE_DTYPE))
+            self.single_records = []
+
+    def flush(self):
+        self.collect_single_records()
+        for chunk in self.chunks:
+            chunk.tofile(self.file)
+        self.file.flush()
+        self.chunks = []
+        self.pending = 0
+
+    def close(self):
+        if self.file.closed:
+            return
+        try:
+            self.flush()
+        finally:
+            self.file.close()
+            if self.system is not None and self.system.trace is self:
+                self.system.trace = None
+
+    # A recorder used in a with block is closed even if the game raises
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def load_trace(path):
+    """Open a trace without reading it into memory. Returns the memory-mapped records and the metadata with the ids."""
+    with open(path + ".json", 'r') as file:
+        metadata = json.load(file)
+    return np.memmap(path, dtype=TRACE_DTYPE, mode='r'), metadata
+
+def trace_frame(path):
+    # The whole trace as a pandas DataFrame, with the kinds and ids written out
+    import pandas as pd
+
+    records, metadata = load_trace(path)
+    frame = pd.DataFrame(records)
+    frame["kind"] = pd.Categorical.from_codes(frame["kind"], metadata["kinds"])
+    agent_ids = np.array(metadata["agent_ids"] + [None], dtype=object)
+    frame["agent"] = agent_ids[frame["agent"].to_numpy()]
+    frame["institution"] = np.array(metadata["institution_ids"], dtype=object)[frame["institution"].to_numpy()]
+    return frame
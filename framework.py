@@ -1,9 +1,13 @@
 
 class SocialCapitalFramework:
-    def __init__(self):
+    def __init__(self, config = None):
+        self.config = config # Configuration of the game the framework belongs to
         self.update_functions = {}
+        self.bulk_update_functions = {}
         self.metrics = {}
         self.data_structures = {}
+        self.observers = [] # Told about updates, such as the TypeAggregates in aggregates.py, with the keys each one observes
+        self.key_observers = {} # Observers of each key, found from observers when the key is first updated
 
     def add_data_structure(self, key, initial_value):
         self.data_structures[key] = initial_value
@@ -11,13 +15,45 @@ class SocialCapitalFramework:
     def add_update_function(self, key, function):
         self.update_functions[key] = function
     
+    def add_bulk_update_function(self, key, function):
+        # Function that updates many entries of a data structure in one call, see update_data_many
+        self.bulk_update_functions[key] = function
+
+    def add_observer(self, observer, keys = None):
+        # The observer's before_update and after_update are called around every update_data call,
+        # and before_update_many and after_update_many around every update_data_many call
+        # Given keys, it is only told about updates of those data structures, and other updates keep their fast path
+        self.observers.append((observer, None if keys is None else set(keys)))
+        self.key_observers = {}
+
+    def observers_of(self, key):
+        observers = self.key_observers.get(key)
+        if observers is None:
+            observers = self.key_observers[key] = [observer for observer, keys in self.observers if keys is None or key in keys]
+        return observers
+
     def add_metric(self, key, function):
         self.metrics[key] = function
 
     def update_data(self, key, event):
         if key in self.update_functions:
+            observers = self.observers_of(key)
+            if not observers:
+                self.data_structures[key] = self.update_functions[key](self.data_structures[key], event)
+                return
+            old_values = [observer.before_update(self, key, event) for observer in observers]
             self.data_structures[key] = self.update_functions[key](self.data_structures[key], event)
+            for observer, old_value in zip(observers, old_values):
+                observer.after_update(self, key, event, old_value)
     
+    def update_data_many(self, key, ids, values, weight):
+        if key in self.bulk_update_functions:
+            observers = self.observers_of(key)
+            old_values = [observer.before_update_many(self, key, ids) for observer in observers]
+            self.data_structures[key] = self.bulk_update_functions[key](self.data_structures[key], ids, values, weight)
+            for observer, old_value in zip(observers, old_values):
+                observer.after_update_many(self, key, ids, old_value)
+
     def evaluate_social_capital(self):
         results = {}
         for key, metric in self.metrics.items():
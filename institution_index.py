@@ -0,0 +1,155 @@
+import math
+from bisect import bisect_left, insort
+from itertools import accumulate
+
+# Index of the institutional capital, so the cost of choosing an institution does not grow with the number of institutions
+# The capital of every institution is kept in a ranking, from the highest capital down, and exp(capital) is kept in a
+# Fenwick tree. The index observes the SCF, so both are updated as update_institutions changes a capital.
+#   - best_member: the member institution with the highest capital, by walking down the ranking or over the agent's
+#     own institutions, whichever is expected to be shorter
+#   - sample_join: a Boltzmann choice over the institutions the agent is not a member of, found by one descent of the
+#     tree with the agent's own institutions left out, so it takes O(log I) steps for every institution it is a member of
+#   - member_capital: the sum of the capital of the agent's institutions, over the agent's own memberships
+# They give the same results as the scans they replace, ties going to the first institution in sorted order.
+
+class FenwickTree():
+    """Prefix sums of a list of weights, with O(log n) updates and O(log n) search for where a prefix sum is passed."""
+    def __init__(self, weights):
+        self.size = len(weights)
+        self.weights = list(weights)
+        self.top_step = 1 << (self.size.bit_length() - 1) if self.size else 0
+        self.rebuild()
+
+    def rebuild(self):
+        # Builds the tree from the weights in O(n). Updates add differences to the tree, so it is rebuilt now and then
+        # to keep rounding errors from adding up
+        self.tree = [0.0] + self.weights
+        for position in range(1, self.size + 1):
+            parent = position + (position & -position)
+            if parent <= self.size:
+                self.tree[parent] += self.tree[position]
+        self.updates = 0
+
+    def set(self, index, weight):
+        change = weight - self.weights[index]
+        self.weights[index] = weight
+        self.updates += 1
+        if self.updates > self.size:
+            self.rebuild()
+            return
+        position = index + 1
+        while position <= self.size:
+            self.tree[position] += change
+            position += position & -position
+
+    def prefix_sum(self, end):
+        """Sum of the first end weights."""
+        total = 0.0
+        while end > 0:
+            total += self.tree[end]
+            end -= end & -end
+        return total
+
+    def find(self, target, excluded = (), excluded_sums = (0.0,)):
+        """
+        Index of the weight where the running sum passes target, as random.choices finds it from cumulative weights.
+        The weights at the excluded indexes, which must be sorted, are left out. excluded_sums are the running sums of
+        their weights, starting with 0.
+        """
+        position = 0
+        step = self.top_step
+        while step:
+            next_position = position + step
+            if next_position <= self.size:
+                # The tree node holds the weights of indexes position to next_position - 1
+                node = self.tree[next_position]
+                if excluded:
+                    node -= excluded_sums[bisect_left(excluded, next_position)] - excluded_sums[bisect_left(excluded, position)]
+                if node <= target:
+                    position = next_position
+                    target -= node
+            step >>= 1
+        return position
+
+class InstitutionCapitalIndex():
+    def __init__(self, scf, membership):
+        self.membership = membership
+        institutions = scf.data_structures['institutions']
+        institution_ids = membership.institution_ids
+        self.capital = [institutions[institution_id] for institution_id in institution_ids]
+
+        # Ties are broken by the sorted order of the ids, as the scans over sorted(agent.institutions) did
+        sort_ranks = sorted(range(len(institution_ids)), key=lambda position: institution_ids[position])
+        self.sort_rank = [0] * len(institution_ids)
+        for rank, position in enumerate(sort_ranks):
+            self.sort_rank[position] = rank
+
+        self.ranking = sorted(self.ranking_key(position) for position in range(len(institution_ids)))
+        self.weights = FenwickTree([math.exp(capital) for capital in self.capital])
+        scf.add_observer(self, keys=['institutions'])
+
+    def ranking_key(self, position):
+        return (-self.capital[position], self.sort_rank[position], position)
+
+    def set_capital(self, position, capital):
+        del self.ranking[bisect_left(self.ranking, self.ranking_key(position))]
+        self.capital[position] = capital
+        insort(self.ranking, self.ranking_key(position))
+        self.weights.set(position, math.exp(capital))
+
+    # Told about the updates of the institutional capital, see SocialCapitalFramework.add_observer
+
+    def before_update(self, scf, key, event):
+        return None
+
+    def after_update(self, scf, key, event, old_value):
+        self.set_capital(self.membership.institution_index[event.institution_id], scf.data_structures[key][event.institution_id])
+
+    def before_update_many(self, scf, key, ids):
+        return None
+
+    def after_update_many(self, scf, key, ids, old_values):
+        for institution_id in ids:
+            self.set_capital(self.membership.institution_index[institution_id], scf.data_structures[key][institution_id])
+
+    def best_member(self, agent_id):
+        """The institution the agent is a member of with the highest capital, or None if it is not a member of any."""
+        memberships = self.membership.memberships[self.membership.agent_index[agent_id]]
+        if not memberships:
+            return None
+
+        # Walking down the ranking passes about I / (k + 1) institutions before one of the agent's k institutions
+        if len(self.ranking) < len(memberships) * (len(memberships) + 1):
+            for _, _, position in self.ranking:
+                if position in memberships:
+                    return self.membership.institution_ids[position]
+
+        best = min(memberships, key=self.ranking_key)
+        return self.membership.institution_ids[best]
+
+    def member_capital(self, agent_id):
+        """Sum of the capital of the institutions the agent is a member of, added in the order it joined them, as Agent.decide adds them."""
+        capital = self.capital
+        total = 0
+        for position in self.membership.memberships[self.membership.agent_index[agent_id]]:
+            total += capital[position]
+        return total
+
+    def sample_join(self, agent_id, rng):
+        """
+        An institution the agent is not a member of, chosen with probability proportional to exp(capital), or None if it
+        is a member of all of them. Takes one random() draw from rng, as random.choices does.
+        """
+        memberships = self.membership.memberships[self.membership.agent_index[agent_id]]
+        if len(memberships) == len(self.capital):
+            return None
+
+        excluded = sorted(memberships)
+        excluded_sums = list(accumulate((self.weights.weights[position] for position in excluded), initial=0.0))
+        total = self.weights.prefix_sum(self.weights.size) - excluded_sums[-1]
+        position = self.weights.find(rng.random() * total, excluded, excluded_sums)
+
+        # Rounding can put the target past the last weight, random.choices then takes the last institution
+        if position >= self.weights.size:
+            position = max(set(range(self.weights.size)) - set(memberships))
+        return self.membership.institution_ids[position]
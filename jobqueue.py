@@ -0,0 +1,143 @@
+import json
+import os
+import socket
+import sqlite3
+import time
+from config import Config, DEFAULT_CONFIG
+from sweep import sweep_jobs, run_sweep_job
+
+# Work queue for spreading sweep jobs over several machines
+# The jobs are rows of an SQLite file on a filesystem every node can reach. Any number of workers, on any node, claim a job
+# by taking a lease on it, play its game and write the result back. If a worker dies, its lease expires and the job is
+# handed to another worker, until it has been tried max_attempts times. No server is needed, one machine works as well.
+# SQLite's default rollback journal is used instead of WAL, since WAL does not work on network filesystems
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY,
+    job TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    worker TEXT,
+    lease_expires REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    result TEXT,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, id);
+"""
+
+class JobQueue():
+    def __init__(self, path, lease_seconds = 3600, max_attempts = 3):
+        # The lease must be longer than the slowest job, otherwise the job is played by several workers
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.connection = sqlite3.connect(path, timeout=60, isolation_level=None)
+        self.connection.executescript(SCHEMA)
+
+    def submit(self, jobs):
+        """Add jobs to the queue. Each job is a dictionary that can be written as json."""
+        self.connection.execute("BEGIN IMMEDIATE")
+        self.connection.executemany("INSERT INTO jobs (job) VALUES (?)", ((json.dumps(job),) for job in jobs))
+        self.connection.execute("COMMIT")
+
+    def claim(self, worker):
+        """Lease the next pending or expired job to the worker. Returns (id, job), or None if there is nothing to do."""
+        now = time.time()
+        # BEGIN IMMEDIATE takes the write lock, so two workers can not claim the same job
+        self.connection.execute("BEGIN IMMEDIATE")
+        try:
+            # Expired jobs that have been tried too many times are given up
+            self.connection.execute("UPDATE jobs SET status = 'failed', error = 'Lease expired' "
+                                    "WHERE status = 'running' AND lease_expires < ? AND attempts >= ?", (now, self.max_attempts))
+            row = self.connection.execute("SELECT id, job FROM jobs WHERE status = 'pending' OR (status = 'running' AND lease_expires < ?) "
+                                          "ORDER BY id LIMIT 1", (now,)).fetchone()
+            if row is not None:
+                self.connection.execute("UPDATE jobs SET status = 'running', worker = ?, lease_expires = ?, attempts = attempts + 1 WHERE id = ?",
+                                        (worker, now + self.lease_seconds, row[0]))
+            self.connection.execute("COMMIT")
+        except BaseException:
+            self.connection.execute("ROLLBACK")
+            raise
+
+        if row is None:
+            return None
+        return row[0], json.loads(row[1])
+
+    def complete(self, job_id, worker, result):
+        # Only the worker holding the lease can complete the job, a worker whose lease expired is ignored
+        self.connection.execute("UPDATE jobs SET status = 'done', result = ?, lease_expires = NULL WHERE id = ? AND worker = ? AND status = 'running'",
+                                (json.dumps(result), job_id, worker))
+
+    def fail(self, job_id, worker, error):
+        # The job is tried again by the next worker, unless it has been tried max_attempts times
+        self.connection.execute("UPDATE jobs SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, error = ?, lease_expires = NULL "
+                                "WHERE id = ? AND worker = ? AND status = 'running'", (self.max_attempts, error, job_id, worker))
+
+    def counts(self):
+        """Number of jobs with each status."""
+        return dict(self.connection.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+
+    def results(self):
+        # Results of the finished jobs, in the order they were submitted
+        return [(json.loads(job), json.loads(result))
+                for job, result in self.connection.execute("SELECT job, result FROM jobs WHERE status = 'done' ORDER BY id")]
+
+    def close(self):
+        self.connection.close()
+
+def worker_name():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+def submit_sweep(queue, points, sizes = (60,), games = 10, rounds = 100, max_rounds = 1000, experiments = ("satisfaction", "breakpoint"),
+                 base_seed = 0, config = DEFAULT_CONFIG):
+    """Add the jobs of a sweep to the queue, the same jobs run_sweep would play."""
+    jobs = [{"job": list(job), "config": config.to_dict(), "rounds": rounds, "max_rounds": max_rounds}
+            for job in sweep_jobs(points, sizes, games, experiments, base_seed)]
+    queue.submit(jobs)
+    return len(jobs)
+
+def run_queued_job(job, cache = None):
+    point_index, point, experiment, num_agents, game, seed = job["job"]
+    # json gives lists, seeds must be tuples again to seed the same random number streams
+    seed = tuple(seed) if seed is not None else None
+    return run_sweep_job((point_index, point, experiment, num_agents, game, seed), Config(**job["config"]),
+                         job["rounds"], job["max_rounds"], cache)
+
+def work(queue, worker = None, poll_seconds = 10, cache = None):
+    """
+    Play jobs from the queue until no job is pending or running.
+    While other workers still hold leases, the worker waits in case they expire. Returns the number of jobs played.
+    """
+    worker = worker or worker_name()
+    played = 0
+    while True:
+        claimed = queue.claim(worker)
+        if claimed is None:
+            counts = queue.counts()
+            if not counts.get("pending") and not counts.get("running"):
+                return played
+            time.sleep(poll_seconds)
+            continue
+
+        job_id, job = claimed
+        start_time = time.time()
+        try:
+            result = run_queued_job(job, cache)
+        except Exception as error:
+            queue.fail(job_id, worker, repr(error))
+            print(f"Job {job_id} failed: {error!r}")
+            continue
+
+        queue.complete(job_id, worker, result)
+        played += 1
+        print(f"Job {job_id} done by {worker} - {time.time() - start_time} seconds")
+
+def collect_results(queue):
+    """The results of the finished jobs as the same tidy tables run_sweep returns."""
+    import pandas as pd
+
+    rows = {"satisfaction": [], "breakpoints": []}
+    for _, (table, job_rows) in queue.results():
+        rows[table].extend(job_rows)
+    return {table: pd.DataFrame(table_rows) for table, table_rows in rows.items()}
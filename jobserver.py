@@ -0,0 +1,298 @@
+import asyncio
+import itertools
+import json
+import multiprocessing
+import os
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+import tornado.ioloop
+import tornado.web
+import tornado.websocket
+from config import DEFAULT_CONFIG
+from profiling import start_profiling
+from sweep import sweep_jobs, apply_point
+from UDD import play_satisfaction_job, play_breakpoint_job
+
+# Local job server shared by several analysts
+# Experiments are submitted over HTTP and played on one process pool that stays warm between runs. The per-round
+# aggregates are streamed to WebSocket clients as the workers produce them. Identical games submitted by several runs
+# at the same time are played once, and with a result cache games played before are not played again.
+#
+#   POST /runs               {"experiment": "satisfaction", "sizes": [60], "games": 10, "rounds": 100, "set": {...}}
+#   GET  /runs               status of every run
+#   GET  /runs/<id>          status and aggregates of a run
+#   WS   /runs/<id>/stream   a snapshot of the run's status and aggregates, then every message of the run from then on
+# Runs keep their aggregates, not the messages they sent, so the memory of the server does not grow with every round
+
+EXPERIMENTS = ("satisfaction", "breakpoint")
+
+def play_server_job(job, config, rounds, max_rounds, cache, queue, run_id):
+    # Played in a worker process. Satisfaction rounds are put on the queue as they are played
+    point_index, point, experiment, num_agents, game, seed = job
+    point_config = apply_point(config, point)
+
+    if experiment == "breakpoint":
+        result = play_breakpoint_job(cache, num_agents, max_rounds, seed, point_config)
+    else:
+        streamed = False
+        def on_round(round_num, averages):
+            nonlocal streamed
+            streamed = True
+            queue.put((run_id, num_agents, game, round_num, averages))
+
+        result = play_satisfaction_job(cache, num_agents, rounds, seed, point_config, on_round = on_round)
+        if not streamed:
+            # The result came from the cache, its rounds are sent all at once
+            for round_num, averages in result["rounds"]:
+                queue.put((run_id, num_agents, game, round_num, averages))
+
+    # Marks the end of the game's rounds, the result itself is returned through the executor
+    queue.put((run_id, num_agents, game, None, None))
+    return result
+
+def parse_spec(spec):
+    """Check an experiment spec from a client and fill in the defaults. Raises ValueError for invalid specs."""
+    unknown = set(spec) - {"experiment", "sizes", "games", "rounds", "max_rounds", "set", "seed"}
+    if unknown:
+        raise ValueError(f"Unknown fields {sorted(unknown)}")
+
+    parsed = {
+        "experiment": spec.get("experiment", "satisfaction"),
+        "sizes": [int(size) for size in spec.get("sizes", [60])],
+        "games": int(spec.get("games", 10)),
+        "rounds": int(spec.get("rounds", 100)),
+        "max_rounds": int(spec.get("max_rounds", 1000)),
+        "set": dict(spec.get("set", {})),
+        "seed": int(spec.get("seed", 0)),
+    }
+    if parsed["experiment"] not in EXPERIMENTS:
+        raise ValueError(f"experiment must be one of {EXPERIMENTS}")
+    if not parsed["sizes"] or min(parsed["sizes"]) < 3 or parsed["games"] < 1:
+        raise ValueError("sizes must be at least 3 agents and games at least 1")
+    try:
+        apply_point(DEFAULT_CONFIG, parsed["set"])
+    except (KeyError, TypeError) as error:
+        raise ValueError(f"Invalid parameter override: {error}")
+    return parsed
+
+def spec_rounds(spec, experiment):
+    # Rounds that decide the outcome of a game of the experiment
+    return spec["rounds"] if experiment == "satisfaction" else spec["max_rounds"]
+
+class Run():
+    def __init__(self, run_id, spec):
+        self.run_id = run_id
+        self.spec = spec
+        self.status = "running"
+        self.error = None
+        self.start_time = time.time()
+        self.total_games = len(spec["sizes"]) * spec["games"]
+        self.done_games = 0
+        self.clients = set()
+
+        self.round_sums = defaultdict(lambda: defaultdict(float)) # (num_agents, round) -> agent type -> sum over games
+        self.round_counts = defaultdict(int)
+        self.breakpoints = defaultdict(list) # num_agents -> breakpoint of each finished game
+
+    def send(self, message):
+        text = json.dumps(message)
+        for client in list(self.clients):
+            try:
+                client.write_message(text)
+            except tornado.websocket.WebSocketClosedError:
+                # The client went away without the connection being closed yet
+                self.clients.discard(client)
+
+    def snapshot(self):
+        # First message of a client, with what the run has sent so far as aggregates
+        return {"type": "snapshot", **self.describe(aggregates = True)}
+
+    def add_round(self, num_agents, game, round_num, averages):
+        key = (num_agents, round_num)
+        for agent_type, value in averages.items():
+            self.round_sums[key][agent_type] += value
+        self.round_counts[key] += 1
+        self.send({"type": "round", "num_agents": num_agents, "game": game, "round": round_num, "satisfaction": averages,
+                   "games": self.round_counts[key], "mean": self.round_mean(key)})
+
+    def round_mean(self, key):
+        return {agent_type: value / self.round_counts[key] for agent_type, value in self.round_sums[key].items()}
+
+    def add_game(self, num_agents, game, result):
+        self.done_games += 1
+        message = {"type": "game", "num_agents": num_agents, "game": game, "done_games": self.done_games, "total_games": self.total_games}
+        if self.spec["experiment"] == "breakpoint":
+            self.breakpoints[num_agents].append(result)
+            message["breakpoint"] = result
+            message["mean_breakpoint"] = sum(self.breakpoints[num_agents]) / len(self.breakpoints[num_agents])
+        else:
+            message["final"] = result["final"]
+        self.send(message)
+
+    def summary(self):
+        if self.spec["experiment"] == "breakpoint":
+            return {str(num_agents): sum(values) / len(values) for num_agents, values in sorted(self.breakpoints.items())}
+        summary = defaultdict(dict)
+        for (num_agents, round_num) in sorted(self.round_counts):
+            summary[str(num_agents)][str(round_num)] = self.round_mean((num_agents, round_num))
+        return summary
+
+    def finish(self, error = None):
+        self.status = "failed" if error else "done"
+        self.error = error
+        self.send({"type": "done", "status": self.status, "error": error, "seconds": time.time() - self.start_time, "summary": self.summary()})
+        for client in list(self.clients):
+            client.close()
+
+    def describe(self, aggregates = False):
+        description = {"run_id": self.run_id, "status": self.status, "spec": self.spec, "done_games": self.done_games,
+                       "total_games": self.total_games, "error": self.error}
+        if aggregates:
+            description["summary"] = self.summary()
+        return description
+
+class JobServer():
+    def __init__(self, workers = None, cache = None, config = DEFAULT_CONFIG, profile_dir = None, profile_every = 10):
+        # With profile_dir, the workers profile one in every profile_every games they play, see profiling.py
+        self.executor = ProcessPoolExecutor(max_workers=workers or os.cpu_count(), initializer=start_profiling,
+                                            initargs=(profile_dir, profile_every))
+        self.manager = multiprocessing.Manager()
+        self.queue = self.manager.Queue() # Rounds played by the workers, read by a thread and handed to the event loop
+        self.cache = cache
+        self.config = config
+        self.runs = {}
+        self.run_ids = itertools.count(1)
+        self.in_flight = {} # Games being played, shared by every run that asks for the same game
+        self.rounds_received = {} # (run, num_agents, game) -> set once all rounds of the game have come through the queue
+        self.loop = None
+
+    def submit(self, spec):
+        run = Run(str(next(self.run_ids)), spec)
+        self.runs[run.run_id] = run
+        asyncio.ensure_future(self.play(run))
+        return run
+
+    async def play(self, run):
+        spec = run.spec
+        jobs = sweep_jobs([spec["set"]], spec["sizes"], spec["games"], [spec["experiment"]], spec["seed"])
+        # Every job is waited for, so a failed game does not leave the run's other games playing unnoticed
+        results = await asyncio.gather(*(self.play_job(run, job) for job in jobs), return_exceptions=True)
+        errors = [result for result in results if isinstance(result, BaseException)]
+        run.finish(repr(errors[0]) if errors else None)
+
+    async def play_job(self, run, job):
+        _, point, experiment, num_agents, game, seed = job
+        key = json.dumps([point, experiment, num_agents, seed, spec_rounds(run.spec, experiment)])
+
+        shared = self.in_flight.get(key)
+        if shared is not None and shared.done() and (shared.cancelled() or shared.exception() is not None):
+            # A failed game is removed from in_flight by its done callback, which may not have run yet
+            shared = None
+        if shared is None:
+            game_key = (run.run_id, num_agents, game)
+            rounds_received = self.rounds_received[game_key] = asyncio.Event()
+            try:
+                shared = asyncio.get_running_loop().run_in_executor(self.executor, play_server_job, job, self.config, run.spec["rounds"],
+                                                                     run.spec["max_rounds"], self.cache, self.queue, run.run_id)
+                self.in_flight[key] = shared
+                shared.add_done_callback(lambda _: self.in_flight.pop(key, None))
+                result = await shared
+                # The result can arrive before the last rounds have been read from the queue
+                await rounds_received.wait()
+            finally:
+                del self.rounds_received[game_key]
+        else:
+            result = await shared
+            if experiment == "satisfaction":
+                # The rounds of a shared game were streamed to the run that started it
+                for round_num, averages in result["rounds"]:
+                    run.add_round(num_agents, game, round_num, averages)
+        run.add_game(num_agents, game, result)
+
+    def read_queue(self):
+        # Runs in its own thread, since reading the queue blocks
+        while True:
+            message = self.queue.get()
+            if message is None:
+                return
+            self.loop.add_callback(self.on_round, *message)
+
+    def on_round(self, run_id, num_agents, game, round_num, averages):
+        if round_num is None:
+            rounds_received = self.rounds_received.get((run_id, num_agents, game))
+            if rounds_received is not None:
+                rounds_received.set()
+        else:
+            self.runs[run_id].add_round(num_agents, game, round_num, averages)
+
+    def application(self):
+        return tornado.web.Application([
+            (r"/runs", RunsHandler, {"server": self}),
+            (r"/runs/([0-9]+)", RunHandler, {"server": self}),
+            (r"/runs/([0-9]+)/stream", StreamHandler, {"server": self}),
+        ])
+
+    def serve(self, port = 8888, address = "127.0.0.1"):
+        self.loop = tornado.ioloop.IOLoop.current()
+        threading.Thread(target=self.read_queue, daemon=True).start()
+        self.application().listen(port, address)
+        print(f"Job server listening on http://{address}:{port} with {self.executor._max_workers} workers")
+        try:
+            self.loop.start()
+        finally:
+            self.close()
+
+    def close(self):
+        self.queue.put(None)
+        self.executor.shutdown(cancel_futures=True)
+        self.manager.shutdown()
+
+class RunsHandler(tornado.web.RequestHandler):
+    def initialize(self, server):
+        self.server = server
+
+    def get(self):
+        self.write({"runs": [run.describe() for run in self.server.runs.values()]})
+
+    def post(self):
+        try:
+            spec = parse_spec(json.loads(self.request.body or b"{}"))
+        except (ValueError, TypeError) as error:
+            self.set_status(400)
+            self.write({"error": str(error)})
+            return
+        run = self.server.submit(spec)
+        self.set_status(201)
+        self.write({"run_id": run.run_id, "stream": f"/runs/{run.run_id}/stream"})
+
+class RunHandler(tornado.web.RequestHandler):
+    def initialize(self, server):
+        self.server = server
+
+    def get(self, run_id):
+        run = self.server.runs.get(run_id)
+        if run is None:
+            raise tornado.web.HTTPError(404)
+        self.write(run.describe(aggregates = True))
+
+class StreamHandler(tornado.websocket.WebSocketHandler):
+    def initialize(self, server):
+        self.server = server
+        self.run = None
+
+    def open(self, run_id):
+        self.run = self.server.runs.get(run_id)
+        if self.run is None:
+            self.close(code=4004, reason="Unknown run")
+            return
+        self.write_message(json.dumps(self.run.snapshot()))
+        if self.run.status == "running":
+            self.run.clients.add(self)
+        else:
+            self.close()
+
+    def on_close(self):
+        if self.run is not None:
+            self.run.clients.discard(self)
@@ -0,0 +1,161 @@
+from collections.abc import MutableSet
+import numpy as np
+
+# Membership of agents in institutions, stored once for both directions
+# The boolean incidence matrix gives per-agent membership masks and member counts with array operations,
+# and the insertion ordered dictionaries give each institution's members and each agent's institutions with O(1) add and remove
+# A membership added from the agent's side only, as the institution each agent starts in, is unlisted: the agent counts it
+# among its institutions, but the institution does not count the agent among its members until it joins through the institution
+class MembershipIndex():
+    def __init__(self, agent_ids, institution_ids):
+        self.agent_ids = list(agent_ids)
+        self.institution_ids = list(institution_ids)
+        self.agent_index = {agent_id: position for position, agent_id in enumerate(self.agent_ids)}
+        self.institution_index = {institution_id: position for position, institution_id in enumerate(self.institution_ids)}
+
+        self.matrix = np.zeros((len(self.agent_ids), len(self.institution_ids)), dtype=bool)
+        self.members = [{} for _ in self.institution_ids] # Agent positions of each institution's members
+        self.memberships = [{} for _ in self.agent_ids] # Institution positions of each agent's institutions
+        self.unlisted = np.zeros_like(self.matrix) # Memberships the institution does not list, see add
+        self.observer = None # Told about every change with membership_changed, such as the TypeAggregates in aggregates.py
+
+    def add(self, agent_id, institution_id, listed = True):
+        # An unlisted membership is only known to the agent. Adding it again as listed makes the institution list the agent
+        agent = self.agent_index[agent_id]
+        institution = self.institution_index[institution_id]
+        if self.matrix[agent, institution]:
+            if listed and self.unlisted[agent, institution]:
+                self.unlisted[agent, institution] = False
+                self.members[institution][agent] = None
+            return False
+
+        self.matrix[agent, institution] = True
+        if listed:
+            self.members[institution][agent] = None
+        else:
+            self.unlisted[agent, institution] = True
+        self.memberships[agent][institution] = None
+        if self.observer is not None:
+            self.observer.membership_changed(agent, institution, 1)
+        return True
+
+    def remove(self, agent_id, institution_id):
+        agent = self.agent_index[agent_id]
+        institution = self.institution_index[institution_id]
+        if not self.matrix[agent, institution]:
+            return False
+
+        self.matrix[agent, institution] = False
+        self.unlisted[agent, institution] = False
+        self.members[institution].pop(agent, None)
+        del self.memberships[agent][institution]
+        if self.observer is not None:
+            self.observer.membership_changed(agent, institution, -1)
+        return True
+
+    def empty_copy(self):
+        """Index of the same agents and institutions without any memberships. The ids and positions are shared, since they never change."""
+        index = MembershipIndex.__new__(MembershipIndex)
+        index.agent_ids = self.agent_ids
+        index.institution_ids = self.institution_ids
+        index.agent_index = self.agent_index
+        index.institution_index = self.institution_index
+        index.matrix = np.zeros_like(self.matrix)
+        index.members = [{} for _ in self.institution_ids]
+        index.memberships = [{} for _ in self.agent_ids]
+        index.unlisted = np.zeros_like(self.matrix)
+        index.observer = None
+        return index
+
+    def is_member(self, agent_id, institution_id):
+        agent = self.agent_index.get(agent_id)
+        institution = self.institution_index.get(institution_id)
+        if agent is None or institution is None:
+            return False
+        return institution in self.memberships[agent]
+
+    def is_listed(self, agent_id, institution_id):
+        """True if the institution lists the agent as a member, which unlisted memberships are not."""
+        agent = self.agent_index.get(agent_id)
+        institution = self.institution_index.get(institution_id)
+        if agent is None or institution is None:
+            return False
+        return agent in self.members[institution]
+
+    def listed(self, agents, institutions):
+        """Boolean array, True where the agent at each position is a listed member of the institution at the same position."""
+        return self.matrix[agents, institutions] & ~self.unlisted[agents, institutions]
+
+    def members_of(self, institution_id):
+        """Ids of the members of an institution, in the order they joined."""
+        return [self.agent_ids[agent] for agent in self.members[self.institution_index[institution_id]]]
+
+    def institutions_of(self, agent_id):
+        """Ids of the institutions an agent is a member of, in the order it joined them."""
+        return [self.institution_ids[institution] for institution in self.memberships[self.agent_index[agent_id]]]
+
+    def agent_mask(self, agent_id):
+        """Boolean array over the institutions, True where the agent is a member."""
+        return self.matrix[self.agent_index[agent_id]]
+
+    def member_counts(self):
+        return self.matrix.sum(axis=0)
+
+    def institution_view(self, institution_id):
+        return InstitutionMembers(self, institution_id)
+
+    def agent_view(self, agent_id):
+        return AgentInstitutions(self, agent_id)
+
+# Set-like views of the index, used as Institution.members and Agent.institutions
+# Adding or removing through either view updates both directions
+class InstitutionMembers(MutableSet):
+    def __init__(self, index, institution_id):
+        self.index = index
+        self.institution_id = institution_id
+        self.position = index.institution_index[institution_id]
+
+    def __contains__(self, agent_id):
+        return self.index.is_listed(agent_id, self.institution_id)
+
+    def __iter__(self):
+        # Iterates over a copy, so members can be removed while iterating
+        return iter(self.index.members_of(self.institution_id))
+
+    def __len__(self):
+        return len(self.index.members[self.position])
+
+    def add(self, agent_id):
+        self.index.add(agent_id, self.institution_id)
+
+    def discard(self, agent_id):
+        self.index.remove(agent_id, self.institution_id)
+
+    def __repr__(self):
+        return f"InstitutionMembers({self.institution_id}: {self.index.members_of(self.institution_id)})"
+
+class AgentInstitutions(MutableSet):
+    def __init__(self, index, agent_id):
+        self.index = index
+        self.agent_id = agent_id
+        self.position = index.agent_index[agent_id]
+
+    def __contains__(self, institution_id):
+        return self.index.is_member(self.agent_id, institution_id)
+
+    def __iter__(self):
+        # Iterates over a copy, so institutions can be left while iterating
+        return iter(self.index.institutions_of(self.agent_id))
+
+    def __len__(self):
+        return len(self.index.memberships[self.position])
+
+    def add(self, institution_id):
+        # Added from the agent's side only, the institution does not list the agent until it joins through the institution
+        self.index.add(self.agent_id, institution_id, listed = False)
+
+    def discard(self, institution_id):
+        self.index.remove(self.agent_id, institution_id)
+
+    def __repr__(self):
+        return f"AgentInstitutions({self.agent_id}: {self.index.institutions_of(self.agent_id)})"
@@ -0,0 +1,130 @@
+import csv
+import gc
+import sys
+import time
+import tracemalloc
+from types import FunctionType, MethodType, ModuleType, BuiltinFunctionType
+import numpy as np
+from config import DEFAULT_CONFIG
+from UDD import UDD, suppress_print
+
+# Memory profiling of games of different sizes
+# tracemalloc gives the memory the game holds and its peak, after MultiAgentSystem.setup and after a number of rounds.
+# The memory is also split by subsystem, by adding up the size of every object reachable from the subsystem.
+# Objects reachable from several subsystems are counted for the first one only, in the order of SUBSYSTEMS
+
+SUBSYSTEMS = ["scf", "reputations", "membership", "institution_events", "institutions", "agents", "random_streams", "output_buffer"]
+
+# Objects that are shared by the whole program, and not part of any game
+SKIPPED_TYPES = (type, ModuleType, FunctionType, MethodType, BuiltinFunctionType)
+
+def deep_size(root, seen):
+    """Bytes used by root and every object reachable from it that is not in seen. Adds the objects it counts to seen."""
+    total = 0
+    stack = [root]
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen or isinstance(obj, SKIPPED_TYPES):
+            continue
+        seen.add(id(obj))
+        total += sys.getsizeof(obj) # Includes the data of numpy arrays that own it
+
+        if isinstance(obj, np.ndarray):
+            if obj.base is not None:
+                stack.append(obj.base)
+        elif isinstance(obj, dict):
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        elif isinstance(obj, (list, tuple, set, frozenset)):
+            stack.extend(obj)
+        else:
+            if hasattr(obj, '__dict__'):
+                stack.append(obj.__dict__)
+            for slot in getattr(type(obj), '__slots__', ()):
+                if hasattr(obj, slot):
+                    stack.append(getattr(obj, slot))
+    return total
+
+def subsystem_sizes(udd, output_buffer = None):
+    # Bytes used by each subsystem of the game
+    system = udd.system
+    scf = next(iter(system.agents.values())).scf
+    # The objects that tie the subsystems together are not counted, so each subsystem only counts its own objects
+    seen = {id(udd), id(system), id(scf), id(system.config)}
+
+    roots = {
+        "scf": scf.data_structures,
+        "reputations": system.reputation_sources,
+        "membership": system.membership,
+        "institution_events": [(institution._events, institution.pending_rule_events) for institution in system.institutions.values()],
+        "institutions": system.institutions,
+        "agents": system.agents,
+        "random_streams": system.streams,
+    }
+    sizes = {name: deep_size(root, seen) for name, root in roots.items()}
+    # The printed output of the rounds, which the experiment drivers keep in memory until the game ends
+    sizes["output_buffer"] = sys.getsizeof(output_buffer.getvalue()) if output_buffer is not None else 0
+    return sizes
+
+def measure(stage, num_agents, rounds, udd, output_buffer = None):
+    gc.collect()
+    current, peak = tracemalloc.get_traced_memory()
+    sizes = subsystem_sizes(udd, output_buffer)
+    return {"num_agents": num_agents, "stage": stage, "rounds": rounds, "retained_bytes": current, "peak_bytes": peak,
+            **{f"{name}_bytes": size for name, size in sizes.items()}}
+
+def profile_game(num_agents, rounds, seed = None, config = DEFAULT_CONFIG):
+    """
+    Play one game under tracemalloc. Returns a row after setup and a row after the rounds with the retained and peak memory
+    and the bytes used by each subsystem. The peak of the rounds row is the peak during the rounds only.
+    """
+    was_tracing = tracemalloc.is_tracing()
+    if not was_tracing:
+        tracemalloc.start()
+    gc.collect()
+    tracemalloc.reset_peak()
+    baseline, _ = tracemalloc.get_traced_memory()
+
+    udd = UDD(num_agents = num_agents, seed = seed, config = config)
+    with suppress_print() as output_buffer:
+        udd.initialize_system()
+        rows = [measure("setup", num_agents, 0, udd, output_buffer)]
+
+    tracemalloc.reset_peak()
+    with suppress_print() as output_buffer:
+        for _ in range(rounds):
+            udd.step()
+        rows.append(measure("rounds", num_agents, rounds, udd, output_buffer))
+
+    # Memory is reported relative to what was held before the game started
+    # Unattributed memory is held by the game outside the subsystems, or by the interpreter for it (caches, free lists)
+    for row in rows:
+        row["retained_bytes"] -= baseline
+        row["peak_bytes"] -= baseline
+        row["unattributed_bytes"] = row["retained_bytes"] - sum(row[f"{name}_bytes"] for name in SUBSYSTEMS)
+
+    del udd
+    if not was_tracing:
+        tracemalloc.stop()
+    return rows
+
+def profile_sizes(sizes = (15, 30, 60, 90, 120, 150, 180, 210, 240, 270, 300), rounds = 20, seed = 0, config = DEFAULT_CONFIG, file = None):
+    """Memory scaling table over population sizes. Written as csv to file if given."""
+    start_time = time.time()
+    rows = []
+    for num_agents in sizes:
+        game_rows = profile_game(num_agents, rounds, seed = seed, config = config)
+        rows.extend(game_rows)
+        after_rounds = game_rows[-1]
+        print(f"{num_agents} agents: {after_rounds['retained_bytes'] / 2**20:.2f} MiB retained, "
+              f"{max(row['peak_bytes'] for row in game_rows) / 2**20:.2f} MiB peak, "
+              f"{after_rounds['scf_bytes'] / 2**20:.2f} MiB in the scf after {rounds} rounds")
+
+    if file is not None:
+        with open(file, 'w', newline='') as output:
+            writer = csv.DictWriter(output, fieldnames=list(rows[0].keys()))
+            writer.writeheader()
+            writer.writerows(rows)
+
+    print(f"profile_sizes() took {time.time() - start_time} seconds")
+    return rows
@@ -1,60 +1,157 @@
+import os
+import time
+from statistics import NormalDist
+import numpy as np
 import pandas as pd
+import matplotlib
+matplotlib.use("Agg") # Figures are only written to files, so plotting works on machines without a display
 import matplotlib.pyplot as plt
-from collections import defaultdict
 
-def read_and_plot(file_path):
-    # Read the CSV file
+def save_figure(figure, directory, name, formats):
+    # Writes the figure once per format, e.g. satisfaction.png and satisfaction.svg, and closes it
+    os.makedirs(directory, exist_ok=True)
+    paths = [os.path.join(directory, f"{name}.{extension}") for extension in formats]
+    for path in paths:
+        figure.savefig(path, bbox_inches="tight")
+    plt.close(figure)
+    return paths
+
+def read_results(file_path):
+    """
+    Read the results file written by run_simulations.
+    Returns the average satisfaction of each agent type per round, and the average breakpoint per population size.
+    """
     with open(file_path, 'r') as file:
-        lines = file.readlines()
-
-    # Initialize dictionaries to hold satisfaction data and breakpoints
-    satisfaction_data = defaultdict(lambda: {"Social Agent": 0, "Dominant Agent": 0, "Random Agent": 0})
-    breakpoints = {}
-
-    # Parse the CSV file data
-    round_num = None
-    for line in lines:
-        line = line.strip()
-        if line.startswith("Round"):
-            round_num = int(line.split()[1])
-        elif "Social Agents" in line:
-            satisfaction_data[round_num]["Social Agent"] = float(line.split(":")[1].strip())
-        elif "Dominant Agents" in line:
-            satisfaction_data[round_num]["Dominant Agent"] = float(line.split(":")[1].strip())
-        elif "Random Agents" in line:
-            satisfaction_data[round_num]["Random Agent"] = float(line.split(":")[1].strip())
-        elif line.startswith("Average breakpoint for"):
-            agent_amount = int(line.split()[3])
-            avg_rounds = float(line.split(":")[1].strip())
-            breakpoints[agent_amount] = avg_rounds
-
-    # Convert satisfaction_data to a DataFrame
-    satisfaction_df = pd.DataFrame.from_dict(satisfaction_data, orient='index').sort_index()
+        lines = pd.Series(file.read().splitlines(), dtype=str).str.strip()
+
+    # Each round is a "Round n" line followed by one "<type>s: value" line per agent type that played, such as "Social Agents: 0.7"
+    rounds = lines.str.extract(r"^Round (\d+)$")[0].astype(float).ffill()
+    satisfactions = lines.str.extract(r"^(?!Average breakpoint for )(.+)s: (.+)$")
+    satisfaction_rows = satisfactions[0].notna() & rounds.notna()
+    satisfaction_df = pd.DataFrame({
+        "round": rounds[satisfaction_rows].astype(int),
+        "agent_type": satisfactions[0][satisfaction_rows],
+        "satisfaction": satisfactions[1][satisfaction_rows].astype(float),
+    }).pivot(index="round", columns="agent_type", values="satisfaction").sort_index()
+
+    breakpoints = lines.str.extract(r"^Average breakpoint for (\d+) agents: (.+)$").dropna()
+    breakpoints = pd.Series(breakpoints[1].astype(float).to_numpy(), index=breakpoints[0].astype(int).to_numpy()).sort_index()
+
+    return satisfaction_df, breakpoints
+
+def read_and_plot(file_path, directory = "plots", formats = ("png",)):
+    """Plot the results file written by run_simulations. The figures are written to directory instead of shown."""
+    satisfaction_df, breakpoints = read_results(file_path)
 
     # Plot satisfaction over rounds
-    plt.figure(figsize=(10, 5))
-    plt.plot(satisfaction_df.index, satisfaction_df["Social Agent"], label="Social Agent", marker='o')
-    plt.plot(satisfaction_df.index, satisfaction_df["Dominant Agent"], label="Dominant Agent", marker='o')
-    plt.plot(satisfaction_df.index, satisfaction_df["Random Agent"], label="Random Agent", marker='o')
+    figure = plt.figure(figsize=(10, 5))
+    for agent_type in satisfaction_df.columns:
+        plt.plot(satisfaction_df.index, satisfaction_df[agent_type], label=agent_type, marker='o')
     plt.xlabel("Rounds")
     plt.ylabel("Satisfaction")
     plt.title("Satisfaction of Agents Over Rounds")
     plt.legend()
     plt.grid(True)
-    plt.show()
+    paths = save_figure(figure, directory, "satisfaction", formats)
 
     # Plot breakpoints
-    agent_amounts = list(breakpoints.keys())
-    avg_rounds = list(breakpoints.values())
-
-    plt.figure(figsize=(10, 5))
-    plt.plot(agent_amounts, avg_rounds, marker='o', linestyle='-', color='purple')
+    figure = plt.figure(figsize=(10, 5))
+    plt.plot(breakpoints.index, breakpoints.values, marker='o', linestyle='-', color='purple')
     plt.xlabel("Number of Agents")
     plt.ylabel("Average Rounds to Breakpoint")
     plt.title("Average Rounds to Breakpoint for Different Numbers of Agents")
     plt.grid(True)
-    plt.show()
+    paths += save_figure(figure, directory, "breakpoints", formats)
+
+    return paths
+
+def confidence_bands(frame, by, value, confidence = 0.95):
+    # Mean and normal approximation confidence interval of value for every group
+    z = NormalDist().inv_cdf(0.5 + confidence / 2)
+    summary = frame.groupby(by, observed=True)[value].agg(["mean", "std", "count"]).reset_index()
+    half_width = z * summary["std"].fillna(0) / np.sqrt(summary["count"])
+    summary["low"] = summary["mean"] - half_width
+    summary["high"] = summary["mean"] + half_width
+    return summary
+
+def read_sweep(directory):
+    """Read the tables written by save_sweep. Tables that were not written are returned as None."""
+    tables = {}
+    for table, categories in (("satisfaction", {"agent_type": "category"}), ("breakpoints", {})):
+        path = os.path.join(directory, f"{table}.csv")
+        tables[table] = pd.read_csv(path, dtype=categories, engine="c") if os.path.exists(path) else None
+    return tables
+
+def point_titles(table):
+    # "cooperation_threshold=0.3, num_institutions=9" for each sweep point, from the parameter columns of the table
+    parameters = [column for column in table.columns
+                  if column not in ("point", "game", "num_agents", "round", "agent_type", "satisfaction", "breakpoint", "reached")]
+    points = table.drop_duplicates("point")
+    return {point: ", ".join(f"{column}={value}" for column, value in zip(parameters, values))
+            for point, values in zip(points["point"], points[parameters].itertuples(index=False))}
+
+def plot_sweep(directory = "sweep_results", out = None, formats = ("png",), confidence = 0.95):
+    """
+    Plot the results of run_sweep, one figure per parameter point.
+    Each figure has the mean satisfaction of each agent type over the rounds for every population size, and the mean
+    breakpoint per population size, with confidence bands. Returns the paths of the written files.
+    """
+    start_time = time.time()
+    out = out or os.path.join(directory, "plots")
+    tables = read_sweep(directory)
+    satisfaction, breakpoints = tables["satisfaction"], tables["breakpoints"]
+
+    # All games are reduced to one row per point, size, round and agent type before anything is drawn
+    satisfaction_bands = None
+    if satisfaction is not None and len(satisfaction):
+        satisfaction_bands = confidence_bands(satisfaction, ["point", "num_agents", "agent_type", "round"], "satisfaction", confidence)
+    breakpoint_bands = None
+    if breakpoints is not None and len(breakpoints):
+        breakpoint_bands = confidence_bands(breakpoints, ["point", "num_agents"], "breakpoint", confidence)
+
+    titles = {}
+    for table in (satisfaction, breakpoints):
+        if table is not None and len(table):
+            titles.update(point_titles(table))
+
+    paths = []
+    for point, title in sorted(titles.items()):
+        sizes = []
+        if satisfaction_bands is not None:
+            point_satisfaction = satisfaction_bands[satisfaction_bands["point"] == point]
+            sizes = sorted(point_satisfaction["num_agents"].unique())
+        panels = len(sizes) + (breakpoint_bands is not None)
+
+        figure, axes = plt.subplots(1, panels, figsize=(5 * panels, 4), squeeze=False, constrained_layout=True)
+        axes = axes[0]
+        for axis, num_agents in zip(axes, sizes):
+            size_rows = point_satisfaction[point_satisfaction["num_agents"] == num_agents]
+            for agent_type, rows in size_rows.groupby("agent_type", observed=True):
+                line, = axis.plot(rows["round"], rows["mean"], label=agent_type)
+                axis.fill_between(rows["round"], rows["low"], rows["high"], color=line.get_color(), alpha=0.25)
+            axis.set_xlabel("Rounds")
+            axis.set_ylabel("Satisfaction")
+            axis.set_title(f"{num_agents} agents")
+            axis.legend()
+            axis.grid(True)
+
+        if breakpoint_bands is not None:
+            rows = breakpoint_bands[breakpoint_bands["point"] == point]
+            axis = axes[-1]
+            axis.plot(rows["num_agents"], rows["mean"], marker='o', color='purple')
+            axis.fill_between(rows["num_agents"], rows["low"], rows["high"], color='purple', alpha=0.25)
+            axis.set_xlabel("Number of Agents")
+            axis.set_ylabel("Rounds to Breakpoint")
+            axis.set_title("Breakpoints")
+            axis.grid(True)
+
+        figure.suptitle(f"Point {point}: {title}" if title else f"Point {point}")
+        paths += save_figure(figure, out, f"point_{point}", formats)
+
+    print(f"plot_sweep() wrote {len(paths)} files to {out} in {time.time() - start_time} seconds")
+    return paths
 
-# Example usage
-file_path = "simulation_results.csv"  # Replace with your file path
-read_and_plot(file_path)
+if __name__ == "__main__":
+    # Example usage
+    file_path = "simulation_results.csv"  # Replace with your file path
+    read_and_plot(file_path)
@@ -0,0 +1,107 @@
+import cProfile
+import glob
+import io
+import os
+import pstats
+import socket
+from collections import defaultdict
+
+# Opt-in profiling of the experiment drivers
+# One in every `every` games played by a process is played under cProfile, and its stats are written to the profile
+# directory as game-<host>-<pid>-<n>.prof. Worker processes and queue workers on other machines write their own files to
+# the same directory, and merge_profiles combines them into one report and a collapsed stack file for flame graphs.
+# Games are profiled from run_game in UDD.py, so the simulation code is not changed. When profiling is off, the only
+# cost is checking once per game that PROFILER is None.
+
+PROFILER = None # Profiler of the games of this process, set by start_profiling
+
+class GameProfiler():
+    def __init__(self, directory, every = 10):
+        self.directory = directory
+        self.every = every
+        self.games = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def run(self, function, *args, **kwargs):
+        # Plays a game, under cProfile if it is one of the sampled games
+        self.games += 1
+        if (self.games - 1) % self.every:
+            return function(*args, **kwargs)
+
+        profiler = cProfile.Profile()
+        try:
+            return profiler.runcall(function, *args, **kwargs)
+        finally:
+            profiler.dump_stats(os.path.join(self.directory, f"game-{socket.gethostname()}-{os.getpid()}-{self.games}.prof"))
+
+def start_profiling(directory, every = 10):
+    """Profile one in every `every` games this process plays, or none if directory is None. Also the initializer of worker processes."""
+    global PROFILER
+    PROFILER = GameProfiler(directory, every) if directory is not None else None
+
+def profile_files(directory):
+    return sorted(glob.glob(os.path.join(directory, "game-*.prof")))
+
+def function_label(function):
+    # "agents.py:step" for a function of the game, "<built-in method ...>" for built-ins
+    filename, _, name = function
+    if filename == "~":
+        return name
+    return f"{os.path.basename(filename)}:{name}"
+
+def collapsed_stacks(stats, min_fraction = 0.001):
+    """
+    Collapsed stacks ("root;caller;function microseconds" per line) for flame graph tools, from merged cProfile stats.
+    cProfile only keeps the calls between pairs of functions, not whole stacks, so the stacks are rebuilt from the roots
+    down: the time of the calls from f to g is shared out to the stacks that reach f, in proportion to the time of f on each.
+    Stacks with less than min_fraction of the total time are left out, so the number of stacks stays small.
+    """
+    callees = defaultdict(list)
+    roots = []
+    for function, (_, _, _, _, callers) in stats.stats.items():
+        if not callers:
+            roots.append(function)
+        for caller, (_, _, call_self_time, call_total_time) in callers.items():
+            callees[caller].append((function, call_self_time, call_total_time))
+
+    total_time = sum(stats.stats[root][3] for root in roots)
+    min_time = total_time * min_fraction
+    stacks = defaultdict(float)
+
+    pending = [(root, (), stats.stats[root][2], stats.stats[root][3]) for root in roots]
+    while pending:
+        function, stack, self_time, function_total_time = pending.pop()
+        stack = stack + (function,)
+        stacks[";".join(function_label(frame) for frame in stack)] += self_time
+
+        # Share of the function's total time that was spent on this stack
+        share = function_total_time / stats.stats[function][3] if stats.stats[function][3] else 0
+        for callee, call_self_time, call_total_time in callees[function]:
+            if callee not in stack and call_total_time * share >= min_time: # Recursive calls are counted on the first frame
+                pending.append((callee, stack, call_self_time * share, call_total_time * share))
+
+    return {stack: int(seconds * 1e6) for stack, seconds in stacks.items() if seconds * 1e6 >= 1}
+
+def merge_profiles(directory, top = 30, sort = "cumulative"):
+    """
+    Merge the stats of every profiled game in directory. Writes merged.prof (readable by pstats and snakeviz),
+    report.txt with the top functions, and collapsed.txt with the collapsed stacks. Returns the report.
+    """
+    files = profile_files(directory)
+    if not files:
+        raise FileNotFoundError(f"No profiled games in {directory}")
+
+    output = io.StringIO()
+    output.write(f"{len(files)} profiled games from {directory}\n")
+    stats = pstats.Stats(*files, stream=output)
+    stats.dump_stats(os.path.join(directory, "merged.prof"))
+    stats.sort_stats(sort).print_stats(top)
+    report = output.getvalue()
+    with open(os.path.join(directory, "report.txt"), 'w') as file:
+        file.write(report)
+
+    with open(os.path.join(directory, "collapsed.txt"), 'w') as file:
+        for stack, microseconds in sorted(collapsed_stacks(stats).items()):
+            file.write(f"{stack} {microseconds}\n")
+
+    return report
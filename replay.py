@@ -0,0 +1,141 @@
+import pickle
+from collections import defaultdict
+from streams import RandomStreams
+from config import Config, DEFAULT_CONFIG
+
+# Recording and replaying the random outcomes of a game
+# RecordingStreams plays a game normally and keeps every random outcome by stream, ReplayStreams gives the same outcomes back
+# in the same order. A replayed game repeats the recorded one exactly, also when the recorded game was not seeded,
+# so a game with an odd result can be played again under a profiler, or used as a reference for a different implementation
+
+class ReplayError(Exception):
+    pass
+
+class RecordingStream():
+    # Wraps a random number stream and records the outcome of every draw
+    def __init__(self, stream, log):
+        self.stream = stream
+        self.log = log
+
+    def random(self):
+        value = self.stream.random()
+        self.log.append(value)
+        return value
+
+    def choice(self, seq):
+        value = self.stream.choice(seq)
+        self.log.append(value)
+        return value
+
+    def choices(self, population, weights = None, *, cum_weights = None, k = 1):
+        values = self.stream.choices(population, weights, cum_weights=cum_weights, k=k)
+        self.log.append(values)
+        return values
+
+class RecordingStreams(RandomStreams):
+    def __init__(self, seed = None):
+        super().__init__(seed)
+        self.draws = defaultdict(list) # Outcomes of each (purpose, key) stream, in the order they were drawn
+        self.recording_streams = {}
+
+    def get(self, purpose, key = None):
+        stream = self.recording_streams.get((purpose, key))
+        if stream is None:
+            stream = RecordingStream(super().get(purpose, key), self.draws[(purpose, key)])
+            self.recording_streams[(purpose, key)] = stream
+        return stream
+
+    def save(self, path, **game):
+        """Save the recorded outcomes, with the settings needed to play the game again, e.g. num_agents and rounds."""
+        with open(path, 'wb') as file:
+            pickle.dump({"game": game, "draws": dict(self.draws)}, file)
+
+class ReplayStream():
+    # Gives back the recorded outcomes of one stream, and fails if the game asks for something that was not recorded
+    def __init__(self, name, draws):
+        self.name = name
+        self.draws = draws
+        self.position = 0
+
+    def next(self, method):
+        if self.position >= len(self.draws):
+            raise ReplayError(f"Stream {self.name} has no more recorded outcomes for {method}()")
+        value = self.draws[self.position]
+        self.position += 1
+        return value
+
+    def random(self):
+        value = self.next("random")
+        if not isinstance(value, float):
+            raise ReplayError(f"Stream {self.name} recorded {value!r} where random() was called")
+        return value
+
+    def choice(self, seq):
+        value = self.next("choice")
+        if value not in seq:
+            raise ReplayError(f"Stream {self.name} recorded {value!r}, which is not one of the options {list(seq)!r}")
+        return value
+
+    def choices(self, population, weights = None, *, cum_weights = None, k = 1):
+        values = self.next("choices")
+        if not isinstance(values, list) or len(values) != k or any(value not in population for value in values):
+            raise ReplayError(f"Stream {self.name} recorded {values!r}, which does not match choices() from {list(population)!r}")
+        return values
+
+class ReplayStreams():
+    def __init__(self, draws):
+        self.seed = None
+        self.streams = {stream: ReplayStream(stream, values) for stream, values in draws.items()}
+
+    def get(self, purpose, key = None):
+        stream = self.streams.get((purpose, key))
+        if stream is None:
+            stream = ReplayStream((purpose, key), [])
+            self.streams[(purpose, key)] = stream
+        return stream
+
+    def remaining(self):
+        """Number of recorded outcomes that were not used. A complete replay uses all of them."""
+        return sum(len(stream.draws) - stream.position for stream in self.streams.values())
+
+def load_recording(path):
+    # Returns the game settings and the streams that replay it
+    with open(path, 'rb') as file:
+        recording = pickle.load(file)
+    return recording["game"], ReplayStreams(recording["draws"])
+
+def play_game(udd, rounds):
+    from UDD import suppress_print
+
+    with udd:
+        udd.initialize_system()
+        with suppress_print():
+            for _ in range(rounds):
+                udd.step()
+    return udd.get_average_satisfactions()
+
+def record_game(path, num_agents, rounds, seed = None, config = DEFAULT_CONFIG, trace_path = None):
+    """Play a game, save its random outcomes to path and return the average satisfaction of each agent type."""
+    from UDD import UDD
+
+    streams = RecordingStreams(seed)
+    satisfactions = play_game(UDD(num_agents, seed, config, trace_path = trace_path, streams = streams), rounds)
+    streams.save(path, num_agents = num_agents, rounds = rounds, seed = seed, config = config.to_dict(), satisfactions = satisfactions)
+    return satisfactions
+
+def replay_game(path, trace_path = None):
+    """
+    Play a recorded game again and return the average satisfaction of each agent type.
+    Raises ReplayError if the game does not use the recorded outcomes exactly, or ends with different satisfactions.
+    """
+    from UDD import UDD
+
+    game, streams = load_recording(path)
+    udd = UDD(game["num_agents"], config = Config(**game["config"]), trace_path = trace_path, streams = streams)
+    satisfactions = play_game(udd, game["rounds"])
+
+    if streams.remaining():
+        raise ReplayError(f"The replay ended with {streams.remaining()} recorded outcomes left")
+    if satisfactions != game["satisfactions"]:
+        raise ReplayError(f"The replay ended with satisfactions {satisfactions}, the recorded game with {game['satisfactions']}")
+    return satisfactions
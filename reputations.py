@@ -1,49 +1,109 @@
+import numpy as np
+
+# Reports are appended to lists while the round is played, and added to preallocated count arrays in one vectorized pass
+# the first time the counts are read. Resetting only drops the pending reports and marks the arrays for zeroing, so it is O(1)
+class ReputationCounts():
+    def __init__(self, ids):
+        self.ids = list(ids)
+        self.index = {id: position for position, id in enumerate(self.ids)}
+        self.positive_counts = np.zeros(len(self.ids), dtype=np.int64)
+        self.total_counts = np.zeros(len(self.ids), dtype=np.int64)
+        self.pending = [] # Positions of the reported ids since the counts were last updated
+        self.pending_positive = [] # Whether each pending report was positive
+        self.stale = False # True if the counts still hold the values from before the last reset
+
+    def report(self, id, positive):
+        self.pending.append(self.index[id])
+        self.pending_positive.append(positive)
+
+    def report_many(self, ids, positive):
+        """Report several ids at once. positive is either one value for all of them, or one value per id."""
+        positions = [self.index[id] for id in ids]
+        self.pending.extend(positions)
+        if isinstance(positive, (bool, np.bool_)):
+            self.pending_positive.extend([positive] * len(positions))
+        else:
+            self.pending_positive.extend(positive)
+
+    def reset(self):
+        self.pending = []
+        self.pending_positive = []
+        self.stale = True
+
+    def counts(self):
+        # Returns the positive and total counts of every id, adding the pending reports first
+        if self.stale:
+            self.positive_counts.fill(0)
+            self.total_counts.fill(0)
+            self.stale = False
+
+        if self.pending:
+            size = len(self.ids)
+            self.total_counts += np.bincount(self.pending, minlength=size)
+            self.positive_counts += np.bincount(self.pending, weights=self.pending_positive, minlength=size).astype(np.int64)
+            self.pending = []
+            self.pending_positive = []
+
+        return self.positive_counts, self.total_counts
+
+    def reported(self):
+        # Positions of the ids that were reported on since the last reset
+        positive, total = self.counts()
+        return np.flatnonzero(total)
+
+    def percentages(self):
+        # Percentage of positive reports for every id, 0 for ids without reports
+        positive, total = self.counts()
+        return np.divide(positive, total, out=np.zeros(len(self.ids)), where=total > 0) * 100
+
+    def percentage(self, id):
+        positive, total = self.counts()
+        position = self.index.get(id)
+        if position is None or total[position] == 0:
+            return 0
+        return (positive[position] / total[position]) * 100
+
 # Agents reputation class
 # Not aggregated over time, but used to update trustworthiness
-class AgentsReputation():
-    def __init__(self):
-        self.records = {}  # Stores feedback for each agent
-    
+class AgentsReputation(ReputationCounts):
+    def __init__(self, agent_ids = ()):
+        # Stores feedback for each agent: how many agents had a successful meal with agent x and how many meals they had in total
+        super().__init__(agent_ids)
+
     def report_meal_success(self, agent_id, success):
         """Agents report whether their meal was successful with agent(agent_id) based on cost and price paid."""
+        self.report(agent_id, success)
 
-        if agent_id not in self.records:
-            self.records[agent_id] = {'success_count': 0, 'total_meals': 0}
-        
-        self.records[agent_id]['total_meals'] += 1
-        
-        if success:
-            self.records[agent_id]['success_count'] += 1
-
-        # Records now contain how many agents had a successful meal with agent x and how many meals they had in total
-    
     # Calculate the reputation of an agent, sent to the SCF
     def get_reputation(self, agent_id):
         """Calculate the percentage of successful meals for an agent."""
-        records = self.records.get(agent_id, {'success_count': 0, 'total_meals': 0})
-        if records['total_meals'] == 0:
-            return 0
-        return (records['success_count'] / records['total_meals']) * 100
-        
+        return self.percentage(agent_id)
+
+    def get_reputation_all(self):
+        """Percentage of successful meals for every agent, in the order of agent_ids."""
+        return self.percentages()
+
+    def get_reputation_reported(self):
+        """Ids and percentage of successful meals of the agents that were reported on since the last reset."""
+        positions = self.reported()
+        return [self.ids[position] for position in positions], self.percentages()[positions]
+
 
 # Institutional reputation class
 # Reputation is aggregated over time
-class InstitutionalReputation():
-    def __init__(self):
-        self.records = {}  # Stores rule following data for each institution
+class InstitutionalReputation(ReputationCounts):
+    def __init__(self, institution_ids = ()):
+        # Stores rule following data for each institution
+        super().__init__(institution_ids)
 
     def report_rule_compliance(self, institution_id, event):
         """Institutions report whether agents followed rules during a meal."""
-        if institution_id not in self.records:
-            self.records[institution_id] = {'compliance_count': 0, 'total_reports': 0}
-        
-        self.records[institution_id]['total_reports'] += 1
-        if event.type == "Cooperated":
-            self.records[institution_id]['compliance_count'] += 1
+        self.report(institution_id, event.type == "Cooperated")
 
     def get_reputation(self, institution_id):
         """Calculate the percentage of times rules were followed in an institution."""
-        records = self.records.get(institution_id, {'compliance_count': 0, 'total_reports': 0})
-        if records['total_reports'] == 0:
-            return 0
-        return (records['compliance_count'] / records['total_reports']) * 100
+        return self.percentage(institution_id)
+
+    def get_reputation_all(self):
+        """Percentage of times rules were followed for every institution, in the order of institution_ids."""
+        return self.percentages()
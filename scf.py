@@ -1,11 +1,13 @@
+import numpy as np
 from framework import SocialCapitalFramework
+from config import DEFAULT_CONFIG
 # Specific social capital framework for the UDD game
 # Includes the metrics and update functions for the social capital framework
 # Data structures are defined in the main simulation script
 
-def create_complete_scf():
+def create_complete_scf(config = DEFAULT_CONFIG):
     # Defining and setting up the Social Capital Framework
-    scf = SocialCapitalFramework()
+    scf = SocialCapitalFramework(config)
 
     # Add data structures
     scf.add_data_structure('social_networks', {})
@@ -16,6 +18,7 @@ def create_complete_scf():
     scf.add_update_function('social_networks', update_social_network)
     scf.add_update_function('trustworthiness', update_trustworthiness)
     scf.add_update_function('institutions', update_institutions)
+    scf.add_bulk_update_function('trustworthiness', update_trustworthiness_many)
 
     # Add metrics to evaluate the social capital
     scf.add_metric('social_networks', get_social_network_metrics)
@@ -42,13 +45,24 @@ def update_trustworthiness(current_data, event):
     current_data[event.agent_id] = updated_value
     return current_data
 
+def update_trustworthiness_many(current_data, agent_ids, values, weight):
+    # Same update as update_trustworthiness, for the reputation values of many agents at once
+    normalized_values = np.clip(np.asarray(values, dtype=float) / 100, 0, 1)
+    current_values = np.array([current_data.get(agent_id, np.nan) for agent_id in agent_ids], dtype=float)
+
+    # Agents without existing data take the normalized value, the others average it with their current value
+    updated_values = np.where(np.isnan(current_values), normalized_values, (current_values + normalized_values) / 2)
+
+    current_data.update(zip(agent_ids, updated_values.tolist()))
+    return current_data
+
 def update_social_network(current_data, event):
     agent1 = event.agent_id
     agent2 = event.agent2
     weight = event.weight
   
     # Get current score or default to 0
-    current_score = current_data[agent1][agent2]
+    current_score = current_data[agent1].get(agent2, 0)
    
     # Check if the event is enhancing or diminishing cooperation
     if event.type == "Cooperated":
@@ -87,9 +101,11 @@ def get_trustworthiness_metrics(scf, agent_id):
 
 def get_social_network_metrics(scf, agent_id):
     # Takes the graph saved in the data structure and calculates the average score of an agents connections
-    social_network = scf.data_structures["social_networks"][agent_id]
+    # Only the scores that were updated are stored, the others are 0, so the sum is divided by the number of agents
+    social_networks = scf.data_structures["social_networks"]
+    social_network = social_networks[agent_id]
     if not social_network:
         return 0
 
-    return sum(social_network.values()) / len(social_network)
+    return sum(social_network.values()) / len(social_networks)
 
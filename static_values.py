@@ -9,11 +9,22 @@ EXPEL_FROM_INSTITUTION_THRESHOLD = 0.7 # The social capital of the agent must be
 ADMIT_TO_INSTITUTION_THRESHOLD = 0.8  # The social capital of the agent must be higher than this value to be voted for admission
 
 NUM_AGENTS = [20, 20, 20] # Social, Dominant, Random, Used during building the model
+POPULATION_MIX = {"Social Agent": 1, "Dominant Agent": 1, "Random Agent": 1} # Share of each agent type in a game, by the names in agents.AGENT_TYPES
 NUM_INSTITUTIONS = 9
+# Whether the institution each agent starts in also lists the agent as a member, and so applies its rules to it and lets it vote
+# Off, the agent only counts the institution as its own until it joins it, as in the original model
+LIST_INITIAL_MEMBERSHIPS = False
 
 AGENT_REPUTATION_WEIGHT = 0.3
+# If True, only agents that were reported on during the round get their trustworthiness refreshed.
+# If False, every agent is refreshed, and agents without reports are averaged towards 0
+INCREMENTAL_TRUSTWORTHINESS = False
 INTITUTION_REPUTATION_WEIGHT = 0.3
 
+# Games end early once they are steady, see steady_state.py. A window of 0 rounds turns the detection off
+STEADY_STATE_WINDOW = 0
+STEADY_STATE_TOLERANCE = 0.05
+
 DECISION_INDICATOR_WEIGHTS = {
     "agents_reputation": 0.3,
     "institutional_reputation": 0.3,
@@ -0,0 +1,66 @@
+from collections import deque
+import numpy as np
+
+# Detection of games that have settled, so they can be ended early
+# A game is tracked through the values given for each round, such as the average satisfaction of each agent type, and
+# the share of agent and institution pairs that are memberships. The game is taken as steady once, over the last
+# `window` rounds, the means of the first and the second half of every tracked value are shown to differ by less than
+# `tolerance`: the difference plus z standard errors must be below it. The standard errors are found from the means of
+# batches of rounds, since the satisfaction of a round averages the last ten rounds and so follows the rounds before it.
+# This is a statistical judgement, not a proof: the agents keep drawing random numbers, so a steady game keeps
+# fluctuating around the same values. The rest of a steady game is filled in with the means of the window.
+# Detection is off unless Config.steady_state_window is set, since filled in games differ from fully played ones.
+
+class SteadyStateDetector():
+    def __init__(self, window = 100, tolerance = 0.05, z = 2.0, batch = 10):
+        self.window = window
+        self.tolerance = tolerance
+        self.z = z
+        self.batch = max(1, min(batch, window // 4)) # Each half of the window needs at least two batches
+        self.keys = None # Names of the tracked values, such as the agent types
+        self.values = deque(maxlen=window) # Tracked values of the last rounds, followed by the membership share
+
+    def add_round(self, system, values):
+        """Adds the tracked values of a round, a dictionary such as the average satisfaction of each agent type. Returns True if the game is steady."""
+        if self.keys is None:
+            self.keys = list(values.keys())
+        self.values.append([values[key] for key in self.keys] + [system.membership.matrix.mean()])
+        return self.is_steady()
+
+    def is_steady(self):
+        if len(self.values) < self.window:
+            return False
+        values = np.array(self.values)
+        half = self.window // 2
+        first, second = values[:half], values[half:half * 2]
+        difference = np.abs(first.mean(axis=0) - second.mean(axis=0))
+        standard_error = np.sqrt(self.batch_variance(first) + self.batch_variance(second))
+        return bool(np.all(difference + self.z * standard_error < self.tolerance))
+
+    def batch_variance(self, values):
+        # Variance of the mean of values, from the means of its batches
+        batches = len(values) // self.batch
+        batch_means = values[:batches * self.batch].reshape(batches, self.batch, -1).mean(axis=1)
+        return batch_means.var(axis=0, ddof=1) / batches
+
+    def steady_values(self):
+        """Means of the tracked values over the window, the values the rest of a steady game is filled in with."""
+        return dict(zip(self.keys, np.array(self.values)[:, :len(self.keys)].mean(axis=0).tolist()))
+
+    def breakpoint_out_of_reach(self, leader = "Social Agent"):
+        """
+        True if the leader's value stayed below the best other value through the whole window, by more than the tolerance
+        on average. Used with the values of UDD.breakpoint_satisfactions, for a steady game this means the breakpoint is not reached.
+        """
+        if leader not in self.keys or len(self.keys) < 2:
+            return False
+        values = np.array(self.values)[:, :len(self.keys)]
+        position = self.keys.index(leader)
+        gaps = values[:, position] - np.delete(values, position, axis=1).max(axis=1)
+        return bool(np.all(gaps < 0) and gaps.mean() < -self.tolerance)
+
+def steady_state_detector(config):
+    # Detector for a game with this configuration, or None if detection is off
+    if config.steady_state_window <= 0:
+        return None
+    return SteadyStateDetector(config.steady_state_window, config.steady_state_tolerance)
@@ -0,0 +1,25 @@
+import random
+
+# Random number streams for the simulation
+# Every stochastic choice asks for a stream by purpose ("decide", "vote", "report", ...) and a key (usually the agent),
+# so that games with the same seed draw the same numbers for the same decisions, regardless of population size
+class RandomStreams():
+    def __init__(self, seed = None):
+        self.seed = seed
+        self.streams = {}
+
+    def get(self, purpose, key = None):
+        """
+        Return the random number stream for a purpose and key.
+        Without a seed every stream is the global random module, which keeps the unseeded behaviour of the game.
+        """
+        if self.seed is None:
+            return random
+
+        stream = self.streams.get((purpose, key))
+        if stream is None:
+            # String seeds are hashed deterministically, so the streams are the same across processes
+            stream = random.Random(f"{self.seed!r}:{purpose}:{key!r}")
+            self.streams[(purpose, key)] = stream
+
+        return stream
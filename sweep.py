@@ -0,0 +1,133 @@
+import itertools
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from config import DEFAULT_CONFIG
+from profiling import start_profiling
+from UDD import game_seed, breakpoint_game_seed, play_satisfaction_job, play_breakpoint_job
+
+# Parameter sweeps over the configuration
+# A parameter point is a dictionary of Config fields to values, for example {"cooperation_threshold": 0.4}.
+# Entries of the weight dictionaries are set with a dot, for example {"decision_indicator_weights.social_networks": 0.5}.
+# Every (parameter point, experiment, population size, game) is a separate job, and the jobs are spread over worker processes
+
+# Fields that only take whole numbers, values sampled for them are rounded
+INTEGER_PARAMETERS = {"num_institutions", "rule_violation_threshold"}
+
+def grid(**axes):
+    """
+    Every combination of the given parameter values.
+    Example: grid(cooperation_threshold=[0.3, 0.5], num_institutions=[3, 9]) gives four parameter points.
+    Dotted names are passed as a dictionary: grid(**{"decision_indicator_weights.institution": [0.1, 0.4]})
+    """
+    names = list(axes.keys())
+    return [dict(zip(names, values)) for values in itertools.product(*axes.values())]
+
+def latin_hypercube(samples, bounds, seed = None):
+    """
+    Latin hypercube sample of parameter points.
+    bounds maps each parameter to a (low, high) tuple. Every parameter's range is split into samples equal strata,
+    and each stratum is used exactly once.
+    """
+    rng = random.Random(seed)
+    columns = {}
+    for name, (low, high) in bounds.items():
+        strata = list(range(samples))
+        rng.shuffle(strata)
+        values = [low + (stratum + rng.random()) / samples * (high - low) for stratum in strata]
+        if name in INTEGER_PARAMETERS:
+            values = [int(round(value)) for value in values]
+        columns[name] = values
+
+    return [{name: values[i] for name, values in columns.items()} for i in range(samples)]
+
+def apply_point(config, point):
+    """Return a copy of config with the values of the parameter point."""
+    changes = {}
+    for name, value in point.items():
+        if "." in name:
+            field_name, key = name.split(".", 1)
+            weights = dict(changes.get(field_name, getattr(config, field_name)))
+            if key not in weights:
+                raise KeyError(f"{field_name} has no entry {key}")
+            weights[key] = value
+            changes[field_name] = weights
+        else:
+            if not hasattr(config, name):
+                raise KeyError(f"Config has no field {name}")
+            changes[name] = value
+
+    return config.replace(**changes)
+
+def sweep_jobs(points, sizes, games, experiments, base_seed):
+    # Games with the same index and population size get the same seed at every parameter point,
+    # so differences between points are not hidden by the noise between games
+    jobs = []
+    for point_index, point in enumerate(points):
+        for experiment in experiments:
+            for num_agents in sizes:
+                for game in range(games):
+                    if experiment == "satisfaction":
+                        seed = game_seed(base_seed, game, "satisfaction", num_agents)
+                    else:
+                        seed = breakpoint_game_seed(base_seed, game, num_agents, False)
+                    jobs.append((point_index, point, experiment, num_agents, game, seed))
+    return jobs
+
+def run_sweep_job(job, config, rounds, max_rounds, cache):
+    # Plays one job and returns its rows for the results table
+    point_index, point, experiment, num_agents, game, seed = job
+    point_config = apply_point(config, point)
+    row = {"point": point_index, **point, "game": game, "num_agents": num_agents}
+
+    if experiment == "satisfaction":
+        result = play_satisfaction_job(cache, num_agents, rounds, seed, point_config)
+        return "satisfaction", [
+            {**row, "round": round_num, "agent_type": agent_type, "satisfaction": value}
+            for round_num, averages in result["rounds"]
+            for agent_type, value in averages.items()
+        ]
+
+    breakpoint = play_breakpoint_job(cache, num_agents, max_rounds, seed, point_config)
+    return "breakpoints", [{**row, "breakpoint": breakpoint, "reached": breakpoint < max_rounds}]
+
+def run_sweep(points, sizes = (60,), games = 10, rounds = 100, max_rounds = 1000, experiments = ("satisfaction", "breakpoint"),
+              workers = None, base_seed = 0, config = DEFAULT_CONFIG, cache = None, profile_dir = None, profile_every = 10):
+    """
+    Play every experiment for every parameter point, population size and game, spread over worker processes.
+
+    Returns a dictionary with two tidy tables:
+    - "satisfaction": one row per point, game, population size, recorded round and agent type
+    - "breakpoints": one row per point, game and population size
+    Both tables have a column for each swept parameter.
+    With profile_dir, the workers profile one in every profile_every games they play, see profiling.py.
+    """
+    # Imported here so worker processes do not pay for importing pandas
+    import pandas as pd
+
+    start_time = time.time()
+
+    jobs = sweep_jobs(points, sizes, games, experiments, base_seed)
+    workers = workers or os.cpu_count()
+    # Hand out jobs in chunks, so sweeps with many short jobs do not spend their time on inter-process communication
+    chunksize = max(1, len(jobs) // (workers * 4))
+
+    rows = {"satisfaction": [], "breakpoints": []}
+    with ProcessPoolExecutor(max_workers=workers, initializer=start_profiling, initargs=(profile_dir, profile_every)) as executor:
+        results = executor.map(run_sweep_job, jobs, itertools.repeat(config), itertools.repeat(rounds),
+                               itertools.repeat(max_rounds), itertools.repeat(cache), chunksize=chunksize)
+        for done, (table, job_rows) in enumerate(results, start=1):
+            rows[table].extend(job_rows)
+            if done % max(1, len(jobs) // 20) == 0:
+                print(f"{done}/{len(jobs)} sweep jobs done - {time.time() - start_time} seconds")
+
+    print(f"run_sweep() took {time.time() - start_time} seconds for {len(points)} parameter points and {len(jobs)} jobs")
+
+    return {table: pd.DataFrame(table_rows) for table, table_rows in rows.items()}
+
+def save_sweep(results, directory):
+    # Writes each table of a sweep to its own csv file
+    os.makedirs(directory, exist_ok=True)
+    for table, frame in results.items():
+        frame.to_csv(os.path.join(directory, f"{table}.csv"), index=False)
@@ -0,0 +1,24 @@
+import unittest
+from aggregates import TypeAggregates
+from UDD import UDD, suppress_print
+
+class TypeAggregatesTest(unittest.TestCase):
+    def test_aggregates_match_sums_over_the_agents(self):
+        game = UDD(num_agents = 60, seed = 3)
+        with suppress_print():
+            game.initialize_system()
+            aggregates = TypeAggregates().attach(game.system)
+            for _ in range(40):
+                game.step()
+
+        system = game.system
+        scf = next(iter(system.agents.values())).scf
+        social_capital = aggregates.social_capital()
+        for type_name, agents in system.agents_by_type.items():
+            self.assertAlmostEqual(social_capital[type_name], sum(agent.get_social_capital(scf) for agent in agents))
+        average_satisfactions = aggregates.average_satisfactions()
+        for type_name, value in game.get_average_satisfactions().items():
+            self.assertAlmostEqual(average_satisfactions[type_name], value)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,71 @@
+import unittest
+from collections import Counter
+from unittest import mock
+import UDD
+from UDD import BreakpointEstimate, play_breakpoints_adaptive, suppress_print
+
+class BreakpointEstimateTest(unittest.TestCase):
+    def test_mean_and_variance(self):
+        estimate = BreakpointEstimate()
+        for breakpoint in [100, 120, 90, 110, 105]:
+            estimate.add(breakpoint)
+        self.assertAlmostEqual(estimate.mean, 105)
+        self.assertAlmostEqual(estimate.variance(), 125)
+
+    def test_needs_two_games(self):
+        estimate = BreakpointEstimate()
+        estimate.add(5)
+        self.assertEqual(estimate.ci_width(), float('inf'))
+        self.assertFalse(estimate.is_resolved(50, 1))
+
+    def test_equal_games_are_not_resolved_early(self):
+        # Games that all reach the breakpoint at round 0, or all never reach it, keep a floor on their variance
+        for breakpoint in (0, 1000):
+            estimate = BreakpointEstimate(spread = 1000)
+            for _ in range(50):
+                estimate.add(breakpoint)
+            self.assertGreater(estimate.ci_width(), 50)
+            self.assertFalse(estimate.is_resolved(50, 5))
+
+    def test_floor_shrinks_with_more_games(self):
+        estimate = BreakpointEstimate(spread = 1000)
+        for _ in range(200):
+            estimate.add(0)
+        self.assertTrue(estimate.is_resolved(50, 5))
+
+    def test_spread_games_use_their_own_variance(self):
+        estimate = BreakpointEstimate(spread = 1000)
+        for breakpoint in [100, 120, 90, 110, 105] * 2:
+            estimate.add(breakpoint)
+        self.assertTrue(estimate.is_resolved(50, 5))
+
+class AdaptiveBreakpointsTest(unittest.TestCase):
+    def play(self, breakpoint_of_size, **kwargs):
+        # Plays the adaptive driver with breakpoint_of_size in place of the games, and counts the games of each size
+        games = Counter()
+        def play_breakpoint_job(cache, num_agents, max_rounds, seed, config):
+            games[num_agents] += 1
+            return breakpoint_of_size(num_agents, games[num_agents])
+        with mock.patch.object(UDD, "play_breakpoint_job", play_breakpoint_job), suppress_print():
+            means = play_breakpoints_adaptive(None, **kwargs)
+        return means, games
+
+    def test_sizes_that_never_break_stop_before_max_games(self):
+        means, games = self.play(lambda num_agents, game: 1000, precision = 50, min_games = 5, max_games = 50)
+        self.assertEqual(set(means.values()), {1000})
+        self.assertGreaterEqual(min(games.values()), 5)
+        self.assertLess(max(games.values()), 50)
+
+    def test_unanimous_sizes_need_more_games_with_a_wider_spread(self):
+        _, narrow = self.play(lambda num_agents, game: 1000, unanimous_spread = 2)
+        _, wide = self.play(lambda num_agents, game: 1000, unanimous_spread = 8)
+        self.assertLess(narrow[15], wide[15])
+
+    def test_spread_sizes_sample_until_precise(self):
+        # Breakpoints alternating between 0 and 200 have a standard deviation of about 100, which needs about 60 games
+        # for an interval of 50 rounds
+        _, games = self.play(lambda num_agents, game: 200 * (game % 2), precision = 50, max_games = 50)
+        self.assertEqual(set(games.values()), {50})
+
+if __name__ == "__main__":
+    unittest.main()
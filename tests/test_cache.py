@@ -0,0 +1,107 @@
+import ast
+import os
+import tempfile
+import unittest
+from cache import CODE_FILES, ResultCache
+from UDD import play_satisfaction_job
+
+PACKAGE_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def imported_modules(file):
+    # Names of the modules a source file imports, at any depth of the file
+    with open(os.path.join(PACKAGE_DIRECTORY, file), 'r') as source:
+        tree = ast.parse(source.read())
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            yield from (alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            yield node.module
+
+class CodeVersionTest(unittest.TestCase):
+    def test_code_files_cover_the_modules_a_game_imports(self):
+        # Every module of this package that a game imports, directly or through other modules, changes the code version
+        files = set()
+        pending = ["MAS.py", "UDD.py", "agents.py"]
+        while pending:
+            file = pending.pop()
+            if file in files:
+                continue
+            files.add(file)
+            for module in imported_modules(file):
+                module_file = module.split(".")[0] + ".py"
+                if os.path.exists(os.path.join(PACKAGE_DIRECTORY, module_file)):
+                    pending.append(module_file)
+        self.assertEqual(files - set(CODE_FILES), set())
+
+class ResultCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.cache = ResultCache(self.directory.name)
+        self.calls = []
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def play(self, value, seed = None):
+        self.calls.append((value, seed))
+        return {"value": value, "seed": seed}
+
+    def test_hit_after_miss(self):
+        first = self.cache.run({"value": 1}, 7, self.play, 1)
+        second = self.cache.run({"value": 1}, 7, self.play, 1)
+        self.assertEqual(first, second)
+        self.assertEqual(self.calls, [(1, 7)])
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+
+    def test_other_job_or_seed_misses(self):
+        self.cache.run({"value": 1}, 7, self.play, 1)
+        self.cache.run({"value": 2}, 7, self.play, 2)
+        self.cache.run({"value": 1}, 8, self.play, 1)
+        self.assertEqual(self.calls, [(1, 7), (2, 7), (1, 8)])
+        self.assertEqual((self.cache.hits, self.cache.misses), (0, 3))
+
+    def test_games_without_seed_are_always_played(self):
+        self.cache.run({"value": 1}, None, self.play, 1)
+        self.cache.run({"value": 1}, None, self.play, 1)
+        self.assertEqual(len(self.calls), 2)
+        self.assertEqual(list(self.cache.entries()), [])
+
+    def test_results_are_shared_between_caches_of_the_same_directory(self):
+        self.cache.run({"value": 1}, 7, self.play, 1)
+        other = ResultCache(self.directory.name)
+        self.assertEqual(other.run({"value": 1}, 7, self.play, 1), {"value": 1, "seed": 7})
+        self.assertEqual((other.hits, len(self.calls)), (1, 1))
+
+    def test_other_code_version_misses_and_is_invalidated(self):
+        self.cache.run({"value": 1}, 7, self.play, 1)
+        changed = ResultCache(self.directory.name)
+        changed.code_version = "changed"
+        changed.run({"value": 1}, 7, self.play, 1)
+        self.assertEqual(len(self.calls), 2)
+
+        # The entry of the current code version is kept, the other one is removed
+        self.assertEqual(self.cache.invalidate(), 1)
+        self.assertEqual(len(list(self.cache.entries())), 1)
+        self.cache.run({"value": 1}, 7, self.play, 1)
+        self.assertEqual(len(self.calls), 2)
+
+    def test_least_recently_used_entries_are_evicted(self):
+        self.cache.run({"value": 0}, 0, self.play, 0)
+        entry_bytes = self.cache.total_bytes
+        self.cache.max_bytes = 2 * entry_bytes + entry_bytes // 2
+        for value in range(1, 3):
+            path = self.cache.path(self.cache.key({"value": value - 1}, value - 1))
+            os.utime(path, (value, value)) # Entries written earlier are older
+            self.cache.run({"value": value}, value, self.play, value)
+        self.assertEqual(len(list(self.cache.entries())), 2)
+        self.assertIsNone(self.cache.get(self.cache.key({"value": 0}, 0)))
+        self.assertLessEqual(self.cache.total_bytes, self.cache.max_bytes)
+
+    def test_cached_game_gives_the_played_result(self):
+        played = play_satisfaction_job(None, 15, 4, 3)
+        self.assertEqual(play_satisfaction_job(self.cache, 15, 4, 3), played)
+        self.assertEqual(play_satisfaction_job(self.cache, 15, 4, 3), played)
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+
+if __name__ == "__main__":
+    unittest.main()
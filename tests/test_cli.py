@@ -0,0 +1,40 @@
+import argparse
+import unittest
+from cli import load_config, parse_value, parse_values
+
+class ParseValueTest(unittest.TestCase):
+    def test_booleans(self):
+        for text in ("true", "True", "yes", "on", "1"):
+            self.assertIs(parse_value("incremental_trustworthiness", text), True)
+        for text in ("false", "False", "no", "off", "0"):
+            self.assertIs(parse_value("incremental_trustworthiness", text), False)
+        with self.assertRaises(argparse.ArgumentTypeError):
+            parse_value("incremental_trustworthiness", "maybe")
+
+    def test_numbers_take_the_type_of_the_field(self):
+        self.assertEqual(parse_value("steady_state_window", "100"), 100)
+        self.assertIsInstance(parse_value("cooperation_threshold", "1"), float)
+        with self.assertRaises(argparse.ArgumentTypeError):
+            parse_value("num_institutions", "2.5")
+
+    def test_dictionary_entries(self):
+        self.assertEqual(parse_value("decision_indicator_weights.institution", "0.2"), 0.2)
+        with self.assertRaises(argparse.ArgumentTypeError):
+            parse_value("decision_indicator_weights.unknown", "0.2")
+        with self.assertRaises(argparse.ArgumentTypeError):
+            parse_value("decision_indicator_weights", "0.2")
+
+    def test_unknown_field(self):
+        with self.assertRaises(argparse.ArgumentTypeError):
+            parse_value("no_such_field", "1")
+
+    def test_sweep_values(self):
+        self.assertEqual(parse_values("cooperation_threshold", "0.3,0.5"), [0.3, 0.5])
+
+    def test_load_config(self):
+        config = load_config(["incremental_trustworthiness=false", "num_institutions=12"])
+        self.assertIs(config.incremental_trustworthiness, False)
+        self.assertEqual(config.num_institutions, 12)
+
+if __name__ == "__main__":
+    unittest.main()
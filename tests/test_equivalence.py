@@ -0,0 +1,46 @@
+import unittest
+import numpy as np
+from equivalence import EquivalenceError, check_equivalence, ks_test
+from UDD import UDD, suppress_print
+
+# Small games, a run of the harness takes well under a second
+SIZES = (20,)
+GAMES = 8
+ROUNDS = 20
+
+def biased_engine(num_agents, seed, config):
+    # The reference model with expensive meals three times the price, which the harness should tell apart
+    return UDD(num_agents = num_agents, seed = seed, config = config.replace(expensive_price = config.expensive_price * 3))
+
+class KolmogorovSmirnovTest(unittest.TestCase):
+    def test_same_distribution_is_not_significant(self):
+        rng = np.random.default_rng(0)
+        statistic, pvalue = ks_test(rng.normal(size=1000), rng.normal(size=1000))
+        self.assertLess(statistic, 0.1)
+        self.assertGreater(pvalue, 0.05)
+
+    def test_shifted_distribution_is_significant(self):
+        rng = np.random.default_rng(0)
+        # The largest distance between the distribution functions of N(0, 1) and N(0.5, 1) is about 0.2
+        statistic, pvalue = ks_test(rng.normal(size=1000), rng.normal(loc=0.5, size=1000))
+        self.assertGreater(statistic, 0.1)
+        self.assertLess(pvalue, 1e-6)
+
+    def test_disjoint_samples(self):
+        statistic, pvalue = ks_test(np.zeros(10), np.ones(10))
+        self.assertEqual(statistic, 1.0)
+        self.assertLess(pvalue, 1e-3)
+
+class CheckEquivalenceTest(unittest.TestCase):
+    def test_reference_is_equivalent_to_itself(self):
+        with suppress_print():
+            tests = check_equivalence(UDD, sizes = SIZES, games = GAMES, rounds = ROUNDS)
+        self.assertTrue(tests)
+        self.assertTrue(all(test["corrected_pvalue"] >= 0.05 for test in tests))
+
+    def test_biased_engine_raises(self):
+        with suppress_print(), self.assertRaises(EquivalenceError):
+            check_equivalence(biased_engine, sizes = SIZES, games = GAMES, rounds = ROUNDS)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,40 @@
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+from event_trace import CHOICE, JOINED, load_trace
+from UDD import UDD, play_satisfaction_game
+
+class EventTraceTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "game.trace")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_trace_of_a_game(self):
+        play_satisfaction_game(30, 10, seed = 1, trace_path = self.path)
+        records, metadata = load_trace(self.path)
+        self.assertEqual(len(metadata["agent_ids"]), 30)
+        self.assertTrue(np.all(records["kind"][:30] == JOINED)) # The setup memberships come first
+        self.assertEqual(int(np.sum(records["kind"] == CHOICE)), 30 * 10)
+        self.assertEqual(int(records["round"].max()), 9)
+
+    def test_trace_is_closed_when_the_game_raises(self):
+        recorders = []
+        class FailingGame(UDD):
+            def step(self):
+                recorders.append(self.trace)
+                raise RuntimeError("failed round")
+
+        with self.assertRaises(RuntimeError):
+            with FailingGame(num_agents = 15, seed = 1, trace_path = self.path) as game:
+                game.initialize_system()
+                game.step()
+        self.assertTrue(recorders[0].file.closed)
+        self.assertIsNone(game.trace)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,75 @@
+import math
+import random
+import unittest
+from config import DEFAULT_CONFIG
+from institution_index import FenwickTree
+from UDD import UDD, suppress_print
+
+def played_game(num_agents = 60, num_institutions = 40, rounds = 20, seed = 3):
+    game = UDD(num_agents = num_agents, seed = seed, config = DEFAULT_CONFIG.replace(num_institutions = num_institutions))
+    with suppress_print():
+        game.initialize_system()
+        for _ in range(rounds):
+            game.step()
+    return game.system
+
+class FenwickTreeTest(unittest.TestCase):
+    def test_prefix_sums_and_find_after_updates(self):
+        rng = random.Random(0)
+        weights = [rng.random() for _ in range(37)]
+        tree = FenwickTree(weights)
+        for _ in range(100): # More updates than weights, so the tree is also rebuilt
+            index = rng.randrange(len(weights))
+            weights[index] = rng.random()
+            tree.set(index, weights[index])
+        for end in range(len(weights) + 1):
+            self.assertAlmostEqual(tree.prefix_sum(end), sum(weights[:end]))
+
+        excluded = [3, 4, 20]
+        excluded_sums = [0.0, weights[3], weights[3] + weights[4], weights[3] + weights[4] + weights[20]]
+        kept = [index for index in range(len(weights)) if index not in excluded]
+        for _ in range(200):
+            target = rng.random() * sum(weights[index] for index in kept)
+            running = 0.0
+            for expected in kept:
+                running += weights[expected]
+                if running > target:
+                    break
+            self.assertEqual(tree.find(target, excluded, excluded_sums), expected)
+
+class InstitutionCapitalIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.system = played_game()
+        self.index = self.system.institution_index
+        self.capital = next(iter(self.system.agents.values())).scf.data_structures['institutions']
+
+    def test_capital_follows_the_scf(self):
+        for position, institution_id in enumerate(self.system.membership.institution_ids):
+            self.assertEqual(self.index.capital[position], self.capital[institution_id])
+
+    def test_best_member_is_the_first_highest_in_sorted_order(self):
+        for agent in self.system.agents.values():
+            best, highest = None, -float('inf')
+            for institution_id in sorted(agent.institutions):
+                if self.capital[institution_id] > highest:
+                    best, highest = institution_id, self.capital[institution_id]
+            self.assertEqual(self.index.best_member(agent.agent_id), best)
+
+    def test_member_capital_adds_in_join_order(self):
+        for agent in self.system.agents.values():
+            total = 0
+            for institution_id in agent.institutions:
+                total += self.capital[institution_id]
+            self.assertEqual(self.index.member_capital(agent.agent_id), total)
+
+    def test_sample_join_matches_random_choices(self):
+        for agent in list(self.system.agents.values())[:20]:
+            candidates = [institution_id for institution_id in self.system.institutions if institution_id not in agent.institutions]
+            exponentials = [math.exp(self.capital[institution_id]) for institution_id in candidates]
+            probabilities = [exponential / sum(exponentials) for exponential in exponentials]
+            index_rng, reference_rng = random.Random(agent.agent_id), random.Random(agent.agent_id)
+            for _ in range(20):
+                self.assertEqual(self.index.sample_join(agent.agent_id, index_rng), reference_rng.choices(candidates, weights=probabilities)[0])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,82 @@
+import os
+import tempfile
+import unittest
+from config import DEFAULT_CONFIG
+from jobqueue import JobQueue, collect_results, submit_sweep, work
+from sweep import run_sweep_job, sweep_jobs
+from UDD import suppress_print
+
+class JobQueueTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "jobs.sqlite")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def queue(self, **kwargs):
+        queue = JobQueue(self.path, **kwargs)
+        self.addCleanup(queue.close)
+        return queue
+
+    def test_jobs_are_leased_once_in_order(self):
+        queue = self.queue()
+        queue.submit([{"n": 1}, {"n": 2}])
+        other = self.queue() # Another worker with its own connection
+        first, second = queue.claim("a"), other.claim("b")
+        self.assertEqual((first[1], second[1]), ({"n": 1}, {"n": 2}))
+        self.assertIsNone(queue.claim("c"))
+        self.assertEqual(queue.counts(), {"running": 2})
+
+        queue.complete(first[0], "a", {"result": 1})
+        self.assertEqual(queue.results(), [({"n": 1}, {"result": 1})])
+
+    def test_expired_lease_goes_to_another_worker(self):
+        queue = self.queue(lease_seconds = -1) # Every lease has expired by the time anyone looks
+        queue.submit([{"n": 1}])
+        job_id, _ = queue.claim("a")
+        self.assertEqual(queue.claim("b"), (job_id, {"n": 1}))
+
+        # The worker that lost the lease can no longer complete the job
+        queue.complete(job_id, "a", {"by": "a"})
+        self.assertEqual(queue.results(), [])
+        queue.complete(job_id, "b", {"by": "b"})
+        self.assertEqual(queue.results(), [({"n": 1}, {"by": "b"})])
+
+    def test_expired_job_is_given_up_after_max_attempts(self):
+        queue = self.queue(lease_seconds = -1, max_attempts = 2)
+        queue.submit([{"n": 1}])
+        self.assertIsNotNone(queue.claim("a"))
+        self.assertIsNotNone(queue.claim("b"))
+        self.assertIsNone(queue.claim("c"))
+        self.assertEqual(queue.counts(), {"failed": 1})
+
+    def test_failed_job_is_retried_until_max_attempts(self):
+        queue = self.queue(max_attempts = 2)
+        queue.submit([{"n": 1}])
+        job_id, _ = queue.claim("a")
+        queue.fail(job_id, "a", "first")
+        self.assertEqual(queue.counts(), {"pending": 1})
+        job_id, _ = queue.claim("b")
+        queue.fail(job_id, "b", "second")
+        self.assertEqual(queue.counts(), {"failed": 1})
+        self.assertIsNone(queue.claim("c"))
+
+    def test_work_plays_the_sweep_jobs(self):
+        queue = self.queue()
+        points = [{"num_institutions": 3}]
+        self.assertEqual(submit_sweep(queue, points, sizes = (15,), games = 2, rounds = 4, max_rounds = 20), 4)
+        with suppress_print():
+            self.assertEqual(work(queue, worker = "a", poll_seconds = 0), 4)
+            expected = {"satisfaction": [], "breakpoints": []}
+            for job in sweep_jobs(points, (15,), 2, ("satisfaction", "breakpoint"), 0):
+                table, rows = run_sweep_job(job, DEFAULT_CONFIG, 4, 20, None)
+                expected[table].extend(rows)
+
+        self.assertEqual(queue.counts(), {"done": 4})
+        results = collect_results(queue)
+        for table, rows in expected.items():
+            self.assertEqual(results[table].to_dict("records"), rows)
+
+if __name__ == "__main__":
+    unittest.main()
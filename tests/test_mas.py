@@ -0,0 +1,65 @@
+import unittest
+from events import Event
+from MAS import dine
+from UDD import UDD, suppress_print
+
+def per_institution_rules(system, choices):
+    # The rule stage as each institution applied it to its own dinner group before apply_institution_rules, kept as the
+    # reference the system-wide stage is checked against
+    for institution_id, agents_in_group in system.games.items():
+        institution = system.institutions[institution_id]
+        for agent_id in agents_in_group:
+            if agent_id not in institution.members: # Only choices made by members count
+                continue
+            meal_choice = choices[agent_id]
+            if institution.rules['compulsory_cooperation'] and meal_choice == "expensive":
+                if institution.rules['sanctions']:
+                    if not institution.rules['graduated_sanctions']:
+                        institution.violations[agent_id] += 1
+                    institution.events.append(Event("Sanctioned", system.config.institution_event_weights["Sanctioned"], agent_id))
+                else:
+                    institution.events.append(Event("Not Sanctioned", system.config.institution_event_weights["Not Sanctioned"], agent_id))
+            cooperation = "Cooperated" if meal_choice == "inexpensive" else "Not Cooperated"
+            institution.events.append(Event(cooperation, system.config.agent_event_weights[cooperation], agent_id))
+
+def game_state(system):
+    institutions = {institution_id: (set(institution.members), dict(institution.violations),
+                                     [(event.type, event.weight, event.agent_id) for event in institution.events])
+                    for institution_id, institution in system.institutions.items()}
+    reputations = {name: source.get_reputation_all().tolist() for name, source in system.reputation_sources.items()}
+    return institutions, reputations
+
+class DineTest(unittest.TestCase):
+    def test_bill_is_shared_evenly(self):
+        bill_total, individually_spent = dine(["expensive", "inexpensive", "inexpensive"], 30, 10)
+        self.assertEqual(bill_total, 50)
+        self.assertAlmostEqual(individually_spent, 50 / 3)
+
+    def test_empty_group_pays_nothing(self):
+        self.assertEqual(dine([], 30, 10), (0, 0))
+
+class InstitutionRulesTest(unittest.TestCase):
+    def test_system_wide_rules_match_per_institution_rules(self):
+        games = []
+        for per_institution in (False, True):
+            game = UDD(num_agents = 60, seed = 1)
+            with suppress_print():
+                game.initialize_system()
+            if per_institution:
+                game.system.apply_institution_rules = lambda choices, system=game.system: per_institution_rules(system, choices)
+            games.append(game)
+
+        events, sanctions = 0, 0
+        for round_num in range(40):
+            with suppress_print():
+                for game in games:
+                    game.step()
+            vectorized, reference = (game_state(game.system) for game in games)
+            self.assertEqual(vectorized, reference, f"round {round_num}")
+            events += sum(len(institution[2]) for institution in reference[0].values())
+            sanctions += sum(event[0] == "Sanctioned" for institution in reference[0].values() for event in institution[2])
+        self.assertGreater(events, 0)
+        self.assertGreater(sanctions, 0)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,66 @@
+import unittest
+import numpy as np
+from config import DEFAULT_CONFIG
+from membership import MembershipIndex
+from UDD import UDD
+
+class MembershipIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.index = MembershipIndex(["a", "b"], ["i0", "i1"])
+        self.institution = self.index.institution_view("i0")
+        self.agent = self.index.agent_view("a")
+
+    def test_both_views_see_a_listed_membership(self):
+        self.institution.add("a")
+        self.assertIn("a", self.institution)
+        self.assertIn("i0", self.agent)
+        self.assertEqual(self.index.members_of("i0"), ["a"])
+        self.assertTrue(self.index.matrix[0, 0])
+
+    def test_membership_added_by_the_agent_is_unlisted(self):
+        self.agent.add("i0")
+        self.assertIn("i0", self.agent)
+        self.assertNotIn("a", self.institution)
+        self.assertEqual(len(self.institution), 0)
+        self.assertFalse(self.index.listed(np.array([0]), np.array([0]))[0])
+
+    def test_joining_through_the_institution_lists_it(self):
+        self.agent.add("i0")
+        self.institution.add("a")
+        self.assertIn("a", self.institution)
+        self.assertTrue(self.index.listed(np.array([0]), np.array([0]))[0])
+
+    def test_removal_clears_both_sides(self):
+        self.agent.add("i0")
+        self.institution.discard("a")
+        self.assertNotIn("i0", self.agent)
+        self.assertFalse(self.index.matrix[0, 0])
+        self.assertFalse(self.index.unlisted[0, 0])
+
+    def test_empty_copy(self):
+        self.agent.add("i0")
+        copy = self.index.empty_copy()
+        self.assertFalse(copy.matrix.any() or copy.unlisted.any())
+        self.assertIs(copy.agent_index, self.index.agent_index)
+
+class InitialMembershipTest(unittest.TestCase):
+    def setup_game(self, config):
+        game = UDD(num_agents = 30, seed = 1, config = config)
+        game.initialize_system()
+        return game.system
+
+    def test_setup_memberships_are_only_the_agents(self):
+        system = self.setup_game(DEFAULT_CONFIG)
+        for agent in system.agents.values():
+            self.assertEqual(len(agent.institutions), 1)
+        self.assertEqual(sum(len(institution.members) for institution in system.institutions.values()), 0)
+
+    def test_listed_setup_memberships(self):
+        system = self.setup_game(DEFAULT_CONFIG.replace(list_initial_memberships = True))
+        for agent in system.agents.values():
+            (institution_id,) = agent.institutions
+            self.assertIn(agent.agent_id, system.institutions[institution_id].members)
+            self.assertEqual(system.institutions[institution_id].violations[agent.agent_id], 0)
+
+if __name__ == "__main__":
+    unittest.main()
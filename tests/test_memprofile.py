@@ -0,0 +1,53 @@
+import csv
+import os
+import sys
+import tempfile
+import tracemalloc
+import unittest
+import numpy as np
+from memprofile import SUBSYSTEMS, deep_size, profile_game, profile_sizes
+from UDD import suppress_print
+
+class DeepSizeTest(unittest.TestCase):
+    def test_counts_reachable_objects_once(self):
+        shared = list(range(100))
+        seen = set()
+        first = deep_size({"a": shared}, seen)
+        second = deep_size({"b": shared}, seen)
+        self.assertGreaterEqual(first, sys.getsizeof(shared) + 100 * sys.getsizeof(1000))
+        self.assertLess(second, sys.getsizeof(shared)) # The shared list was already counted
+
+    def test_counts_array_data(self):
+        self.assertGreaterEqual(deep_size(np.zeros(10000), set()), 80000)
+
+class ProfileGameTest(unittest.TestCase):
+    def test_rows_after_setup_and_rounds(self):
+        rows = profile_game(30, 5, seed = 1)
+        self.assertEqual([(row["stage"], row["rounds"]) for row in rows], [("setup", 0), ("rounds", 5)])
+        for row in rows:
+            self.assertGreater(row["retained_bytes"], 0)
+            self.assertGreaterEqual(row["peak_bytes"], 0)
+            self.assertEqual(row["unattributed_bytes"], row["retained_bytes"] - sum(row[f"{name}_bytes"] for name in SUBSYSTEMS))
+            for name in ("scf", "agents", "institutions", "membership"):
+                self.assertGreater(row[f"{name}_bytes"], 0)
+        # The printed output of the rounds is kept by the drivers, setup does not count it
+        self.assertGreater(rows[1]["output_buffer_bytes"], rows[0]["output_buffer_bytes"])
+        self.assertFalse(tracemalloc.is_tracing())
+
+    def test_larger_games_hold_more(self):
+        small, large = profile_game(15, 3, seed = 1), profile_game(90, 3, seed = 1)
+        self.assertGreater(large[1]["scf_bytes"], small[1]["scf_bytes"])
+        self.assertGreater(large[1]["agents_bytes"], small[1]["agents_bytes"])
+
+    def test_sizes_are_written_as_csv(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "memory.csv")
+            with suppress_print():
+                rows = profile_sizes(sizes = (15, 30), rounds = 2, file = path)
+            with open(path, newline='') as file:
+                written = list(csv.DictReader(file))
+        self.assertEqual([(row["num_agents"], row["stage"]) for row in written], [("15", "setup"), ("15", "rounds"), ("30", "setup"), ("30", "rounds")])
+        self.assertEqual([int(row["retained_bytes"]) for row in written], [row["retained_bytes"] for row in rows])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,62 @@
+import os
+import tempfile
+import unittest
+import profiling
+from profiling import GameProfiler, merge_profiles, profile_files, start_profiling
+from UDD import play_satisfaction_job, suppress_print
+
+def slow_sum(n):
+    return sum(range(n))
+
+class GameProfilerTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.addCleanup(start_profiling, None)
+
+    def test_one_in_every_games_is_profiled(self):
+        profiler = GameProfiler(self.directory.name, every = 3)
+        results = [profiler.run(slow_sum, 1000) for _ in range(7)]
+        self.assertEqual(results, [sum(range(1000))] * 7)
+        # Games 1, 4 and 7 are sampled
+        self.assertEqual(sorted(int(path.rsplit("-", 1)[1][:-len(".prof")]) for path in profile_files(self.directory.name)), [1, 4, 7])
+
+    def test_profile_is_written_when_the_game_raises(self):
+        profiler = GameProfiler(self.directory.name, every = 1)
+        with self.assertRaises(ZeroDivisionError):
+            profiler.run(lambda: 1 / 0)
+        self.assertEqual(len(profile_files(self.directory.name)), 1)
+
+    def test_start_profiling_turns_profiling_on_and_off(self):
+        start_profiling(self.directory.name, 2)
+        self.assertIsInstance(profiling.PROFILER, GameProfiler)
+        self.assertEqual(profiling.PROFILER.every, 2)
+        start_profiling(None)
+        self.assertIsNone(profiling.PROFILER)
+
+    def test_experiment_games_are_profiled_and_merged(self):
+        start_profiling(self.directory.name, 2)
+        with suppress_print():
+            played = [play_satisfaction_job(None, 15, 2, seed) for seed in range(3)]
+        start_profiling(None)
+        # Profiling does not change the games
+        self.assertEqual(played[0], play_satisfaction_job(None, 15, 2, 0))
+        self.assertEqual(len(profile_files(self.directory.name)), 2)
+
+        report = merge_profiles(self.directory.name)
+        self.assertIn("2 profiled games", report)
+        self.assertIn("play_satisfaction_game", report)
+        for name in ("merged.prof", "report.txt", "collapsed.txt"):
+            self.assertTrue(os.path.exists(os.path.join(self.directory.name, name)))
+        with open(os.path.join(self.directory.name, "collapsed.txt")) as file:
+            lines = file.read().splitlines()
+        self.assertTrue(lines)
+        self.assertTrue(all(line.rsplit(" ", 1)[1].isdigit() for line in lines))
+        self.assertTrue(any("UDD.py:play_satisfaction_game;" in line for line in lines))
+
+    def test_merge_without_profiles_raises(self):
+        with self.assertRaises(FileNotFoundError):
+            merge_profiles(self.directory.name)
+
+if __name__ == "__main__":
+    unittest.main()
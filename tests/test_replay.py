@@ -0,0 +1,35 @@
+import os
+import pickle
+import shutil
+import tempfile
+import unittest
+from replay import ReplayError, record_game, replay_game
+
+class ReplayTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "game.replay")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_replay_repeats_the_recorded_game(self):
+        recorded = record_game(self.path, 30, 20, seed = 1)
+        self.assertEqual(replay_game(self.path), recorded)
+
+    def test_unseeded_games_replay_as_well(self):
+        recorded = record_game(self.path, 15, 10)
+        self.assertEqual(replay_game(self.path), recorded)
+
+    def test_changed_recording_is_detected(self):
+        record_game(self.path, 15, 10, seed = 1)
+        with open(self.path, 'rb') as file:
+            recording = pickle.load(file)
+        recording["game"]["satisfactions"] = {type_name: 0.0 for type_name in recording["game"]["satisfactions"]}
+        with open(self.path, 'wb') as file:
+            pickle.dump(recording, file)
+        with self.assertRaises(ReplayError):
+            replay_game(self.path)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,56 @@
+import unittest
+import numpy as np
+from events import Event
+from reputations import AgentsReputation, InstitutionalReputation
+
+class AgentsReputationTest(unittest.TestCase):
+    def test_percentage_of_successful_meals(self):
+        reputation = AgentsReputation(["a", "b", "c"])
+        for agent_id, success in [("a", True), ("a", False), ("a", True), ("a", True), ("b", False)]:
+            reputation.report_meal_success(agent_id, success)
+        self.assertEqual(reputation.get_reputation("a"), 75)
+        self.assertEqual(reputation.get_reputation("b"), 0)
+        self.assertEqual(reputation.get_reputation("c"), 0) # No reports
+        self.assertEqual(reputation.get_reputation("unknown"), 0)
+        np.testing.assert_array_equal(reputation.get_reputation_all(), [75, 0, 0])
+
+    def test_reports_in_bulk_match_single_reports(self):
+        single, bulk = AgentsReputation(["a", "b", "c"]), AgentsReputation(["a", "b", "c"])
+        reports = [("a", True), ("c", False), ("a", False), ("c", True), ("c", True)]
+        for agent_id, success in reports:
+            single.report_meal_success(agent_id, success)
+        bulk.report_many([agent_id for agent_id, _ in reports], [success for _, success in reports])
+        np.testing.assert_array_equal(single.get_reputation_all(), bulk.get_reputation_all())
+
+        bulk.report_many(["b", "b"], True)
+        self.assertEqual(bulk.get_reputation("b"), 100)
+
+    def test_reported_agents_since_reset(self):
+        reputation = AgentsReputation(["a", "b", "c"])
+        reputation.report_meal_success("a", True)
+        reputation.get_reputation_all() # Counts are read before the reset
+        reputation.reset()
+        reputation.report_meal_success("c", True)
+        reputation.report_meal_success("c", False)
+        ids, percentages = reputation.get_reputation_reported()
+        self.assertEqual(ids, ["c"])
+        np.testing.assert_array_equal(percentages, [50])
+        self.assertEqual(reputation.get_reputation("a"), 0)
+
+    def test_reset_drops_unread_reports(self):
+        reputation = AgentsReputation(["a"])
+        reputation.report_meal_success("a", True)
+        reputation.reset()
+        ids, percentages = reputation.get_reputation_reported()
+        self.assertEqual((ids, len(percentages)), ([], 0))
+
+class InstitutionalReputationTest(unittest.TestCase):
+    def test_cooperations_follow_the_rules(self):
+        reputation = InstitutionalReputation(["institution0", "institution1"])
+        for event_type in ["Cooperated", "Not Cooperated", "Cooperated", "Cooperated", "Cooperated"]:
+            reputation.report_rule_compliance("institution1", Event(event_type, 1, "agent0"))
+        self.assertEqual(reputation.get_reputation("institution1"), 80)
+        np.testing.assert_array_equal(reputation.get_reputation_all(), [0, 80])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,61 @@
+import unittest
+from config import DEFAULT_CONFIG
+from MAS import setup_template
+from UDD import UDD, suppress_print
+
+def played_averages(num_agents, seed, rounds, dense_social_network = False):
+    game = UDD(num_agents = num_agents, seed = seed)
+    averages = []
+    with suppress_print():
+        game.initialize_system()
+        if dense_social_network:
+            # The social network as it was set up before it was made lazy, with a score of 0 for every pair
+            scf = next(iter(game.system.agents.values())).scf
+            scf.data_structures["social_networks"] = {agent: {other: 0 for other in game.system.agents} for agent in game.system.agents}
+        for _ in range(rounds):
+            game.step()
+            averages.append(game.get_average_satisfactions())
+    return game, averages
+
+class SetupTemplateTest(unittest.TestCase):
+    def test_templates_are_shared_per_size_mix_and_institutions(self):
+        template = setup_template(30, DEFAULT_CONFIG)
+        self.assertIs(setup_template(30, DEFAULT_CONFIG), template)
+        self.assertIsNot(setup_template(33, DEFAULT_CONFIG), template)
+        self.assertIsNot(setup_template(30, DEFAULT_CONFIG.replace(num_institutions = DEFAULT_CONFIG.num_institutions + 1)), template)
+        self.assertEqual(len(template.agents), 30)
+        self.assertEqual(len(template.institution_ids), DEFAULT_CONFIG.num_institutions)
+
+    def test_games_get_their_own_memberships(self):
+        first, _ = played_averages(30, 1, 3)
+        second, _ = played_averages(30, 2, 0)
+        template = setup_template(30, DEFAULT_CONFIG)
+        self.assertIsNot(first.system.membership, template.membership)
+        self.assertFalse(template.membership.matrix.any())
+        self.assertTrue(first.system.membership.matrix.any())
+        self.assertIs(first.system.membership.agent_index, second.system.membership.agent_index)
+        self.assertIsNot(first.system.membership.matrix, second.system.membership.matrix)
+
+class LazySocialNetworkTest(unittest.TestCase):
+    def test_only_updated_scores_are_stored(self):
+        game, _ = played_averages(30, 1, 0)
+        scf = next(iter(game.system.agents.values())).scf
+        self.assertEqual(scf.data_structures["social_networks"], {agent_id: {} for agent_id in game.system.agents})
+        self.assertEqual(scf.metrics['social_networks'](scf, "agent0"), 0)
+
+        with suppress_print():
+            for _ in range(4): # Scores are first updated from the events of the second round
+                game.step()
+        stored = sum(len(row) for row in scf.data_structures["social_networks"].values())
+        self.assertGreater(stored, 0)
+        self.assertLess(stored, 30 * 30)
+
+    def test_games_match_the_dense_social_network(self):
+        _, lazy = played_averages(60, 4, 20)
+        _, dense = played_averages(60, 4, 20, dense_social_network = True)
+        for lazy_round, dense_round in zip(lazy, dense):
+            for type_name, value in dense_round.items():
+                self.assertAlmostEqual(lazy_round[type_name], value, places = 9)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,51 @@
+import random
+import unittest
+from types import SimpleNamespace
+import numpy as np
+from config import DEFAULT_CONFIG
+from steady_state import SteadyStateDetector, steady_state_detector
+from UDD import play_satisfaction_game
+
+# Stands in for a system, the detector only reads the membership matrix
+FIXED_MEMBERSHIP = SimpleNamespace(membership=SimpleNamespace(matrix=np.ones((2, 2), dtype=bool)))
+
+class SteadyStateDetectorTest(unittest.TestCase):
+    def add_rounds(self, detector, values):
+        steady = False
+        for value in values:
+            steady = detector.add_round(FIXED_MEMBERSHIP, {"Social Agent": value, "Dominant Agent": 0.5})
+        return steady
+
+    def test_noise_around_a_level_is_steady(self):
+        rng = random.Random(0)
+        detector = SteadyStateDetector(window = 100, tolerance = 0.05)
+        self.assertTrue(self.add_rounds(detector, [0.7 + rng.gauss(0, 0.01) for _ in range(100)]))
+        self.assertAlmostEqual(detector.steady_values()["Social Agent"], 0.7, places = 2)
+
+    def test_trend_is_not_steady(self):
+        detector = SteadyStateDetector(window = 100, tolerance = 0.05)
+        self.assertFalse(self.add_rounds(detector, [0.5 + round_num * 0.002 for round_num in range(100)]))
+
+    def test_needs_a_full_window(self):
+        detector = SteadyStateDetector(window = 100, tolerance = 0.05)
+        self.assertFalse(self.add_rounds(detector, [0.7] * 99))
+
+    def test_off_by_default(self):
+        self.assertIsNone(steady_state_detector(DEFAULT_CONFIG))
+
+    def test_games_without_detection_are_unchanged(self):
+        # A window longer than the game never ends it, so the results are those of the fully played game
+        played = play_satisfaction_game(30, 21, seed = 1)
+        detected = play_satisfaction_game(30, 21, seed = 1, config = DEFAULT_CONFIG.replace(steady_state_window = 1000))
+        self.assertEqual(played["rounds"], detected["rounds"])
+        self.assertEqual(played["final"], detected["final"])
+        self.assertIsNone(detected["steady_round"])
+
+    def test_game_without_rounds_has_the_starting_averages(self):
+        for config in (DEFAULT_CONFIG, DEFAULT_CONFIG.replace(steady_state_window = 10)):
+            result = play_satisfaction_game(30, 0, seed = 1, config = config)
+            self.assertEqual(result["rounds"], [])
+            self.assertEqual(result["final"], {"Social Agent": 0, "Dominant Agent": 0, "Random Agent": 0})
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,49 @@
+import random
+import unittest
+from streams import RandomStreams
+from UDD import UDD, breakpoint_game_seed, game_seed, suppress_print
+
+def first_draws(num_agents, seed, purpose = "decide"):
+    # First draw of every agent's stream for the purpose, by agent type and index within the type
+    game = UDD(num_agents = num_agents, seed = seed)
+    with suppress_print():
+        game.initialize_system()
+    return {(type_name, index): agent.rng(purpose).random()
+            for type_name, agents in game.system.agents_by_type.items() for index, agent in enumerate(agents)}
+
+class RandomStreamsTest(unittest.TestCase):
+    def test_same_seed_purpose_and_key_give_the_same_numbers(self):
+        first, second = RandomStreams((1, 2)), RandomStreams((1, 2))
+        self.assertEqual([first.get("vote", "a").random() for _ in range(3)], [second.get("vote", "a").random() for _ in range(3)])
+        self.assertNotEqual(RandomStreams((1, 2)).get("vote", "a").random(), RandomStreams((1, 2)).get("vote", "b").random())
+        self.assertNotEqual(RandomStreams((1, 2)).get("vote", "a").random(), RandomStreams((1, 3)).get("vote", "a").random())
+
+    def test_streams_are_kept(self):
+        streams = RandomStreams(1)
+        self.assertIs(streams.get("join", "a"), streams.get("join", "a"))
+
+    def test_unseeded_streams_are_the_random_module(self):
+        self.assertIs(RandomStreams().get("join", "a"), random)
+
+class CommonRandomNumbersTest(unittest.TestCase):
+    def test_breakpoint_seeds_are_shared_across_sizes_only_with_common_random_numbers(self):
+        self.assertEqual(breakpoint_game_seed(0, 3, 30, True), breakpoint_game_seed(0, 3, 300, True))
+        self.assertNotEqual(breakpoint_game_seed(0, 3, 30, False), breakpoint_game_seed(0, 3, 300, False))
+        self.assertNotEqual(breakpoint_game_seed(0, 3, 30, True), breakpoint_game_seed(0, 4, 30, True))
+        self.assertIsNone(breakpoint_game_seed(None, 3, 30, True))
+        self.assertEqual(game_seed(0, 3, "satisfaction", 60), (0, 3, "satisfaction", 60))
+
+    def test_agents_draw_the_same_numbers_at_every_size(self):
+        # The n-th agent of a type uses the same streams in games of different sizes with the same seed
+        small = first_draws(30, breakpoint_game_seed(0, 2, 30, True))
+        large = first_draws(90, breakpoint_game_seed(0, 2, 90, True))
+        self.assertEqual(len(small), 30)
+        for key, draw in small.items():
+            self.assertEqual(large[key], draw)
+
+        # Without common random numbers the sizes draw different numbers
+        other = first_draws(90, breakpoint_game_seed(0, 2, 90, False))
+        self.assertNotEqual([other[key] for key in small], list(small.values()))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,61 @@
+import unittest
+from config import DEFAULT_CONFIG
+from sweep import apply_point, grid, latin_hypercube, run_sweep, run_sweep_job, sweep_jobs
+from UDD import suppress_print
+
+class SweepPointsTest(unittest.TestCase):
+    def test_grid_has_every_combination(self):
+        points = grid(cooperation_threshold=[0.3, 0.5], num_institutions=[3, 9])
+        self.assertEqual(points, [{"cooperation_threshold": 0.3, "num_institutions": 3}, {"cooperation_threshold": 0.3, "num_institutions": 9},
+                                  {"cooperation_threshold": 0.5, "num_institutions": 3}, {"cooperation_threshold": 0.5, "num_institutions": 9}])
+
+    def test_latin_hypercube_uses_every_stratum_once(self):
+        points = latin_hypercube(10, {"cooperation_threshold": (0.0, 1.0), "num_institutions": (2, 22)}, seed = 4)
+        self.assertEqual(sorted(int(point["cooperation_threshold"] * 10) for point in points), list(range(10)))
+        self.assertTrue(all(isinstance(point["num_institutions"], int) for point in points))
+        self.assertEqual(points, latin_hypercube(10, {"cooperation_threshold": (0.0, 1.0), "num_institutions": (2, 22)}, seed = 4))
+
+    def test_apply_point_sets_fields_and_weight_entries(self):
+        config = apply_point(DEFAULT_CONFIG, {"num_institutions": 4, "decision_indicator_weights.institution": 0.9})
+        self.assertEqual(config.num_institutions, 4)
+        self.assertEqual(config.decision_indicator_weights["institution"], 0.9)
+        self.assertNotEqual(DEFAULT_CONFIG.decision_indicator_weights["institution"], 0.9)
+        with self.assertRaises(KeyError):
+            apply_point(DEFAULT_CONFIG, {"no_such_field": 1})
+        with self.assertRaises(KeyError):
+            apply_point(DEFAULT_CONFIG, {"decision_indicator_weights.no_such_entry": 1})
+
+class SweepJobsTest(unittest.TestCase):
+    def test_games_share_seeds_across_points(self):
+        jobs = sweep_jobs([{"num_institutions": 3}, {"num_institutions": 9}], [15, 30], 2, ["satisfaction", "breakpoint"], 0)
+        self.assertEqual(len(jobs), 2 * 2 * 2 * 2)
+        seeds = {}
+        for point_index, point, experiment, num_agents, game, seed in jobs:
+            seeds.setdefault((experiment, num_agents, game), set()).add(seed)
+        self.assertEqual(len(seeds), 8)
+        self.assertTrue(all(len(point_seeds) == 1 for point_seeds in seeds.values()))
+
+    def test_job_rows(self):
+        job = (1, {"num_institutions": 4}, "satisfaction", 15, 0, (0, 0, "satisfaction", 15))
+        with suppress_print():
+            table, rows = run_sweep_job(job, DEFAULT_CONFIG, 4, 50, None)
+        self.assertEqual(table, "satisfaction")
+        self.assertEqual({(row["round"], row["agent_type"]) for row in rows},
+                         {(round_num, agent_type) for round_num in (2, 4) for agent_type in ("Social Agent", "Dominant Agent", "Random Agent")})
+        self.assertTrue(all(row["point"] == 1 and row["num_institutions"] == 4 and row["num_agents"] == 15 for row in rows))
+
+    def test_parallel_sweep_matches_the_jobs_played_in_turn(self):
+        points = [{"num_institutions": 3}, {"num_institutions": 6}]
+        with suppress_print():
+            results = run_sweep(points, sizes = (15,), games = 2, rounds = 4, max_rounds = 20, workers = 2)
+            expected = {"satisfaction": [], "breakpoints": []}
+            for job in sweep_jobs(points, (15,), 2, ("satisfaction", "breakpoint"), 0):
+                table, rows = run_sweep_job(job, DEFAULT_CONFIG, 4, 20, None)
+                expected[table].extend(rows)
+
+        for table, rows in expected.items():
+            self.assertEqual(results[table].to_dict("records"), rows)
+        self.assertEqual(len(results["breakpoints"]), 4)
+
+if __name__ == "__main__":
+    unittest.main()
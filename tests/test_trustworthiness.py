@@ -0,0 +1,54 @@
+import unittest
+from config import DEFAULT_CONFIG
+from UDD import UDD, suppress_print
+
+def play_refreshes(incremental, rounds = 15):
+    # Plays a game and returns, for every round, the trustworthiness before and after the step and the refreshed agents
+    game = UDD(num_agents = 60, seed = 2, config = DEFAULT_CONFIG.replace(incremental_trustworthiness = incremental))
+    refreshes = []
+    with suppress_print():
+        game.initialize_system()
+        scf = next(iter(game.system.agents.values())).scf
+        update_data_many = scf.update_data_many
+        def recording_update(key, ids, *args, **kwargs):
+            if key == 'trustworthiness':
+                refreshes[-1]["refreshed"] = list(ids)
+            return update_data_many(key, ids, *args, **kwargs)
+        scf.update_data_many = recording_update
+
+        for _ in range(rounds):
+            refreshes.append({"before": dict(scf.data_structures['trustworthiness'])})
+            game.step()
+            refreshes[-1]["after"] = dict(scf.data_structures['trustworthiness'])
+    return game.system, refreshes
+
+class IncrementalTrustworthinessTest(unittest.TestCase):
+    def test_only_reported_agents_are_refreshed(self):
+        system, refreshes = play_refreshes(True)
+        partial = 0
+        for refresh in refreshes:
+            refreshed = set(refresh["refreshed"])
+            partial += len(refreshed) < len(system.agents)
+            for agent_id, before in refresh["before"].items():
+                if agent_id not in refreshed:
+                    self.assertEqual(refresh["after"][agent_id], before)
+        # Nobody is reported on before the first dinner, and later rounds leave out agents nobody reported on
+        self.assertEqual(refreshes[0]["refreshed"], [])
+        self.assertGreater(partial, 1)
+
+    def test_refreshed_agents_average_their_reputation_in(self):
+        system, refreshes = play_refreshes(True, rounds = 3)
+        reputation = system.reputation_sources['agents_reputation'] # Still holds the reports of the last round
+        refresh = refreshes[-1]
+        self.assertGreater(len(refresh["refreshed"]), 0)
+        for agent_id in refresh["refreshed"]:
+            expected = (refresh["before"][agent_id] + min(max(reputation.get_reputation(agent_id) / 100, 0), 1)) / 2
+            self.assertAlmostEqual(refresh["after"][agent_id], expected)
+
+    def test_every_agent_is_refreshed_by_default(self):
+        system, refreshes = play_refreshes(False)
+        for refresh in refreshes:
+            self.assertEqual(refresh["refreshed"], list(system.agents))
+
+if __name__ == "__main__":
+    unittest.main()
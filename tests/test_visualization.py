@@ -0,0 +1,29 @@
+import contextlib
+import io
+import time
+import unittest
+from UDD import UDD, suppress_print
+from visualization import SimulationWorker
+
+class SimulationWorkerTest(unittest.TestCase):
+    def test_worker_steps_without_printing(self):
+        game = UDD(num_agents = 30, seed = 1)
+        with suppress_print():
+            game.initialize_system()
+
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            worker = SimulationWorker(game, fps = 1000)
+            worker.start()
+            worker.request()
+            deadline = time.monotonic() + 10
+            while worker.snapshot["step"] < 5 and time.monotonic() < deadline:
+                time.sleep(0.01)
+            worker.stop()
+            worker.join()
+
+        self.assertGreaterEqual(worker.snapshot["step"], 5)
+        self.assertEqual(output.getvalue(), "")
+
+if __name__ == "__main__":
+    unittest.main()
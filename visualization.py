@@ -1,17 +1,13 @@
 from mesa import Model, Agent
 from mesa.space import MultiGrid
-from mesa.visualization.ModularVisualization import ModularServer
-from mesa.visualization.modules import CanvasGrid
 from mesa.time import RandomActivation
 from mesa.datacollection import DataCollector
-from mesa.visualization.modules import ChartModule, BarChartModule
-from mesa.visualization.UserParam import Slider
+import threading
+import time
 import numpy as np
-from static_values import NUM_INSTITUTIONS
-from framework import SocialCapitalFramework
-from MAS import MultiAgentSystem
-from agents import DominantAgent, RandomAgent, SocialAgent
-from scf import create_complete_scf
+from config import DEFAULT_CONFIG
+from UDD import UDD as Game, suppress_print
+from aggregates import TypeAggregates
 
 class MesaAgent(Agent):
     def __init__(self, unique_id, model, real_agent):
@@ -23,9 +19,9 @@ class MesaAgent(Agent):
         pass
 
 def agent_portrayal(agent):
-    if isinstance(agent.real_agent, DominantAgent):
+    if agent.real_agent.type_name == "Dominant Agent":
         color = "red"
-    elif isinstance(agent.real_agent, RandomAgent):
+    elif agent.real_agent.type_name == "Random Agent":
         color = "blue"
     else:  # Assumes other types are SocialAgents
         color = "green"
@@ -40,6 +36,9 @@ def agent_portrayal(agent):
 
     return portrayal
 
+# The 50 x 50 grid has room for this many partitions with gaps, institutions beyond it share the partitions
+MAX_PARTITIONS = 16
+
 def calculate_grid_partitions(num_institutions, grid_width, grid_height, gap=6):
     """Calculate grid partitions for the given number of institutions with gaps."""
     per_row = int(np.ceil(np.sqrt(num_institutions)))
@@ -55,63 +54,29 @@ def calculate_grid_partitions(num_institutions, grid_width, grid_height, gap=6):
                 partitions.append((x_start, y_start, width, height))
     return partitions
 
-def get_institution_number(institution_id):
+def get_institution_number(institution_id, num_institutions):
     #Return the institution number from the institution_id or a random number if None
     if institution_id is None:
-        return np.random.randint(NUM_INSTITUTIONS)
+        return np.random.randint(num_institutions)
     else:
         return int(institution_id[len("institution"):])
     
-def collect_trustworthiness(model):
-    # This function collects the social capital data from each agent
-    trustworthiness = {}
-
-    scf = list(model.system.agents.values())[0].scf # Collect the scf from an agent
-    for agent in model.schedule.agents:
-        # Assuming you have a way to access trustworthiness and social_network scores
-        trust = scf.data_structures['trustworthiness'].get(agent.unique_id, 0)
-        # social_network = model.system.scf.data_structures['social_networks'].get(agent.unique_id, 0)
-        trustworthiness[agent.unique_id] = trust
-
-    sorted_trustworthiness = {"Social Agents": 0, "Dominant Agents": 0, "Random Agents": 0}
-
-    for agent_id, social_capital in trustworthiness.items():
-        # If it is an instance of social agent
-        if isinstance(model.system.agents[agent_id], SocialAgent):
-            sorted_trustworthiness["Social Agents"] += social_capital
-        elif isinstance(model.system.agents[agent_id], DominantAgent):
-            sorted_trustworthiness["Dominant Agents"] += social_capital
-        else:
-            sorted_trustworthiness["Random Agents"] += social_capital
-
-    return  sorted_trustworthiness
-
-def collect_institutions_capital(model):
-    # This function collects the institutional capital data from each institution
-    institutions_capital = {}
-    for institution_id in range(NUM_INSTITUTIONS):
-        institutions_capital["institution" + str(institution_id)] = 0
-
-    scf = list(model.system.agents.values())[0].scf # Collect the scf from an agent
-
-    for institution_id in range(NUM_INSTITUTIONS):
-        # Assuming you have a way to access trustworthiness and social_network scores
-        institution_capital = scf.data_structures['institutions'].get("institution" + str(institution_id), 0)
-        institutions_capital["institution" + str(institution_id)] = institution_capital
+def type_labels(values):
+    # "Social Agents" for the Social Agent type, the labels used by the charts
+    return {type_name + "s": value for type_name, value in values.items()}
 
-    return institutions_capital
+# The reporters read the aggregates the game keeps up to date while it is played, see aggregates.py
 
-def collect_satisfaction(model):
-    satisfaction = {"Social Agents": 0, "Dominant Agents": 0, "Random Agents": 0}
+def collect_trustworthiness(aggregates):
+    # This function collects the trustworthiness of the agents, summed for each agent type
+    return type_labels(aggregates.trustworthiness())
 
-    for agent in list(model.system.agents.values()):
-        if isinstance(agent, SocialAgent):
-            satisfaction["Social Agents"] += agent.get_satisfaction()
-        elif isinstance(agent, DominantAgent):
-            satisfaction["Dominant Agents"] += agent.get_satisfaction()
-        else:
-            satisfaction["Random Agents"] += agent.get_satisfaction()
+def collect_institutions_capital(aggregates):
+    # This function collects the institutional capital data from each institution
+    return aggregates.institutions_capital()
 
+def collect_satisfaction(aggregates):
+    satisfaction = type_labels(aggregates.satisfactions())
 
     # Calculate the total satisfaction
     total_satisfaction = sum(satisfaction.values())
@@ -123,116 +88,186 @@ def collect_satisfaction(model):
             
     return satisfaction
 
-def collect_social_capital(model):
-    sc = {"Social Agents": 0, "Dominant Agents": 0, "Random Agents": 0}
-    scf = list(model.system.agents.values())[0].scf # Collect the scf from an agent
-
-    for agent in list(model.system.agents.values()):
-        if isinstance(agent, SocialAgent):
-            sc["Social Agents"] += agent.get_social_capital(scf)
-        elif isinstance(agent, DominantAgent):
-            sc["Dominant Agents"] += agent.get_social_capital(scf)
-        else:
-            sc["Random Agents"] += agent.get_social_capital(scf)
-
-    return sc
+def collect_social_capital(aggregates):
+    return type_labels(aggregates.social_capital())
+
+REPORTERS = {
+    "Trustworthiness": collect_trustworthiness,
+    "Institutional Capital": collect_institutions_capital,
+    "Satisfaction": collect_satisfaction,
+    "Social Capital": collect_social_capital,
+}
+
+def take_snapshot(system, step):
+    # What the visualization shows of the game after a step: every agent's dinner group and the reporter values
+    # Before the first step only the dinner groups are known, nothing is collected until a step is shown
+    snapshot = {"step": step, "dinner_groups": [agent.chosen_dinner_group for agent in system.agents.values()]}
+    if step > 0:
+        for name, reporter in REPORTERS.items():
+            snapshot[name] = reporter(system.aggregates)
+    return snapshot
+
+class SimulationWorker(threading.Thread):
+    """
+    Plays the game in a background thread, as fast as it can, and publishes a snapshot at most fps times per second.
+    Snapshots are only taken after every sample_every-th step, so the charts get one point every sample_every steps.
+    The game only runs while the visualization keeps asking for snapshots, so pausing the visualization pauses the game.
+    """
+    def __init__(self, game, fps = 10, sample_every = 1, idle_seconds = 1):
+        super().__init__(daemon=True)
+        self.game = game
+        TypeAggregates().attach(game.system)
+        self.interval = 1 / fps
+        self.sample_every = sample_every
+        self.idle_seconds = idle_seconds
+        self.snapshot = take_snapshot(game.system, 0) # Replaced as a whole, so readers always see a complete snapshot
+        self.steps = 0
+        self.stopped = threading.Event()
+        self.requested = threading.Event()
+        self.requested_until = 0
+
+    def request(self):
+        # Keeps the game running for idle_seconds more
+        self.requested_until = time.monotonic() + self.idle_seconds
+        self.requested.set()
+
+    def run(self):
+        last_published = 0
+        while not self.stopped.is_set():
+            if time.monotonic() > self.requested_until:
+                self.requested.clear()
+                self.requested.wait(self.idle_seconds)
+                continue
+
+            # The game's per-group prints would take most of the time at large populations
+            with suppress_print():
+                self.game.step()
+            self.steps += 1
+            if self.steps % self.sample_every == 0 and time.monotonic() - last_published >= self.interval:
+                self.snapshot = take_snapshot(self.game.system, self.steps)
+                last_published = time.monotonic()
+
+    def stop(self):
+        self.stopped.set()
+        self.requested.set()
 
 class UDD(Model):
-    def __init__(self, num_agents=30):
+    def __init__(self, num_agents=30, fps=10, sample_every=1, config=DEFAULT_CONFIG):
         super().__init__()
         self.num_agents = num_agents
+        self.config = config
+        self.fps = fps
+        self.sample_every = sample_every
         
         self.initialize_system()
        
 
+        # The reporters are computed by the worker when it takes a snapshot, the data collector only reads them
         self.data_collector = DataCollector(
-            model_reporters={
-                "Trustworthiness": collect_trustworthiness,
-                "Institutional Capital": collect_institutions_capital,
-                "Satisfaction": collect_satisfaction,
-                "Social Capital": collect_social_capital
-                }
+            model_reporters={name: (lambda model, name=name: model.shown[name]) for name in REPORTERS}
         )
 
     def initialize_system(self):
-        # Create and setup the new system
+        # Create and setup the new system, played by a background worker
         self.schedule = RandomActivation(self)
         self.grid = MultiGrid(50, 50, torus=False)
-        scf = create_complete_scf()
-        self.system = MultiAgentSystem(num_agents = self.num_agents)
-        self.system.setup(scf)
-        self.partitions = calculate_grid_partitions(NUM_INSTITUTIONS, self.grid.width, self.grid.height)
+        self.game = Game(num_agents = self.num_agents, config = self.config)
+        self.game.initialize_system()
+        self.system = self.game.system
+        self.partitions = calculate_grid_partitions(min(self.config.num_institutions, MAX_PARTITIONS), self.grid.width, self.grid.height)
         self.place_agents()
+
+        self.worker = SimulationWorker(self.game, fps = self.fps, sample_every = self.sample_every)
+        self.shown = self.worker.snapshot
+        self.worker.start()
     
     def place_agents(self):
+        self.mesa_agents = [] # In the order of the system's agents, which is the order of the snapshot's dinner groups
         for agent_id, agent in self.system.agents.items():
-            partition = self.partitions[get_institution_number(agent.chosen_dinner_group) % NUM_INSTITUTIONS]
-            x = self.random.randrange(partition[0], partition[0] + partition[2])
-            y = self.random.randrange(partition[1], partition[1] + partition[3])
             mesa_agent = MesaAgent(agent_id, self, agent)
             self.schedule.add(mesa_agent)
-            self.grid.place_agent(mesa_agent, (x, y))
-
-    def update_agent_positions(self):
-        for agent in self.schedule.agents:
-            institution_id = agent.real_agent.chosen_dinner_group
-            institution_number = get_institution_number(institution_id)
-            partition = self.partitions[institution_number % NUM_INSTITUTIONS]
-            # Move agent to a random position within the designated partition
-            x = self.random.randrange(partition[0], partition[0] + partition[2])
-            y = self.random.randrange(partition[1], partition[1] + partition[3])
-            self.grid.move_agent(agent, (x, y))
+            self.grid.place_agent(mesa_agent, self.random_position(agent.chosen_dinner_group))
+            self.mesa_agents.append(mesa_agent)
+
+    def random_position(self, institution_id):
+        # Random position within the partition of the institution, shared with other institutions when there are more than MAX_PARTITIONS
+        partition = self.partitions[get_institution_number(institution_id, self.config.num_institutions) % len(self.partitions)]
+        x = self.random.randrange(partition[0], partition[0] + partition[2])
+        y = self.random.randrange(partition[1], partition[1] + partition[3])
+        return (x, y)
+
+    def update_agent_positions(self, previous, snapshot):
+        # Only agents that changed dinner group since the last snapshot shown are moved
+        for mesa_agent, old_group, new_group in zip(self.mesa_agents, previous["dinner_groups"], snapshot["dinner_groups"]):
+            if new_group != old_group:
+                self.grid.move_agent(mesa_agent, self.random_position(new_group))
 
     def reset(self):
         print("Resetting the model")
-        super().reset()
+        self.worker.stop()
         self.initialize_system()
 
     def step(self):
-        # Reset reputation data for each round
-        self.system.reputation_sources['agents_reputation'].records = {}
-        self.system.reputation_sources['institutional_reputation'].records = {}
-
-        # First let each agent take their step
-        self.schedule.step()
-
-        # Then perform system-wide updates
-        self.system.step()
+        # Shows the latest snapshot of the worker, the game itself is played by the worker
+        self.worker.request()
+        snapshot = self.worker.snapshot
+        if snapshot is self.shown:
+            return
 
         # Update agent positions on the grid
-        self.update_agent_positions()
+        self.update_agent_positions(self.shown, snapshot)
+        self.shown = snapshot
 
         self.data_collector.collect(self)
 
 
-grid = CanvasGrid(agent_portrayal, 50, 50, 500, 500)
-
-satisfaction_chart = ChartModule([
-    {"Label": "Social Agents", "Color": "Green", "DataKey": "Satisfaction"},
-    {"Label": "Dominant Agents", "Color": "Red", "DataKey": "Satisfaction"},
-    {"Label": "Random Agents", "Color": "Blue", "DataKey": "Satisfaction"}
-], data_collector_name='data_collector', canvas_height=100, canvas_width=200)
-
-sc_chart = ChartModule([
-    {"Label": "Social Agents", "Color": "Green", "DataKey": "Social Capital"},
-    {"Label": "Dominant Agents", "Color": "Red", "DataKey": "Social Capital"},
-    {"Label": "Random Agents", "Color": "Blue", "DataKey": "Social Capital"}
-], data_collector_name='data_collector', canvas_height=100, canvas_width=200)
-
-
-# Define a slider for the number of agents
-agents_slider = Slider(
-    name="Number of Agents",
-    value=60,  # Initial number of agents
-    min_value=3,
-    max_value=300,
-    step=3,  # Increment by 3
-    description="Adjust the number of agents in the simulation"
-)
-
-server = ModularServer(UDD,
-                       [grid, satisfaction_chart, sc_chart],
-                       "Unscrupulous Diner's Dilemma",
-                       {"num_agents": agents_slider})
-
-server.launch()
\ No newline at end of file
+def create_server(config = DEFAULT_CONFIG):
+    # The server modules are imported here, so the model can be imported without starting Tornado
+    from mesa.visualization.ModularVisualization import ModularServer
+    from mesa.visualization.modules import CanvasGrid, ChartModule
+    from mesa.visualization.UserParam import Slider
+
+    grid = CanvasGrid(agent_portrayal, 50, 50, 500, 500)
+
+    satisfaction_chart = ChartModule([
+        {"Label": "Social Agents", "Color": "Green", "DataKey": "Satisfaction"},
+        {"Label": "Dominant Agents", "Color": "Red", "DataKey": "Satisfaction"},
+        {"Label": "Random Agents", "Color": "Blue", "DataKey": "Satisfaction"}
+    ], data_collector_name='data_collector', canvas_height=100, canvas_width=200)
+
+    sc_chart = ChartModule([
+        {"Label": "Social Agents", "Color": "Green", "DataKey": "Social Capital"},
+        {"Label": "Dominant Agents", "Color": "Red", "DataKey": "Social Capital"},
+        {"Label": "Random Agents", "Color": "Blue", "DataKey": "Social Capital"}
+    ], data_collector_name='data_collector', canvas_height=100, canvas_width=200)
+
+
+    # Define a slider for the number of agents
+    agents_slider = Slider(
+        name="Number of Agents",
+        value=60,  # Initial number of agents
+        min_value=3,
+        max_value=10002,
+        step=3,  # Increment by 3, up to just over 10 000 agents
+        description="Adjust the number of agents in the simulation"
+    )
+
+    sample_slider = Slider(
+        name="Sample every",
+        value=1,
+        min_value=1,
+        max_value=20,
+        step=1,
+        description="Number of steps between the points of the charts"
+    )
+
+    server = ModularServer(UDD,
+                           [grid, satisfaction_chart, sc_chart],
+                           "Unscrupulous Diner's Dilemma",
+                           {"num_agents": agents_slider, "sample_every": sample_slider, "config": config})
+
+    return server
+
+
+if __name__ == "__main__":
+    create_server().launch()